@@ -0,0 +1,173 @@
+# async_main.py
+#
+# asyncio entry point. Each instance can hold many SMS conversations in flight
+# while they wait on OpenAI and Twilio, instead of one per worker. Deploy with:
+#
+#   functions-framework --target auto_responder_async --source async_main.py --asgi
+
+import asyncio
+from xml.sax.saxutils import escape
+
+import functions_framework.aio
+from starlette.responses import JSONResponse, Response
+from signature import RequestValidator, ValidatorCache
+
+from async_utils import (
+    get_auth_tokens_async,
+    get_tenant_env_async,
+    get_tenant_auth_tokens_async,
+    get_LLM_response_async,
+    initialize_environment_async,
+    send_message_via_twilio_async,
+    write_log_to_storage_async,
+)
+from dedup import get_deduplicator
+from main import (
+    EMPTY_TWIML,
+    MESSAGE_TWIML,
+    build_log_data,
+    build_prompt,
+    limit_message,
+    max_request_bytes,
+    parse_params,
+    remember_exchange,
+    RequestTooLarge,
+)
+from rate_limit import get_throttle
+from telemetry import get_telemetry
+from tenants import lookup_tenant
+
+validators = ValidatorCache(lambda auth_token: RequestValidator(auth_token))
+
+
+def request_url(request):
+    """Reconstruct the public URL Twilio signed, honouring proxy headers."""
+    forwarded_proto = request.headers.get('X-Forwarded-Proto', request.url.scheme)
+    forwarded_host = request.headers.get('X-Forwarded-Host', request.headers.get('host', request.url.netloc))
+    query = f'?{request.url.query}' if request.url.query else ''
+    return f"{forwarded_proto}://{forwarded_host}{request.url.path}{query}"
+
+
+async def read_body(request, max_bytes):
+    """Read the body chunk by chunk, giving up as soon as it passes `max_bytes`."""
+    content_length = request.headers.get('content-length')
+    if content_length and content_length.isdigit() and int(content_length) > max_bytes:
+        raise RequestTooLarge(f"Content-Length {content_length} is over the limit")
+    body = bytearray()
+    async for chunk in request.stream():
+        body += chunk
+        if len(body) > max_bytes:
+            raise RequestTooLarge(f"Body passed {max_bytes} bytes")
+    return bytes(body)
+
+
+async def request_params(request):
+    body = await read_body(request, max_request_bytes())
+    # Parsed directly rather than pulling in python-multipart for Starlette's request.form()
+    return parse_params(body, request.headers.get('content-type', ''))
+
+
+@functions_framework.aio.http
+async def auto_responder_async(request):
+    with get_telemetry().trace('webhook', mode='async') as trace:
+        response = await handle_webhook_async(request)
+        trace['status'] = response.status_code
+    return response
+
+
+async def handle_webhook_async(request):
+    telemetry = get_telemetry()
+
+    # Validate incoming request before touching secrets or clients
+    twilio_signature = request.headers.get('X-Twilio-Signature', '')
+    if not twilio_signature:
+        print("Missing Twilio signature")
+        return JSONResponse({'statusCode': 403, 'body': 'Invalid request.'}, status_code=403)
+
+    try:
+        with telemetry.span('validation'):
+            url = request_url(request)
+            params = await request_params(request)
+            tenant = lookup_tenant(params.get('To'))
+            if tenant is not None:
+                auth_tokens = await get_tenant_auth_tokens_async(tenant)
+            else:
+                auth_tokens = await get_auth_tokens_async()
+            valid = validators.validate(url, params, twilio_signature, auth_tokens)
+
+        if not valid:
+            print("Twilio signature validation failed")
+            return JSONResponse({'statusCode': 403, 'body': 'Invalid request.'}, status_code=403)
+
+    except RequestTooLarge as e:
+        print(f"Request rejected: {e}")
+        return JSONResponse({'statusCode': 413, 'body': 'Request too large.'}, status_code=413)
+    except Exception as e:
+        print(f'An error occurred: {e}')
+        return JSONResponse({'statusCode': 500, 'body': 'Internal Server Error'}, status_code=500)
+
+    # Dedup, rate-limit and history lookups may hit SQLite; keep them off the event loop
+    message_sid = params.get('MessageSid')
+    deduplicator = get_deduplicator()
+    if not await asyncio.to_thread(deduplicator.claim, message_sid):
+        print(f"Duplicate delivery of {message_sid}, already handled")
+        return Response(EMPTY_TWIML, status_code=200, media_type='text/xml')
+
+    phone_number = params.get('From')
+    message_body = limit_message(params.get('Body', ''))
+
+    if tenant is not None:
+        telemetry.annotate(tenant=tenant.name)
+
+    throttle = tenant.throttle() if tenant is not None else get_throttle()
+    if not await asyncio.to_thread(throttle.allow_sender, phone_number):
+        print("Sender is over the rate limit, throttling")
+        reply = await asyncio.to_thread(throttle.canned_reply, phone_number)
+        twiml = EMPTY_TWIML if reply is None else MESSAGE_TWIML.format(escape(reply))
+        return Response(twiml, status_code=200, media_type='text/xml')
+
+    try:
+        with telemetry.span('env_init'):
+            if tenant is not None:
+                env_vars = await get_tenant_env_async(tenant)
+            else:
+                env_vars = await initialize_environment_async()
+    except Exception as e:
+        print(f'An error occurred: {e}')
+        await asyncio.to_thread(deduplicator.release, message_sid)
+        return JSONResponse({'statusCode': 500, 'body': 'Internal Server Error'}, status_code=500)
+
+    if not throttle.acquire_llm_slot():
+        print("Too many LLM calls in flight, shedding request")
+        await asyncio.to_thread(deduplicator.release, message_sid)
+        return JSONResponse({'statusCode': 503, 'body': 'Service Unavailable'}, status_code=503)
+
+    try:
+        with telemetry.span('llm'):
+            messages = await asyncio.to_thread(build_prompt, phone_number, message_body, env_vars)
+            llm_response = await get_LLM_response_async(messages, env_vars)
+    except Exception as e:
+        print(f"Error generating LLM response: {e}")
+        await asyncio.to_thread(deduplicator.release, message_sid)
+        return JSONResponse({'statusCode': 500, 'body': 'Internal Server Error'}, status_code=500)
+    finally:
+        throttle.release_llm_slot()
+
+    if llm_response is None:
+        await asyncio.to_thread(deduplicator.release, message_sid)
+        return JSONResponse({'statusCode': 500, 'body': 'Internal Server Error'}, status_code=500)
+
+    # Send response via Twilio
+    with telemetry.span('twilio_send'):
+        msg_id = await send_message_via_twilio_async(phone_number, llm_response, None, env_vars)
+    if msg_id is None:
+        # Neither sent nor queued for replay: have Twilio retry rather than log a reply that never went out
+        await asyncio.to_thread(deduplicator.release, message_sid)
+        return JSONResponse({'statusCode': 500, 'body': 'Internal Server Error'}, status_code=500)
+    await asyncio.to_thread(remember_exchange, phone_number, message_body, llm_response, env_vars)
+
+    # Write log to Cloud Storage
+    with telemetry.span('log_write'):
+        await write_log_to_storage_async(build_log_data(phone_number, message_body, llm_response, env_vars), env_vars)
+
+    return JSONResponse({'status': 'Message sent'}, status_code=200)
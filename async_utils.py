@@ -0,0 +1,172 @@
+# async_utils.py
+#
+# asyncio counterparts of the helpers in utils.py. They share the cached
+# env_vars bundle (secrets, log sink, caches) with the synchronous path, and
+# keep one pool of async HTTP clients per event loop so concurrent requests
+# reuse connections instead of opening new ones.
+
+import asyncio
+import threading
+import time
+import uuid
+import weakref
+
+from utils import (
+    environment_cache,
+    fresh_reply,
+    get_auth_tokens,
+    initialize_environment,
+    queue_failed_send,
+    llm_failed,
+    llm_params,
+    record_route,
+    write_log_to_storage,
+)
+
+_pools = weakref.WeakKeyDictionary()  # loop -> {credentials: AsyncClientPool}
+MAX_POOLS_PER_LOOP = 64
+_pools_lock = threading.Lock()
+_closing = set()  # close() tasks of evicted pools, kept referenced until they finish
+
+
+class AsyncClientPool:
+    """Async OpenAI and Twilio clients bound to one event loop and one set of credentials."""
+
+    def __init__(self, env_vars):
+        from openai import AsyncOpenAI
+        from twilio.http.async_http_client import AsyncTwilioHttpClient
+        from twilio.rest import Client
+
+        self.credentials = _credentials(env_vars)
+        self.openai_client = AsyncOpenAI(api_key=env_vars['OPENAI_API_KEY'])
+        self.twilio_client = Client(
+            env_vars['TWILIO_ACCOUNT_SID'],
+            env_vars['TWILIO_AUTH_TOKEN'],
+            http_client=AsyncTwilioHttpClient(),
+        )
+
+    async def close(self):
+        await self.openai_client.close()
+        await self.twilio_client.http_client.close()
+
+
+def _credentials(env_vars):
+    return (env_vars['OPENAI_API_KEY'], env_vars['TWILIO_ACCOUNT_SID'], env_vars['TWILIO_AUTH_TOKEN'])
+
+
+def get_async_clients(env_vars):
+    """Return the client pool for the running loop and these credentials, creating it on first use.
+
+    Tests (and callers with their own clients) can put an `async_clients` object
+    with `openai_client` and `twilio_client` attributes straight into env_vars.
+    """
+    if env_vars.get('async_clients') is not None:
+        return env_vars['async_clients']
+    loop = asyncio.get_running_loop()
+    credentials = _credentials(env_vars)
+    evicted = []
+    with _pools_lock:
+        # One pool per set of credentials, so tenants with their own accounts don't evict each other
+        pools = _pools.setdefault(loop, {})
+        pool = pools.pop(credentials, None)
+        if pool is None:
+            while len(pools) >= MAX_POOLS_PER_LOOP:
+                # Least recently used first; after a rotation that is the one with the old credentials
+                evicted.append(pools.pop(next(iter(pools))))
+            pool = AsyncClientPool(env_vars)
+        pools[credentials] = pool
+    for old in evicted:
+        task = loop.create_task(old.close())
+        _closing.add(task)
+        task.add_done_callback(_closing.discard)
+    return pool
+
+
+async def initialize_environment_async():
+    """Return the shared env_vars bundle without blocking the loop on a cold load."""
+    return await asyncio.to_thread(initialize_environment)
+
+
+async def get_auth_tokens_async():
+    """Auth tokens for signature checks; only a cold instance goes to a thread to fetch them."""
+    if environment_cache.peek() is not None:
+        return get_auth_tokens()
+    return await asyncio.to_thread(get_auth_tokens)
+
+
+async def get_tenant_env_async(tenant):
+    """A tenant's env_vars; built on a thread the first time so the loop isn't blocked."""
+    if tenant.peek() is not None and environment_cache.peek() is not None:
+        return tenant.env_vars()
+    return await asyncio.to_thread(tenant.env_vars)
+
+
+async def get_tenant_auth_tokens_async(tenant):
+    """Like get_auth_tokens_async, for a tenant whose tokens may live in Secret Manager."""
+    if tenant.peek() is not None:
+        return tenant.auth_tokens()
+    return await asyncio.to_thread(tenant.auth_tokens)
+
+
+async def get_LLM_response_async(content, env_vars):
+    openai_client = get_async_clients(env_vars).openai_client
+    params, route = llm_params(content, env_vars)
+
+    response_cache = env_vars.get('response_cache')
+    if response_cache is not None:
+        # The cache may read its SQLite tier; keep that off the event loop
+        cached = await asyncio.to_thread(response_cache.get, content, params)
+        if cached is not None:
+            return cached
+
+    llm_client = env_vars.get('llm_client')
+    start = time.perf_counter()
+    try:
+        if llm_client is not None:
+            completion = await llm_client.complete_async(
+                openai_client.chat.completions.create, messages=content, **params
+            )
+        else:
+            completion = await openai_client.chat.completions.create(
+                messages=content,
+                **params,
+            )
+        llm_response = completion.choices[0].message.content
+        usage = getattr(completion, 'usage', None)
+        tokens = getattr(usage, 'total_tokens', 0)
+        tokens = tokens if isinstance(tokens, int) else 0
+        latency = time.perf_counter() - start
+        record_route(route, latency, env_vars, tokens=tokens)
+        return fresh_reply(llm_response, content, params, tokens=tokens, latency=latency)
+    except Exception as e:
+        print(f"Error contacting OpenAI: {e}")
+        return llm_failed(e, route, start, env_vars)
+
+
+async def send_message_via_twilio_async(phone_number, message_body, session_id, env_vars):
+    twilio_client = get_async_clients(env_vars).twilio_client
+    messaging_service_sid = env_vars['TWILIO_MESSAGING_SERVICE_SID']
+    from_number = env_vars['TWILIO_PHONE_NUMBER']
+
+    unique_id = str(uuid.uuid4())
+    try:
+        await twilio_client.messages.create_async(
+            messaging_service_sid=messaging_service_sid,
+            from_=from_number,
+            body=message_body,
+            to=phone_number
+        )
+        print(f'Sent message with UUID {unique_id}')
+    except Exception as e:
+        print(f"Error sending message via Twilio API: {e}")
+        if queue_failed_send(e, phone_number, message_body, env_vars):
+            return unique_id
+        return None
+
+    return unique_id
+
+
+async def write_log_to_storage_async(log_data, env_vars):
+    # The log sink usually just buffers in memory, but a size-triggered flush
+    # uploads to GCS (which has no async client), so keep it off the loop
+    return await asyncio.to_thread(write_log_to_storage, log_data, env_vars)
@@ -0,0 +1,75 @@
+# benchmarks/compare.py
+#
+# Compares two load-test or replay result files (see benchmarks/load_test.py
+# and benchmarks/replay.py) and exits non-zero if the candidate regressed by
+# more than a threshold on latency, throughput, errors, peak memory or, for
+# replays, prompt tokens and reply length.
+#
+#   python -m benchmarks.compare benchmarks/results/abc1234.json benchmarks/results/def5678.json --threshold 0.1
+
+import argparse
+import json
+import sys
+
+# (label, path into the results, True if higher is better)
+METRICS = (
+    ('p50 latency (ms)', ('latency_ms', 'p50'), False),
+    ('p95 latency (ms)', ('latency_ms', 'p95'), False),
+    ('p99 latency (ms)', ('latency_ms', 'p99'), False),
+    ('throughput (req/s)', ('throughput_rps',), True),
+    ('errors', ('errors',), False),
+    ('peak RSS (MB)', ('memory', 'peak_mb'), False),
+    # Replay runs only (benchmarks/replay.py)
+    ('mean prompt tokens', ('tokens', 'prompt_mean'), False),
+    ('mean reply chars', ('response_chars', 'mean'), False),
+)
+
+
+def _lookup(results, path):
+    value = results
+    for key in path:
+        value = value.get(key, {}) if isinstance(value, dict) else {}
+    return value if isinstance(value, (int, float)) else None
+
+
+def compare(baseline, candidate, threshold=0.1):
+    """Return (rows, regressions); each row is (label, baseline, candidate, relative change)."""
+    rows = []
+    regressions = []
+    for label, path, higher_is_better in METRICS:
+        before, after = _lookup(baseline, path), _lookup(candidate, path)
+        if before is None or after is None:
+            continue
+        change = (after - before) / before if before else (0.0 if after == before else float('inf'))
+        rows.append((label, before, after, change))
+        worse = -change if higher_is_better else change
+        if worse > threshold:
+            regressions.append(label)
+    return rows, regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare two load-test or replay result files.')
+    parser.add_argument('baseline')
+    parser.add_argument('candidate')
+    parser.add_argument('--threshold', type=float, default=0.1, help='allowed relative regression (0.1 = 10%%)')
+    args = parser.parse_args()
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.candidate) as f:
+        candidate = json.load(f)
+
+    rows, regressions = compare(baseline, candidate, args.threshold)
+    print(f"{'metric':20s} {baseline.get('commit', 'baseline'):>12s} {candidate.get('commit', 'candidate'):>12s}   change")
+    for label, before, after, change in rows:
+        flag = '  REGRESSION' if label in regressions else ''
+        print(f"{label:20s} {before:12.2f} {after:12.2f} {change:+8.1%}{flag}")
+
+    if regressions:
+        print(f"Regressed beyond {args.threshold:.0%}: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
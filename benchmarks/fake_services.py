@@ -0,0 +1,326 @@
+# benchmarks/fake_services.py
+#
+# Local HTTP stand-ins for OpenAI, Twilio, Cloud Storage and Secret Manager,
+# so the real SDKs (and the deployed code paths) can be driven end to end
+# without network access or credentials. Each fake can add latency and fail
+# a fraction of requests. Point the app at them with the variables returned
+# by `service_env()`.
+
+import base64
+import json
+import random
+import threading
+import time
+import uuid
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlparse
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self._dispatch('GET')
+
+    def do_POST(self):
+        self._dispatch('POST')
+
+    def _dispatch(self, method):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+        parsed = urlparse(self.path)
+        status, content_type, payload = self.server.service.respond(
+            method, parsed.path, parse_qs(parsed.query), self.headers, body
+        )
+        if isinstance(payload, (dict, list)):
+            payload = json.dumps(payload).encode('UTF-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeService:
+    """Threaded HTTP server with latency and error injection.
+
+    `latency` is seconds added to every request (plus up to `jitter` more);
+    `error_rate` is the fraction of requests answered with `error_status`.
+    Subclasses implement `handle()`.
+    """
+
+    error_status = 503
+
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, host='127.0.0.1', port=0, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+        self._server = ThreadingHTTPServer((host, port), _Handler)
+        self._server.daemon_threads = True
+        self._server.service = self
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name=type(self).__name__, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def stats(self):
+        return {'requests': self.requests, 'errors': self.errors}
+
+    def respond(self, method, path, query, headers, body):
+        with self._lock:
+            self.requests += 1
+            fail = self._rng.random() < self.error_rate
+            delay = self.latency + self._rng.random() * self.jitter
+            if fail:
+                self.errors += 1
+        if delay:
+            time.sleep(delay)
+        if fail:
+            return self.error_status, 'application/json', {'error': {'message': 'Injected failure'}}
+        try:
+            return self.handle(method, path, query, headers, body)
+        except KeyError as e:
+            return 404, 'application/json', {'error': {'message': f'Not found: {e}'}}
+
+    def handle(self, method, path, query, headers, body):
+        raise NotImplementedError
+
+
+class FakeOpenAI(FakeService):
+    """POST /v1/chat/completions, with or without `stream`."""
+
+    def __init__(self, reply='Quiet fake servers / answer every message fast / no tokens were spent', **kwargs):
+        super().__init__(**kwargs)
+        self.reply = reply
+
+    def handle(self, method, path, query, headers, body):
+        if method != 'POST' or not path.endswith('/chat/completions'):
+            raise KeyError(path)
+        request = json.loads(body or b'{}')
+        completion_id = f'chatcmpl-{uuid.uuid4().hex}'
+        model = request.get('model', 'gpt-4o')
+        created = int(time.time())
+        reply = self.reply_for(request)
+        if request.get('stream'):
+            return 200, 'text/event-stream', self._stream(completion_id, model, created, reply)
+        prompt_tokens = sum(len(str(m.get('content', '')).split()) for m in request.get('messages', []))
+        completion_tokens = len(reply.split())
+        return 200, 'application/json', {
+            'id': completion_id,
+            'object': 'chat.completion',
+            'created': created,
+            'model': model,
+            'choices': [{
+                'index': 0,
+                'message': {'role': 'assistant', 'content': reply},
+                'finish_reason': 'stop',
+            }],
+            'usage': {
+                'prompt_tokens': prompt_tokens,
+                'completion_tokens': completion_tokens,
+                'total_tokens': prompt_tokens + completion_tokens,
+            },
+        }
+
+    def reply_for(self, request):
+        """The text to answer a chat completion request with."""
+        return self.reply
+
+    def _stream(self, completion_id, model, created, reply):
+        events = []
+        words = reply.split(' ')
+        for i, word in enumerate(words):
+            delta = {'content': word if i == len(words) - 1 else word + ' '}
+            events.append({
+                'id': completion_id, 'object': 'chat.completion.chunk', 'created': created, 'model': model,
+                'choices': [{'index': 0, 'delta': delta, 'finish_reason': None}],
+            })
+        events.append({
+            'id': completion_id, 'object': 'chat.completion.chunk', 'created': created, 'model': model,
+            'choices': [{'index': 0, 'delta': {}, 'finish_reason': 'stop'}],
+        })
+        lines = [f'data: {json.dumps(event)}\n\n' for event in events] + ['data: [DONE]\n\n']
+        return ''.join(lines).encode('UTF-8')
+
+
+class FakeTwilio(FakeService):
+    """POST /2010-04-01/Accounts/{sid}/Messages.json; injected failures are 429s."""
+
+    error_status = 429
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.sent = []
+        self.sent_to = {}   # recipient -> messages sent to them, in order
+
+    def handle(self, method, path, query, headers, body):
+        parts = path.strip('/').split('/')
+        if method != 'POST' or len(parts) != 4 or parts[3] != 'Messages.json':
+            raise KeyError(path)
+        form = {key: values[0] for key, values in parse_qs(body.decode('UTF-8')).items()}
+        message = {
+            'sid': f'SM{uuid.uuid4().hex}',
+            'account_sid': parts[2],
+            'to': form.get('To'),
+            'from': form.get('From'),
+            'messaging_service_sid': form.get('MessagingServiceSid'),
+            'body': form.get('Body'),
+            'status': 'queued',
+            'num_segments': '1',
+            'direction': 'outbound-api',
+        }
+        with self._lock:
+            self.sent.append(message)
+            self.sent_to.setdefault(message['to'], []).append(message)
+        return 201, 'application/json', message
+
+
+class FakeStorage(FakeService):
+    """Enough of the GCS JSON API for uploads, listing and downloads (set STORAGE_EMULATOR_HOST)."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.objects = {}  # (bucket, name) -> (generation, bytes, content_type)
+
+    def handle(self, method, path, query, headers, body):
+        parts = [unquote(part) for part in path.strip('/').split('/')]
+        if method == 'POST' and parts[:4] == ['upload', 'storage', 'v1', 'b'] and parts[5:] == ['o']:
+            return self._upload(parts[4], query, headers, body)
+        if parts[:1] == ['download']:
+            parts = parts[1:]
+        if method == 'GET' and parts[:3] == ['storage', 'v1', 'b'] and len(parts) >= 5 and parts[4] == 'o':
+            bucket = parts[3]
+            if len(parts) == 5:
+                return self._list(bucket, query)
+            name = '/'.join(parts[5:])
+            generation, data, content_type = self.objects[(bucket, name)]
+            if query.get('alt') == ['media']:
+                return 200, content_type, data
+            return 200, 'application/json', self._resource(bucket, name, generation, data, content_type)
+        raise KeyError(path)
+
+    def _upload(self, bucket, query, headers, body):
+        if query.get('uploadType') == ['multipart']:
+            message = BytesParser(policy=HTTP).parsebytes(
+                f'Content-Type: {headers["Content-Type"]}\r\n\r\n'.encode('UTF-8') + body
+            )
+            metadata_part, media_part = list(message.iter_parts())[:2]
+            metadata = json.loads(metadata_part.get_payload(decode=True))
+            name = metadata['name']
+            content_type = metadata.get('contentType') or media_part.get_content_type()
+            data = media_part.get_payload(decode=True)
+        else:
+            name = query['name'][0]
+            content_type = headers.get('Content-Type', 'application/octet-stream')
+            data = body
+        generation = time.time_ns() // 1000
+        with self._lock:
+            self.objects[(bucket, name)] = (generation, data, content_type)
+        return 200, 'application/json', self._resource(bucket, name, generation, data, content_type)
+
+    def _list(self, bucket, query):
+        prefix = query.get('prefix', [''])[0]
+        with self._lock:
+            items = [
+                self._resource(b, name, generation, data, content_type)
+                for (b, name), (generation, data, content_type) in sorted(self.objects.items())
+                if b == bucket and name.startswith(prefix)
+            ]
+        return 200, 'application/json', {'kind': 'storage#objects', 'items': items}
+
+    def _resource(self, bucket, name, generation, data, content_type):
+        return {
+            'kind': 'storage#object',
+            'id': f'{bucket}/{name}/{generation}',
+            'bucket': bucket,
+            'name': name,
+            'generation': str(generation),
+            'metageneration': '1',
+            'contentType': content_type,
+            'size': str(len(data)),
+        }
+
+
+class FakeSecretManager(FakeService):
+    """GET /v1/projects/{p}/secrets/{s}/versions/{v}:access (set SECRET_MANAGER_EMULATOR_HOST)."""
+
+    def __init__(self, secrets=None, **kwargs):
+        super().__init__(**kwargs)
+        self.secrets = {name: [value] for name, value in (secrets or {}).items()}
+
+    def handle(self, method, path, query, headers, body):
+        resource, _, action = path.strip('/').partition(':')
+        parts = resource.split('/')
+        if action != 'access' or len(parts) != 7 or parts[3] != 'secrets':
+            raise KeyError(path)
+        versions = self.secrets[parts[4]]
+        number = len(versions) if parts[6] == 'latest' else int(parts[6])
+        if not 1 <= number <= len(versions):
+            raise KeyError(path)
+        name = '/'.join(parts[1:6] + [str(number)])
+        data = base64.b64encode(versions[number - 1].encode('UTF-8')).decode('ascii')
+        return 200, 'application/json', {'name': name, 'payload': {'data': data}}
+
+
+# Values the fakes hand out as secrets; the load generator signs requests with the auth token
+FAKE_SECRETS = {
+    'TWILIO_ACCOUNT_SID': 'AC00000000000000000000000000000000',
+    'TWILIO_AUTH_TOKEN': 'loadtest-auth-token',
+    'TWILIO_PHONE_NUMBER': '+15550000000',
+    'TO_PHONE_NUMBER': '+15550000001',
+    'OPENAI_API_KEY': 'sk-loadtest',
+    'TWILIO_MESSAGING_SERVICE_SID': 'MG00000000000000000000000000000000',
+}
+
+
+def start_fake_services(latency=0.0, jitter=0.0, error_rate=0.0, secrets=None, seed=None):
+    """Start one of each fake; returns {'openai': ..., 'twilio': ..., 'storage': ..., 'secretmanager': ...}."""
+    options = {'latency': latency, 'jitter': jitter, 'error_rate': error_rate, 'seed': seed}
+    return {
+        'openai': FakeOpenAI(**options).start(),
+        'twilio': FakeTwilio(**options).start(),
+        'storage': FakeStorage(**options).start(),
+        # Secrets load once per instance; failing them would just fail the cold start
+        'secretmanager': FakeSecretManager(secrets or FAKE_SECRETS, seed=seed).start(),
+    }
+
+
+def service_env(services):
+    """Environment variables that point the SDKs at the running fakes."""
+    return {
+        'OPENAI_BASE_URL': f"{services['openai'].url}/v1",
+        'TWILIO_API_BASE_URL': services['twilio'].url,
+        'STORAGE_EMULATOR_HOST': services['storage'].url,
+        'SECRET_MANAGER_EMULATOR_HOST': services['secretmanager'].url,
+    }
+
+
+def stop_fake_services(services):
+    for service in services.values():
+        service.stop()
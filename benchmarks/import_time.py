@@ -0,0 +1,77 @@
+# benchmarks/import_time.py
+#
+# Cold-start guard: imports the entry point in a fresh interpreter under
+# `python -X importtime` and fails if it takes longer than a budget or pulls
+# in one of the heavy SDKs that should only load on first use.
+#
+#   python -m benchmarks.import_time --module main --budget-ms 400
+
+import argparse
+import os
+import subprocess
+import sys
+
+DEFAULT_BUDGET_MS = 400
+
+# SDKs that must not be imported until a request actually needs a client
+DEFERRED_MODULES = (
+    'openai',
+    'twilio.rest',
+    'google.cloud.storage',
+    'google.cloud.secretmanager',
+)
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def measure(module='main'):
+    """Import `module` in a fresh interpreter; return (cumulative_ms, {imported module: cumulative_ms})."""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=REPO_ROOT, capture_output=True, text=True, check=True,
+    )
+    imported = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        imported[name.strip()] = int(cumulative) / 1000
+    return imported.get(module, 0.0), imported
+
+
+def check(module='main', budget_ms=DEFAULT_BUDGET_MS, runs=3):
+    """Return (best_ms, problems); problems is empty when the import is within budget."""
+    timings = []
+    problems = []
+    for _ in range(runs):
+        total_ms, imported = measure(module)
+        timings.append(total_ms)
+    best_ms = min(timings)
+
+    for deferred in DEFERRED_MODULES:
+        if deferred in imported:
+            problems.append(f'{module} imports {deferred} at load time ({imported[deferred]:.1f} ms)')
+    if best_ms > budget_ms:
+        slowest = sorted(imported.items(), key=lambda item: item[1], reverse=True)[1:6]
+        detail = ', '.join(f'{name} {ms:.1f} ms' for name, ms in slowest)
+        problems.append(f'import {module} took {best_ms:.1f} ms, budget is {budget_ms} ms (largest: {detail})')
+    return best_ms, problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Fail if importing the entry point exceeds a time budget.')
+    parser.add_argument('--module', default='main')
+    parser.add_argument('--budget-ms', type=float,
+                        default=float(os.getenv('IMPORT_TIME_BUDGET_MS', DEFAULT_BUDGET_MS)))
+    parser.add_argument('--runs', type=int, default=3, help='best of N fresh interpreters')
+    args = parser.parse_args()
+
+    best_ms, problems = check(args.module, args.budget_ms, args.runs)
+    print(f'import {args.module}: {best_ms:.1f} ms (budget {args.budget_ms:.0f} ms)')
+    for problem in problems:
+        print(f'FAIL: {problem}')
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,303 @@
+# benchmarks/load_test.py
+#
+# End-to-end load test. Starts the fake OpenAI, Twilio, Cloud Storage and
+# Secret Manager servers from benchmarks/fake_services.py, serves main.py
+# with functions-framework as if deployed (FUNCTION_NAME set, secrets read
+# from the fake Secret Manager), then posts Twilio-signed webhooks at a fixed
+# arrival rate and records latency percentiles, throughput, error counts and
+# the server's memory. Results are written as JSON so runs on different
+# commits can be compared with `python -m benchmarks.compare`.
+#
+#   python -m benchmarks.load_test --rate 50 --duration 30 --latency 0.2
+#
+# Feature flags (ASYNC_PIPELINE, SEND_SCHEDULER, ...) are passed through
+# from the environment, so the same run can be repeated with each enabled.
+
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from urllib.parse import urlencode
+
+from benchmarks.fake_services import FAKE_SECRETS, service_env, start_fake_services, stop_fake_services
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(REPO_ROOT, 'benchmarks', 'results')
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of `values` (0 < fraction <= 1); 0.0 when empty."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, int(round(fraction * len(ordered) + 0.5 - 1e-9)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def summarize(latencies, statuses, elapsed):
+    """Latency percentiles (ms), throughput and status counts for one run."""
+    ok = sum(count for status, count in statuses.items() if str(status).startswith('2'))
+    total = sum(statuses.values())
+    return {
+        'requests': total,
+        'ok': ok,
+        'errors': total - ok,
+        'statuses': {str(status): count for status, count in sorted(statuses.items(), key=str)},
+        'throughput_rps': round(ok / elapsed, 2) if elapsed else 0.0,
+        'latency_ms': {
+            'p50': round(percentile(latencies, 0.50) * 1000, 2),
+            'p95': round(percentile(latencies, 0.95) * 1000, 2),
+            'p99': round(percentile(latencies, 0.99) * 1000, 2),
+            'mean': round(sum(latencies) / len(latencies) * 1000, 2) if latencies else 0.0,
+            'max': round(max(latencies) * 1000, 2) if latencies else 0.0,
+        },
+    }
+
+
+def rss_bytes(pid):
+    """Resident memory of `pid` and all of its descendants, read from /proc (Linux only)."""
+    total = 0
+    pending = [pid]
+    while pending:
+        current = pending.pop()
+        try:
+            with open(f'/proc/{current}/status') as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        total += int(line.split()[1]) * 1024
+                        break
+            for task in os.listdir(f'/proc/{current}/task'):
+                with open(f'/proc/{current}/task/{task}/children') as f:
+                    pending.extend(int(child) for child in f.read().split())
+        except (FileNotFoundError, ProcessLookupError, PermissionError):
+            continue
+    return total
+
+
+class MemorySampler:
+    """Polls the server's RSS in the background, keeping the first, peak and last samples."""
+
+    def __init__(self, pid, interval=0.25):
+        self.pid = pid
+        self.interval = interval
+        self.samples = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='rss-sampler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        return self.summary()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.samples.append(rss_bytes(self.pid))
+            self._stop.wait(self.interval)
+
+    def summary(self):
+        mb = [sample / (1024 * 1024) for sample in self.samples if sample]
+        if not mb:
+            return {'start_mb': 0.0, 'peak_mb': 0.0, 'end_mb': 0.0}
+        return {'start_mb': round(mb[0], 1), 'peak_mb': round(max(mb), 1), 'end_mb': round(mb[-1], 1)}
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_server(port, services, workers, threads, workdir, extra_env=None):
+    """Serve main.auto_responder with functions-framework, configured for the fakes."""
+    env = dict(os.environ)
+    env.update(extra_env or {})
+    env.update(service_env(services))
+    env.update({
+        'FUNCTION_NAME': 'auto_responder',
+        'GCLOUD_PROJECT': env.get('GCLOUD_PROJECT', 'loadtest-dev'),
+        'GOOGLE_CLOUD_PROJECT': env.get('GCLOUD_PROJECT', 'loadtest-dev'),
+        'CONVERSATION_DB': os.path.join(workdir, 'conversations.sqlite3'),
+        'WORKERS': str(workers),
+        'THREADS': str(threads),
+        'PYTHONUNBUFFERED': '1',
+    })
+    env.pop('CI', None)
+    command = [
+        sys.executable, '-m', 'functions_framework',
+        '--target', 'auto_responder', '--source', os.path.join(REPO_ROOT, 'main.py'),
+        '--host', '127.0.0.1', '--port', str(port),
+    ]
+    log = open(os.path.join(workdir, 'server.log'), 'wb')
+    return subprocess.Popen(command, cwd=REPO_ROOT, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+
+def wait_until_listening(port, process, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited with status {process.returncode} before listening")
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise TimeoutError(f"Server did not start listening on port {port} within {timeout}s")
+
+
+def signed_request(url, params, auth_token):
+    """Build a webhook POST signed the way Twilio signs it."""
+    from twilio.request_validator import RequestValidator
+
+    signature = RequestValidator(auth_token).compute_signature(url, params)
+    return urllib.request.Request(
+        url,
+        data=urlencode(params).encode('UTF-8'),
+        headers={'Content-Type': 'application/x-www-form-urlencoded', 'X-Twilio-Signature': signature},
+        method='POST',
+    )
+
+
+def webhook_params(n, senders):
+    return {
+        'MessageSid': f'SM{n:032d}',
+        'AccountSid': FAKE_SECRETS['TWILIO_ACCOUNT_SID'],
+        'From': f'+1555{n % senders:07d}',
+        'To': FAKE_SECRETS['TWILIO_PHONE_NUMBER'],
+        'Body': f'Load test message {n}: what is a good haiku about latency?',
+    }
+
+
+def generate_load(url, rate, duration, auth_token, senders=50, max_in_flight=256, timeout=30.0, first=0):
+    """Open-loop load: request n is due at start + n / rate, whether or not earlier ones finished.
+
+    Latency is measured from the due time, so a backed-up server is not hidden by
+    the generator slowing down. Returns (latencies in seconds, {status: count}, elapsed).
+    """
+    latencies = []
+    statuses = {}
+    lock = threading.Lock()
+
+    def fire(request, due):
+        try:
+            with urllib.request.urlopen(request, timeout=timeout) as response:
+                response.read()
+                status = response.status
+        except urllib.error.HTTPError as e:
+            status = e.code
+        except Exception as e:
+            status = type(e).__name__
+        elapsed = time.perf_counter() - due
+        with lock:
+            latencies.append(elapsed)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    total = int(rate * duration)
+    # Sign up front so the generator's own CPU work stays off the request path
+    requests = [signed_request(url, webhook_params(first + n, senders), auth_token) for n in range(total)]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix='loadgen') as executor:
+        for n, request in enumerate(requests):
+            due = start + n / rate
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            executor.submit(fire, request, due)
+    return latencies, statuses, time.perf_counter() - start
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except Exception:
+        return 'unknown'
+
+
+def run(rate, duration, latency=0.0, jitter=0.0, error_rate=0.0, workers=1, threads=8, warmup=5, senders=50):
+    """Run one load test and return the results dictionary."""
+    services = start_fake_services(latency=latency, jitter=jitter, error_rate=error_rate, seed=0)
+    port = free_port()
+    url = f'http://127.0.0.1:{port}/'
+    with tempfile.TemporaryDirectory(prefix='loadtest-') as workdir:
+        process = start_server(port, services, workers, threads, workdir)
+        try:
+            wait_until_listening(port, process)
+            # Cold start: the first requests pay for secrets and client setup; keep them out of the numbers
+            generate_load(url, max(warmup, 1), 1, FAKE_SECRETS['TWILIO_AUTH_TOKEN'], senders)
+            sampler = MemorySampler(process.pid).start()
+            # Fresh MessageSids, so the webhook's deduplication doesn't short-circuit the run
+            latencies, statuses, elapsed = generate_load(
+                url, rate, duration, FAKE_SECRETS['TWILIO_AUTH_TOKEN'], senders, first=max(warmup, 1)
+            )
+            memory = sampler.stop()
+        finally:
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+            stop_fake_services(services)
+
+    flags = ('ASYNC_PIPELINE', 'SEND_SCHEDULER', 'STREAM_RESPONSES', 'RESPONSE_CACHE_SIZE', 'LOG_BUFFER',
+             'LOG_FLUSH_RECORDS')
+    results = {
+        'commit': git_commit(),
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'config': {
+            'rate': rate, 'duration': duration, 'latency': latency, 'jitter': jitter,
+            'error_rate': error_rate, 'workers': workers, 'threads': threads, 'senders': senders,
+            'flags': {flag: os.environ[flag] for flag in flags if flag in os.environ},
+        },
+        'memory': memory,
+        'upstream': {name: service.stats() for name, service in services.items()},
+    }
+    results.update(summarize(latencies, statuses, elapsed))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load-test the webhook against local fakes of its upstream services.')
+    parser.add_argument('--rate', type=float, default=20.0, help='webhook arrivals per second')
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds of load after warm-up')
+    parser.add_argument('--latency', type=float, default=0.05, help='added latency per upstream call, in seconds')
+    parser.add_argument('--jitter', type=float, default=0.0, help='extra random upstream latency, up to this many seconds')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of upstream calls that fail')
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--senders', type=int, default=50, help='distinct From numbers to cycle through')
+    parser.add_argument('--output', help='results file (default benchmarks/results/<commit>.json)')
+    args = parser.parse_args()
+
+    results = run(
+        args.rate, args.duration, latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+        workers=args.workers, threads=args.threads, senders=args.senders,
+    )
+
+    output = args.output or os.path.join(RESULTS_DIR, f"{results['commit']}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+
+    latency = results['latency_ms']
+    print(f"{results['requests']} requests, {results['errors']} errors, {results['throughput_rps']} req/s")
+    print(f"latency p50 {latency['p50']} ms  p95 {latency['p95']} ms  p99 {latency['p99']} ms  max {latency['max']} ms")
+    print(f"server RSS peak {results['memory']['peak_mb']} MB")
+    print(f"results written to {output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+# benchmarks/memory_profile.py
+#
+# Peak memory the webhook allocates per request as the body grows, measured
+# with tracemalloc. Forged requests (no valid signature) go through the size
+# guard and form parsing; that is the path an attacker can drive. With the
+# guard, peak memory stays flat however large the body is.
+#
+#   python -m benchmarks.memory_profile
+#   python -m benchmarks.memory_profile --limit 1000000000   # guard effectively off, for comparison
+
+import argparse
+import json
+import os
+import tracemalloc
+
+from flask import Flask, request
+
+DEFAULT_SIZES = (1024, 16 * 1024, 64 * 1024, 1024 * 1024, 8 * 1024 * 1024)
+
+
+def profile_request(app, handler, body_bytes, repeat=3):
+    """Peak traced bytes while `handler` serves one form post whose Body is about `body_bytes` long."""
+    data = {'From': '+15550001111', 'To': '+15550002222', 'MessageSid': 'SMmemory', 'Body': 'word ' * (body_bytes // 5)}
+    headers = {'X-Twilio-Signature': 'forged', 'X-Forwarded-Proto': 'https', 'X-Forwarded-Host': 'example.com'}
+    peaks, statuses = [], []
+    for _ in range(repeat):
+        # The request body is built before tracing starts; only what the handler allocates is counted
+        with app.test_request_context('/', method='POST', data=data, headers=headers):
+            tracemalloc.start()
+            try:
+                response = handler(request)
+                _, peak = tracemalloc.get_traced_memory()
+            finally:
+                tracemalloc.stop()
+        peaks.append(peak)
+        statuses.append(response[1] if isinstance(response, tuple) else response.status_code)
+    return min(peaks), statuses[-1]
+
+
+def profile_truncation(body_bytes):
+    """Peak traced bytes for cutting a message of `body_bytes` down to the token budget."""
+    from main import limit_message
+
+    text = 'word ' * (body_bytes // 5)
+    tracemalloc.start()
+    try:
+        truncated = limit_message(text)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak, len(truncated)
+
+
+def run(sizes=DEFAULT_SIZES, limit=None):
+    if limit is not None:
+        os.environ['MAX_REQUEST_BYTES'] = str(limit)
+    os.environ.setdefault('TWILIO_AUTH_TOKEN', 'benchmark_token')
+    os.environ.setdefault('TELEMETRY_SAMPLE_RATE', '0')
+    from main import handle_webhook
+
+    app = Flask(__name__)
+    results = []
+    for size in sizes:
+        peak, status = profile_request(app, handle_webhook, size)
+        truncation_peak, truncated_length = profile_truncation(min(size, 64 * 1024))
+        results.append({
+            'body_bytes': size,
+            'status': status,
+            'peak_request_kb': round(peak / 1024, 1),
+            'peak_truncate_kb': round(truncation_peak / 1024, 1),
+            'truncated_chars': truncated_length,
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure per-request peak memory for growing webhook bodies.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(DEFAULT_SIZES), help='body sizes in bytes')
+    parser.add_argument('--limit', type=int, help='MAX_REQUEST_BYTES to run with (default: the configured limit)')
+    parser.add_argument('--json', action='store_true', help='print results as JSON')
+    args = parser.parse_args()
+
+    results = run(args.sizes, args.limit)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'body bytes':>12} {'status':>6} {'peak KB':>10} {'truncate KB':>12} {'kept chars':>10}")
+    for r in results:
+        print(f"{r['body_bytes']:>12} {r['status']:>6} {r['peak_request_kb']:>10} "
+              f"{r['peak_truncate_kb']:>12} {r['truncated_chars']:>10}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,349 @@
+# benchmarks/replay.py
+#
+# Replays logged conversations through the webhook. The log records written by
+# write_log_to_storage are read from the bucket or a local copy of it. Each
+# record becomes a Twilio-signed webhook again, and is posted to main.py served
+# with functions-framework (as in benchmarks/load_test.py) against the local
+# fakes. The fake LLM answers each message with the reply that was logged for
+# it, cut to the request's max_tokens, so reply sizes follow real traffic.
+#
+#   python -m benchmarks.replay --dir ./logs-copy --concurrency 8
+#   python -m benchmarks.replay --bucket my-bucket --since 2024-05-01 --limit 500
+#
+# Each sender's messages are replayed in their original order, one at a time,
+# so conversation history builds up as it did in production. Different senders
+# run concurrently. Per request it records the status, the latency, the prompt
+# and completion tokens the LLM saw, and the length of what was texted back.
+# The totals are written in the load test's format, so two replays can be
+# compared with `python -m benchmarks.compare`. Message texts and phone
+# numbers are not copied into the results file.
+
+import argparse
+import json
+import os
+import subprocess
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from benchmarks.fake_services import (
+    FAKE_SECRETS, FakeOpenAI, FakeSecretManager, FakeStorage, FakeTwilio, stop_fake_services,
+)
+from benchmarks.load_test import (
+    RESULTS_DIR, free_port, git_commit, percentile, signed_request, start_server, summarize, wait_until_listening,
+)
+from log_index import DEFAULT_PREFIX, DirectorySource, GCSSource, parse_object, parse_time
+from tokens import count_message_tokens, count_tokens, truncate_to_tokens
+
+# Flags recorded with the results, since they change what a replay measures
+FLAGS = (
+    'STREAM_RESPONSES', 'SEND_SCHEDULER', 'RESPONSE_CACHE_SIZE', 'CONVERSATION_MAX_TURNS',
+    'CONVERSATION_TOKEN_BUDGET', 'MODEL_ROUTING', 'MODEL_ROUTES', 'LLM_RESILIENCE', 'MESSAGE_TOKEN_BUDGET',
+)
+
+WARM_UP_SENDER = '+15550009999'
+
+
+def load_records(source, prefix=DEFAULT_PREFIX, since=None, until=None, limit=None):
+    """Log records under `prefix` with a message, oldest first, optionally limited to a time window."""
+    start, end = parse_time(since), parse_time(until)
+    records = []
+    for name, generation in source.list(prefix):
+        for record in parse_object(name, source.read(name, generation)):
+            if not isinstance(record, dict) or not record.get('incoming_message') or not record.get('to_number'):
+                continue
+            at = parse_time(record.get('timestamp'))
+            if (start is not None and (at is None or at < start)) or (end is not None and (at is None or at >= end)):
+                continue
+            records.append(record)
+    records.sort(key=lambda record: parse_time(record.get('timestamp')) or 0.0)
+    return records[:limit] if limit else records
+
+
+def conversations(records):
+    """Group records by sender (the log's `to_number`), keeping each sender's messages in order."""
+    by_sender = {}
+    for record in records:
+        by_sender.setdefault(record['to_number'], []).append(record)
+    return list(by_sender.values())
+
+
+def _match(table, content):
+    """The key in `table` for `content`; failing an exact match, one that is a prefix of it or vice versa.
+
+    The webhook may cut a message shorter than it was when logged (a smaller
+    MESSAGE_TOKEN_BUDGET), so what the LLM sees can be a prefix of the record.
+    """
+    if content in table:
+        return content
+    for key in table:
+        if content and key and (key.startswith(content) or content.startswith(key)):
+            return key
+    return None
+
+
+class ReplayOpenAI(FakeOpenAI):
+    """Fake LLM that answers each message with the reply logged for it, and remembers each prompt's size.
+
+    Replies are looked up by the latest user message. A message that wasn't
+    logged gets the default fake reply. Every reply is cut to the request's
+    `max_tokens`, so routing or budget changes show up in reply sizes.
+    """
+
+    def __init__(self, records=(), **kwargs):
+        super().__init__(**kwargs)
+        self._replies = {}
+        self._calls = {}
+        for record in records:
+            if record.get('terse_response'):
+                self._replies.setdefault(record['incoming_message'], deque()).append(record['terse_response'])
+
+    def reply_for(self, request):
+        messages = request.get('messages') or []
+        content = next((m.get('content') or '' for m in reversed(messages) if m.get('role') == 'user'), '')
+        with self._lock:
+            key = _match(self._replies, content)
+            replies = self._replies.get(key)
+            reply = replies.popleft() if replies else self.reply
+            if replies is not None and not replies:
+                del self._replies[key]
+        max_tokens = request.get('max_tokens') or request.get('max_completion_tokens')
+        if max_tokens:
+            reply = truncate_to_tokens(reply, max_tokens)
+        call = {'prompt_tokens': count_message_tokens(messages), 'completion_tokens': count_tokens(reply)}
+        with self._lock:
+            self._calls.setdefault(content, deque()).append(call)
+        return reply
+
+    def take_call(self, message):
+        """Token counts of the oldest unclaimed LLM call for `message`, or None (e.g. answered from the cache)."""
+        with self._lock:
+            key = _match(self._calls, message)
+            calls = self._calls.get(key)
+            if not calls:
+                return None
+            call = calls.popleft()
+            if not calls:
+                del self._calls[key]
+            return call
+
+
+def start_replay_services(records, latency=0.0, jitter=0.0, error_rate=0.0, seed=None):
+    """Like start_fake_services, with an LLM that answers from `records`."""
+    options = {'latency': latency, 'jitter': jitter, 'error_rate': error_rate, 'seed': seed}
+    return {
+        'openai': ReplayOpenAI(records, **options).start(),
+        'twilio': FakeTwilio(**options).start(),
+        'storage': FakeStorage(**options).start(),
+        'secretmanager': FakeSecretManager(FAKE_SECRETS, seed=seed).start(),
+    }
+
+
+def post(url, params, auth_token, timeout=30.0):
+    """Post one signed webhook; returns (status, seconds)."""
+    request = signed_request(url, params, auth_token)
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            response.read()
+            status = response.status
+    except urllib.error.HTTPError as e:
+        status = e.code
+    except Exception as e:
+        status = type(e).__name__
+    return status, time.perf_counter() - start
+
+
+class Replayer:
+    """Posts recorded messages to `url` and attributes the fakes' LLM calls and sends to each one."""
+
+    def __init__(self, url, services, auth_token=FAKE_SECRETS['TWILIO_AUTH_TOKEN'], timeout=30.0):
+        self.url = url
+        self.llm = services['openai']
+        self.twilio = services['twilio']
+        self.auth_token = auth_token
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._sequence = 0
+
+    def replay_conversation(self, records):
+        """Replay one sender's records in order; returns one result per record."""
+        sender = records[0]['to_number']
+        claimed = 0
+        results = []
+        for record in records:
+            params = self.params(sender, record['incoming_message'], to=record.get('from_number'))
+            status, seconds = post(self.url, params, self.auth_token, self.timeout)
+            # The sender's next message isn't posted until this one is answered, so
+            # whatever was texted to them since the last one belongs to this reply
+            sent = self.twilio.sent_to.get(sender, [])[claimed:]
+            claimed += len(sent)
+            call = self.llm.take_call(record['incoming_message']) or {}
+            logged = record.get('terse_response') or ''
+            results.append({
+                'timestamp': record.get('timestamp'),
+                'status': status,
+                'latency_ms': round(seconds * 1000, 2),
+                'prompt_tokens': call.get('prompt_tokens'),
+                'completion_tokens': call.get('completion_tokens'),
+                'response_chars': sum(len(message['body'] or '') for message in sent),
+                'messages_sent': len(sent),
+                'logged_response_chars': len(logged),
+            })
+        return results
+
+    def params(self, sender, body, to=None):
+        """Webhook parameters for `body` from `sender` to the number `to` (default: the fake default number).
+
+        A record's `from_number` is the number it was sent to, so multi-tenant logs
+        replay against the tenant that answered them. Every request is signed with
+        `auth_token`, so tenants with their own token need it to match.
+        """
+        with self._lock:
+            self._sequence += 1
+            n = self._sequence
+        # Fresh MessageSids, so deduplication doesn't swallow a replay of the same log twice
+        return {
+            'MessageSid': f'SMreplay{n:026d}',
+            'AccountSid': FAKE_SECRETS['TWILIO_ACCOUNT_SID'],
+            'From': sender,
+            'To': to or FAKE_SECRETS['TWILIO_PHONE_NUMBER'],
+            'Body': body,
+        }
+
+    def run(self, records, concurrency=8):
+        """Replay every conversation in `records`, `concurrency` senders at a time; returns (results, elapsed)."""
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='replay') as executor:
+            batches = list(executor.map(self.replay_conversation, conversations(records)))
+        results = [result for batch in batches for result in batch]
+        results.sort(key=lambda result: parse_time(result['timestamp']) or 0.0)
+        return results, time.perf_counter() - start
+
+
+def summarize_replay(results, elapsed):
+    """summarize() over the replayed requests, plus token and reply-size totals."""
+    statuses = {}
+    for result in results:
+        statuses[result['status']] = statuses.get(result['status'], 0) + 1
+    summary = summarize([result['latency_ms'] / 1000 for result in results], statuses, elapsed)
+
+    def mean(values):
+        return round(sum(values) / len(values), 2) if values else 0.0
+
+    answered = [result for result in results if str(result['status']).startswith('2')]
+    prompt = [result['prompt_tokens'] for result in answered if result['prompt_tokens'] is not None]
+    completion = [result['completion_tokens'] for result in answered if result['completion_tokens'] is not None]
+    chars = [result['response_chars'] for result in answered]
+    summary.update({
+        'tokens': {
+            'llm_calls': len(prompt),
+            'prompt_mean': mean(prompt),
+            'prompt_total': sum(prompt),
+            'completion_mean': mean(completion),
+            'completion_total': sum(completion),
+        },
+        'response_chars': {
+            'mean': mean(chars),
+            'p95': percentile(chars, 0.95),
+            'max': max(chars, default=0),
+            'logged_mean': mean([result['logged_response_chars'] for result in answered]),
+        },
+        'messages_sent': sum(result['messages_sent'] for result in answered),
+    })
+    return summary
+
+
+def run(records, concurrency=8, latency=0.0, jitter=0.0, error_rate=0.0, workers=1, threads=None, source=None):
+    """Replay `records` through a freshly started server and return the results dictionary."""
+    services = start_replay_services(records, latency=latency, jitter=jitter, error_rate=error_rate, seed=0)
+    port = free_port()
+    replayer = Replayer(f'http://127.0.0.1:{port}/', services)
+    with tempfile.TemporaryDirectory(prefix='replay-') as workdir:
+        # Acknowledging early would hide the reply from the timing, so the pipeline stays off
+        process = start_server(port, services, workers, threads or concurrency, workdir,
+                               extra_env={'ASYNC_PIPELINE': ''})
+        try:
+            wait_until_listening(port, process)
+            # Cold start: the first request pays for secrets and client setup; keep it out of the numbers
+            post(replayer.url, replayer.params(WARM_UP_SENDER, 'Warm-up message'), replayer.auth_token)
+            results, elapsed = replayer.run(records, concurrency)
+        finally:
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+            stop_fake_services(services)
+
+    summary = {
+        'commit': git_commit(),
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'config': {
+            'source': source, 'records': len(records), 'conversations': len(conversations(records)),
+            'concurrency': concurrency, 'latency': latency, 'jitter': jitter, 'error_rate': error_rate,
+            'workers': workers, 'threads': threads or concurrency,
+            'flags': {flag: os.environ[flag] for flag in FLAGS if flag in os.environ},
+        },
+        'upstream': {name: service.stats() for name, service in services.items()},
+        'per_request': results,
+    }
+    summary.update(summarize_replay(results, elapsed))
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Replay logged conversations through the webhook against local fakes.')
+    where = parser.add_mutually_exclusive_group()
+    where.add_argument('--dir', default=os.getenv('LOG_DIR'), help='local directory laid out like the bucket')
+    where.add_argument('--bucket', help='Cloud Storage bucket (default BUCKET_NAME)')
+    parser.add_argument('--prefix', default=DEFAULT_PREFIX)
+    parser.add_argument('--since', help='ISO date or datetime (inclusive)')
+    parser.add_argument('--until', help='ISO date or datetime (exclusive)')
+    parser.add_argument('--limit', type=int, help='replay at most this many records (the oldest in the window)')
+    parser.add_argument('--concurrency', type=int, default=8, help='senders replayed at the same time')
+    parser.add_argument('--latency', type=float, default=0.0, help='added latency per upstream call, in seconds')
+    parser.add_argument('--jitter', type=float, default=0.0, help='extra random upstream latency, up to this many seconds')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of LLM and Twilio calls that fail')
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--threads', type=int, help='server threads per worker (default: --concurrency)')
+    parser.add_argument('--output', help='results file (default benchmarks/results/replay-<commit>.json)')
+    args = parser.parse_args(argv)
+
+    if args.bucket or not args.dir:
+        from google.cloud import storage
+        bucket = args.bucket or os.environ['BUCKET_NAME']
+        source, label = GCSSource(storage.Client(), bucket), f'gs://{bucket}/{args.prefix}'
+    else:
+        source, label = DirectorySource(args.dir), os.path.join(args.dir, args.prefix)
+    records = load_records(source, args.prefix, args.since, args.until, args.limit)
+    if not records:
+        print(f"No log records with messages found in {label}")
+        return
+
+    results = run(
+        records, args.concurrency, latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+        workers=args.workers, threads=args.threads, source=label,
+    )
+
+    output = args.output or os.path.join(RESULTS_DIR, f"replay-{results['commit']}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+
+    latency, tokens, chars = results['latency_ms'], results['tokens'], results['response_chars']
+    print(f"{results['requests']} requests in {results['config']['conversations']} conversations, "
+          f"{results['errors']} errors, {results['throughput_rps']} req/s")
+    print(f"latency p50 {latency['p50']} ms  p95 {latency['p95']} ms  p99 {latency['p99']} ms  max {latency['max']} ms")
+    print(f"prompt tokens mean {tokens['prompt_mean']}  completion tokens mean {tokens['completion_mean']}")
+    print(f"reply chars mean {chars['mean']}  p95 {chars['p95']}  (logged mean {chars['logged_mean']})")
+    print(f"results written to {output}")
+
+
+if __name__ == '__main__':
+    main()
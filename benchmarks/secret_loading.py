@@ -0,0 +1,53 @@
+# benchmarks/secret_loading.py
+#
+# Compares the old one-client-per-secret sequential fetch with SecretLoader
+# against the in-process fake Secret Manager. No network or credentials needed.
+#
+#   python -m benchmarks.secret_loading --latency 0.05
+
+import argparse
+import time
+
+from fakes import FakeSecretManagerClient
+from secret_loader import SecretLoader
+from utils import SECRET_NAMES
+
+
+def sequential(client, project_id):
+    """The pre-SecretLoader behaviour: one blocking round-trip per secret."""
+    values = {}
+    for secret_name in SECRET_NAMES:
+        name = f"projects/{project_id}/secrets/{secret_name}/versions/latest"
+        values[secret_name] = client.access_secret_version(name=name).payload.data.decode('UTF-8')
+    return values
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark Secret Manager loading against a local fake.')
+    parser.add_argument('--latency', type=float, default=0.05, help='simulated RPC latency in seconds')
+    args = parser.parse_args()
+
+    secrets = {name: [f'{name.lower()}-value'] for name in SECRET_NAMES}
+
+    client = FakeSecretManagerClient(secrets, latency=args.latency)
+    start = time.perf_counter()
+    sequential(client, 'bench_project')
+    sequential_time = time.perf_counter() - start
+
+    client = FakeSecretManagerClient(secrets, latency=args.latency)
+    loader = SecretLoader('bench_project', client=client)
+    start = time.perf_counter()
+    loader.load(SECRET_NAMES)
+    cold_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    loader.load(SECRET_NAMES)
+    warm_time = time.perf_counter() - start
+
+    print(f"sequential:        {sequential_time * 1000:8.1f} ms")
+    print(f"loader (cold):     {cold_time * 1000:8.1f} ms")
+    print(f"loader (warm):     {warm_time * 1000:8.3f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,14 @@
+# config.py
+#
+# Helpers for reading settings from the environment. Imports nothing from the
+# app, so any module can use them at import time without a cycle.
+
+import os
+
+
+def env_flag(name, default=False):
+    """True if the environment variable is set to a truthy value like 1/true/yes; `default` if unset."""
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
@@ -0,0 +1,142 @@
+# conversation_store.py
+
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from tokens import count_message_tokens
+
+DEFAULT_DB_PATH = '/tmp/conversations.sqlite3'
+DEFAULT_MAX_CONVERSATIONS = 1000
+DEFAULT_MAX_TURNS = 20
+DEFAULT_TOKEN_BUDGET = 1500
+
+
+class SQLiteHistoryBackend:
+    """Persists conversation turns in a local SQLite file.
+
+    Reads are a single indexed range query on (phone_number, id), so loading a
+    conversation never scans other senders' history.
+    """
+
+    def __init__(self, path=DEFAULT_DB_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS turns ('
+                ' id INTEGER PRIMARY KEY AUTOINCREMENT,'
+                ' phone_number TEXT NOT NULL,'
+                ' role TEXT NOT NULL,'
+                ' content TEXT NOT NULL,'
+                ' created_at REAL NOT NULL)'
+            )
+            self._conn.execute(
+                'CREATE INDEX IF NOT EXISTS turns_by_phone ON turns (phone_number, id)'
+            )
+
+    def load(self, phone_number, limit):
+        """Return the most recent `limit` messages for a number, oldest first."""
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT role, content FROM turns WHERE phone_number = ? ORDER BY id DESC LIMIT ?',
+                (phone_number, limit),
+            ).fetchall()
+        return [{'role': role, 'content': content} for role, content in reversed(rows)]
+
+    def append(self, phone_number, messages, keep):
+        """Store new messages and drop anything older than the newest `keep`."""
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.executemany(
+                'INSERT INTO turns (phone_number, role, content, created_at) VALUES (?, ?, ?, ?)',
+                [(phone_number, m['role'], m['content'], now) for m in messages],
+            )
+            self._conn.execute(
+                'DELETE FROM turns WHERE phone_number = ? AND id <= ('
+                ' SELECT id FROM turns WHERE phone_number = ? ORDER BY id DESC LIMIT 1 OFFSET ?)',
+                (phone_number, phone_number, keep),
+            )
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def trim_to_budget(history, token_budget):
+    """Keep the newest messages of `history` whose estimated tokens fit in `token_budget`."""
+    kept = []
+    used = 0
+    for message in reversed(history):
+        cost = count_message_tokens([message]) - count_message_tokens([])
+        if used + cost > token_budget:
+            break
+        kept.append(message)
+        used += cost
+    kept.reverse()
+    # Never start the window on an assistant reply to a message we dropped
+    while kept and kept[0]['role'] == 'assistant':
+        kept.pop(0)
+    return kept
+
+
+class ConversationStore:
+    """Per-sender chat history: an LRU cache of recent turns in front of a persistent backend."""
+
+    def __init__(self, backend, max_conversations=DEFAULT_MAX_CONVERSATIONS,
+                 max_turns=DEFAULT_MAX_TURNS, token_budget=DEFAULT_TOKEN_BUDGET):
+        self.backend = backend
+        self.max_conversations = max_conversations
+        self.max_messages = max_turns * 2
+        self.token_budget = token_budget
+        self._lock = threading.Lock()
+        self._cache = OrderedDict()
+
+    @classmethod
+    def from_env(cls):
+        """Build a store over SQLite, configured from the CONVERSATION_* variables."""
+        return cls(
+            SQLiteHistoryBackend(os.getenv('CONVERSATION_DB', DEFAULT_DB_PATH)),
+            max_conversations=int(os.getenv('CONVERSATION_CACHE_SIZE', DEFAULT_MAX_CONVERSATIONS)),
+            max_turns=int(os.getenv('CONVERSATION_MAX_TURNS', DEFAULT_MAX_TURNS)),
+            token_budget=int(os.getenv('CONVERSATION_TOKEN_BUDGET', DEFAULT_TOKEN_BUDGET)),
+        )
+
+    def history(self, phone_number):
+        """Return recent messages for a sender, oldest first."""
+        with self._lock:
+            cached = self._cache.get(phone_number)
+            if cached is not None:
+                self._cache.move_to_end(phone_number)
+                return list(cached)
+        history = self.backend.load(phone_number, self.max_messages)
+        with self._lock:
+            self._remember(phone_number, history)
+        return list(history)
+
+    def append(self, phone_number, user_message, assistant_message):
+        """Record one exchange for a sender."""
+        messages = [
+            {'role': 'user', 'content': user_message},
+            {'role': 'assistant', 'content': assistant_message},
+        ]
+        history = self.history(phone_number) + messages
+        with self._lock:
+            self._remember(phone_number, history[-self.max_messages:])
+        self.backend.append(phone_number, messages, self.max_messages)
+
+    def build_messages(self, phone_number, system_message, current_message):
+        """Return [system] + as much recent history as fits the token budget + [current]."""
+        fixed = count_message_tokens([system_message, current_message])
+        history = trim_to_budget(self.history(phone_number), self.token_budget - fixed)
+        return [system_message] + history + [current_message]
+
+    def _remember(self, phone_number, history):
+        self._cache[phone_number] = history
+        self._cache.move_to_end(phone_number)
+        while len(self._cache) > self.max_conversations:
+            self._cache.popitem(last=False)
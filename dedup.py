@@ -0,0 +1,142 @@
+# dedup.py
+
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_TTL_SECONDS = 600
+DEFAULT_MAX_ENTRIES = 10000
+
+
+class SQLiteDedupBackend:
+    """MessageSid claims shared by every process that opens the same SQLite file.
+
+    The primary key makes a claim atomic: of several instances racing on one
+    retry, exactly one INSERT succeeds.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=5.0)
+        with self._lock, self._conn:
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS claims ('
+                ' message_sid TEXT PRIMARY KEY,'
+                ' expires_at REAL NOT NULL)'
+            )
+
+    def claim(self, message_sid, ttl):
+        """Return True if this caller is the first to claim `message_sid` within `ttl` seconds."""
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute('DELETE FROM claims WHERE message_sid = ? AND expires_at <= ?', (message_sid, now))
+            cursor = self._conn.execute(
+                'INSERT OR IGNORE INTO claims (message_sid, expires_at) VALUES (?, ?)',
+                (message_sid, now + ttl),
+            )
+            return cursor.rowcount == 1
+
+    def release(self, message_sid):
+        with self._lock, self._conn:
+            self._conn.execute('DELETE FROM claims WHERE message_sid = ?', (message_sid,))
+
+    def purge_expired(self):
+        with self._lock, self._conn:
+            self._conn.execute('DELETE FROM claims WHERE expires_at <= ?', (time.time(),))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class MessageDeduplicator:
+    """Remembers which Twilio MessageSids are being (or have been) handled.
+
+    A bounded in-memory map answers repeat deliveries to the same instance without
+    I/O; the optional shared `backend` catches retries routed to other instances.
+    Claims expire after `ttl` seconds. A failed attempt should `release` its claim
+    so Twilio's next retry is processed normally.
+    """
+
+    def __init__(self, backend=None, max_entries=DEFAULT_MAX_ENTRIES, ttl=DEFAULT_TTL_SECONDS, clock=time.monotonic):
+        self.backend = backend
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._seen = OrderedDict()  # message_sid -> expires_at
+        self.duplicates = 0
+
+    @classmethod
+    def from_env(cls):
+        """Build from DEDUP_TTL, DEDUP_CACHE_SIZE and DEDUP_DB (a SQLite path shared across instances)."""
+        path = os.getenv('DEDUP_DB')
+        return cls(
+            backend=SQLiteDedupBackend(path) if path else None,
+            max_entries=int(os.getenv('DEDUP_CACHE_SIZE', DEFAULT_MAX_ENTRIES)),
+            ttl=float(os.getenv('DEDUP_TTL', DEFAULT_TTL_SECONDS)),
+        )
+
+    def claim(self, message_sid):
+        """Return True if `message_sid` should be processed, False if it is a duplicate."""
+        if not message_sid:
+            return True
+        now = self._clock()
+        with self._lock:
+            expires_at = self._seen.get(message_sid)
+            if expires_at is not None and expires_at > now:
+                self.duplicates += 1
+                return False
+            self._remember(message_sid, now + self.ttl)
+
+        if self.backend is not None:
+            try:
+                claimed = self.backend.claim(message_sid, self.ttl)
+            except Exception as e:
+                # Fail open: answering twice is better than dropping a message
+                print(f"Error checking shared dedup store: {e}")
+                claimed = True
+            if not claimed:
+                with self._lock:
+                    self.duplicates += 1
+                return False
+        return True
+
+    def release(self, message_sid):
+        """Forget a claim so a retry of `message_sid` is processed again."""
+        if not message_sid:
+            return
+        with self._lock:
+            self._seen.pop(message_sid, None)
+        if self.backend is not None:
+            try:
+                self.backend.release(message_sid)
+            except Exception as e:
+                print(f"Error releasing dedup claim: {e}")
+
+    def __len__(self):
+        return len(self._seen)
+
+    def _remember(self, message_sid, expires_at):
+        self._seen[message_sid] = expires_at
+        self._seen.move_to_end(message_sid)
+        while len(self._seen) > self.max_entries:
+            self._seen.popitem(last=False)
+
+
+_deduplicator = None
+_deduplicator_lock = threading.Lock()
+
+
+def get_deduplicator():
+    """Return the instance-wide MessageDeduplicator, creating it on first use."""
+    global _deduplicator
+    if _deduplicator is None:
+        with _deduplicator_lock:
+            if _deduplicator is None:
+                _deduplicator = MessageDeduplicator.from_env()
+    return _deduplicator
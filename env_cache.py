@@ -0,0 +1,89 @@
+# env_cache.py
+
+import os
+import threading
+import time
+
+DEFAULT_TTL_SECONDS = 300
+
+
+class EnvironmentCache:
+    """Process-level cache for the env_vars bundle, shared across requests on a warm instance.
+
+    The bundle is built once by `loader` on first use. Once it is older than `ttl`
+    seconds the stale bundle keeps being served while a background thread rebuilds it,
+    so no request ever waits on a refresh after the first one.
+    """
+
+    def __init__(self, loader, ttl=None, clock=time.monotonic):
+        self._loader = loader
+        if ttl is None:
+            ttl = float(os.getenv('ENV_CACHE_TTL', DEFAULT_TTL_SECONDS))
+        self.ttl = ttl
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._env_vars = None
+        self._loaded_at = 0.0
+        self._refresh_thread = None
+
+    def get(self):
+        """Return the cached bundle, loading it synchronously only on first use."""
+        env_vars = self._env_vars
+        if env_vars is None:
+            with self._lock:
+                if self._env_vars is None:
+                    self._store(self._loader(None))
+                return self._env_vars
+
+        if self._clock() - self._loaded_at >= self.ttl:
+            self._start_background_refresh()
+        return env_vars
+
+    def peek(self):
+        """Return the cached bundle if one is loaded, without loading or refreshing."""
+        return self._env_vars
+
+    def refresh(self):
+        """Rebuild the bundle now, reusing clients from the current one where possible."""
+        with self._lock:
+            self._store(self._loader(self._env_vars))
+            return self._env_vars
+
+    def set(self, env_vars):
+        """Inject a bundle directly (used by tests and by callers that build their own)."""
+        with self._lock:
+            self._store(env_vars)
+
+    def clear(self):
+        """Drop the cached bundle so the next get() loads a fresh one."""
+        with self._lock:
+            self._env_vars = None
+            self._loaded_at = 0.0
+
+    def _store(self, env_vars):
+        self._env_vars = env_vars
+        self._loaded_at = self._clock()
+
+    def _start_background_refresh(self):
+        with self._lock:
+            if self._refresh_thread is not None and self._refresh_thread.is_alive():
+                return
+            # Push the deadline forward so concurrent requests don't all try to refresh
+            self._loaded_at = self._clock()
+            self._refresh_thread = threading.Thread(
+                target=self._background_refresh, name='env-cache-refresh', daemon=True
+            )
+            self._refresh_thread.start()
+
+    def _background_refresh(self):
+        try:
+            self.refresh()
+        except Exception as e:
+            # Keep serving the stale bundle; the next expiry will try again
+            print(f"Error refreshing environment in background: {e}")
+
+    def wait_for_refresh(self, timeout=None):
+        """Block until an in-flight background refresh finishes."""
+        thread = self._refresh_thread
+        if thread is not None:
+            thread.join(timeout)
@@ -0,0 +1,96 @@
+# fakes.py
+#
+# In-process stand-ins for the cloud services we call, used by tests and the
+# offline benchmarks in benchmarks/. They mimic just enough of each SDK's
+# surface for our code paths, and can inject latency and failures.
+
+import threading
+import time
+import uuid
+from types import SimpleNamespace
+
+from send_scheduler import TokenBucket
+
+
+class FakeSecretManagerClient:
+    """Mimics SecretManagerServiceClient.access_secret_version over an in-memory store.
+
+    `secrets` maps a secret name to its list of versions (version 1 first).
+    """
+
+    def __init__(self, secrets=None, latency=0.0, fail_names=()):
+        self._secrets = {name: list(versions) for name, versions in (secrets or {}).items()}
+        self.latency = latency
+        self.fail_names = set(fail_names)
+        self._lock = threading.Lock()
+        self.calls = []
+
+    def add_version(self, secret_name, value):
+        """Add a new version and return its number, like `gcloud secrets versions add`."""
+        with self._lock:
+            versions = self._secrets.setdefault(secret_name, [])
+            versions.append(value)
+            return str(len(versions))
+
+    def access_secret_version(self, name):
+        with self._lock:
+            self.calls.append(name)
+        if self.latency:
+            time.sleep(self.latency)
+
+        # projects/{project}/secrets/{secret}/versions/{version}
+        parts = name.split('/')
+        secret_name, version = parts[3], parts[5]
+        if secret_name in self.fail_names:
+            raise RuntimeError(f"Injected failure for secret {secret_name}")
+        versions = self._secrets.get(secret_name)
+        if not versions:
+            raise LookupError(f"Secret {secret_name} not found")
+
+        number = len(versions) if version == 'latest' else int(version)
+        if not 1 <= number <= len(versions):
+            raise LookupError(f"Secret {secret_name} has no version {version}")
+
+        resolved = '/'.join(parts[:5] + [str(number)])
+        payload = SimpleNamespace(data=versions[number - 1].encode('UTF-8'))
+        return SimpleNamespace(name=resolved, payload=payload)
+
+
+class FakeTwilioClient:
+    """Mimics twilio Client.messages.create, including 429s when a sender exceeds `rate`.
+
+    `rate` is messages per second per messaging service (or from number); None disables
+    throttling. Accepted messages are kept in `sent`.
+    """
+
+    def __init__(self, rate=None, burst=1, latency=0.0):
+        self.rate = rate
+        self.burst = burst
+        self.latency = latency
+        self._lock = threading.Lock()
+        self._buckets = {}
+        self.sent = []
+        self.rejected = 0
+        # Real clients expose the resource as client.messages
+        self.messages = self
+
+    def create(self, to, body, messaging_service_sid=None, from_=None, **kwargs):
+        from twilio.base.exceptions import TwilioRestException
+
+        if self.latency:
+            time.sleep(self.latency)
+        service = messaging_service_sid or from_
+        with self._lock:
+            if self.rate is not None:
+                bucket = self._buckets.get(service)
+                if bucket is None:
+                    bucket = self._buckets[service] = TokenBucket(self.rate, self.burst)
+                if bucket.try_acquire():
+                    self.rejected += 1
+                    raise TwilioRestException(429, '/Messages.json', 'Too Many Requests')
+            message = SimpleNamespace(
+                sid=f'SM{uuid.uuid4().hex}', to=to, body=body, from_=from_,
+                messaging_service_sid=messaging_service_sid, status='queued',
+            )
+            self.sent.append(message)
+        return message
@@ -0,0 +1,256 @@
+# llm_client.py
+
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from config import env_flag
+from telemetry import get_telemetry
+
+DEFAULT_DEADLINE = 20.0
+DEFAULT_HEDGE_DELAY = 3.0       # used until enough calls have been seen to know the p95
+DEFAULT_MIN_HEDGE_DELAY = 0.5
+DEFAULT_FAILURE_THRESHOLD = 5
+DEFAULT_RESET_TIMEOUT = 30.0
+DEFAULT_WORKERS = 32
+MIN_LATENCY_SAMPLES = 20
+DEFAULT_FALLBACK_REPLY = "Sorry, I can't answer right now. Please try again in a few minutes."
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling the LLM while the circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """Opens after `failure_threshold` consecutive failures; after `reset_timeout` seconds one probe call is let through."""
+
+    def __init__(self, failure_threshold=DEFAULT_FAILURE_THRESHOLD, reset_timeout=DEFAULT_RESET_TIMEOUT,
+                 clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+
+    @property
+    def state(self):
+        if self._opened_at is None:
+            return 'closed'
+        return 'half_open' if self._clock() - self._opened_at >= self.reset_timeout else 'open'
+
+    def allow(self):
+        with self._lock:
+            state = self.state
+            if state == 'closed':
+                return True
+            if state == 'half_open' and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._probing or self._failures >= self.failure_threshold:
+                self._opened_at = self._clock()
+                self._probing = False
+
+
+class LatencyWindow:
+    """The last `size` successful call latencies, for estimating p95."""
+
+    def __init__(self, size=200):
+        self._latencies = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        with self._lock:
+            self._latencies.append(seconds)
+
+    def p95(self):
+        with self._lock:
+            if len(self._latencies) < MIN_LATENCY_SAMPLES:
+                return None
+            ordered = sorted(self._latencies)
+        return ordered[int(0.95 * (len(ordered) - 1))]
+
+
+class ResilientLLMClient:
+    """Deadlines, hedging and a circuit breaker around chat completion calls.
+
+    Each call gets `deadline` seconds in total. If no answer has arrived by the
+    recent p95 latency, a duplicate (hedge) request is fired and whichever returns
+    first wins. A call that fails fast is retried once the same way. While the
+    breaker is open, calls raise CircuitOpenError immediately; callers answer with
+    a cached or canned reply instead.
+    """
+
+    def __init__(self, deadline=DEFAULT_DEADLINE, hedge=True, hedge_delay=DEFAULT_HEDGE_DELAY,
+                 min_hedge_delay=DEFAULT_MIN_HEDGE_DELAY, breaker=None, fallback_reply=DEFAULT_FALLBACK_REPLY,
+                 max_workers=DEFAULT_WORKERS, clock=time.monotonic):
+        self.deadline = deadline
+        self.hedge = hedge
+        self.default_hedge_delay = hedge_delay
+        self.min_hedge_delay = min_hedge_delay
+        self.breaker = breaker or CircuitBreaker(clock=clock)
+        self.fallback_reply = fallback_reply
+        self._clock = clock
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='llm-call')
+        self.latencies = LatencyWindow()
+        self._lock = threading.Lock()
+        self.stats = {
+            'calls': 0, 'failures': 0, 'timeouts': 0, 'short_circuits': 0,
+            'hedges_fired': 0, 'hedges_won': 0, 'retries_fired': 0, 'retries_won': 0,
+        }
+
+    @classmethod
+    def from_env(cls):
+        """Build from the LLM_* settings; None unless LLM_RESILIENCE is on. LLM_FALLBACK_REPLY='' disables the canned reply."""
+        if not env_flag('LLM_RESILIENCE'):
+            return None
+        return cls(
+            deadline=float(os.getenv('LLM_DEADLINE', DEFAULT_DEADLINE)),
+            hedge=env_flag('LLM_HEDGE', default=True),
+            min_hedge_delay=float(os.getenv('LLM_MIN_HEDGE_DELAY', DEFAULT_MIN_HEDGE_DELAY)),
+            breaker=CircuitBreaker(
+                failure_threshold=int(os.getenv('LLM_BREAKER_FAILURES', DEFAULT_FAILURE_THRESHOLD)),
+                reset_timeout=float(os.getenv('LLM_BREAKER_RESET', DEFAULT_RESET_TIMEOUT)),
+            ),
+            fallback_reply=os.getenv('LLM_FALLBACK_REPLY', DEFAULT_FALLBACK_REPLY) or None,
+        )
+
+    def hedge_delay(self):
+        p95 = self.latencies.p95()
+        return max(self.min_hedge_delay, self.default_hedge_delay if p95 is None else p95)
+
+    def complete(self, create, **kwargs):
+        """Call `create(**kwargs)` (e.g. chat.completions.create) with deadline, hedging and the breaker."""
+        self._admit()
+        kwargs.setdefault('timeout', self.deadline)
+        start = self._clock()
+        deadline = start + self.deadline
+        hedge_at = start + self.hedge_delay()
+
+        futures = {self._executor.submit(create, **kwargs): 'primary'}
+        pending = set(futures)
+        backup_sent = False
+        last_error = None
+        while pending:
+            now = self._clock()
+            if now >= deadline:
+                break
+            timeout = deadline - now
+            if self.hedge and not backup_sent:
+                timeout = min(timeout, max(0.0, hedge_at - now))
+            done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    result = future.result()
+                except Exception as e:
+                    last_error = e
+                    continue
+                self._succeeded(start, futures[future])
+                return result
+            if not backup_sent and self._clock() < deadline and (done or (self.hedge and self._clock() >= hedge_at)):
+                backup_sent = True
+                kind = 'retries' if done else 'hedges'
+                self._count(f'{kind}_fired')
+                future = self._executor.submit(create, **kwargs)
+                futures[future] = kind
+                pending.add(future)
+
+        return self._failed(pending, last_error)
+
+    async def complete_async(self, create, **kwargs):
+        """Async version of `complete` for coroutine `create` functions; losing requests are cancelled."""
+        self._admit()
+        kwargs.setdefault('timeout', self.deadline)
+        start = self._clock()
+        deadline = start + self.deadline
+        hedge_at = start + self.hedge_delay()
+
+        tasks = {asyncio.ensure_future(create(**kwargs)): 'primary'}
+        pending = set(tasks)
+        backup_sent = False
+        last_error = None
+        try:
+            while pending:
+                now = self._clock()
+                if now >= deadline:
+                    break
+                timeout = deadline - now
+                if self.hedge and not backup_sent:
+                    timeout = min(timeout, max(0.0, hedge_at - now))
+                done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is not None:
+                        last_error = task.exception()
+                        continue
+                    self._succeeded(start, tasks[task])
+                    return task.result()
+                if not backup_sent and self._clock() < deadline and (done or (self.hedge and self._clock() >= hedge_at)):
+                    backup_sent = True
+                    kind = 'retries' if done else 'hedges'
+                    self._count(f'{kind}_fired')
+                    task = asyncio.ensure_future(create(**kwargs))
+                    tasks[task] = kind
+                    pending.add(task)
+            return self._failed(pending, last_error)
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def allow(self):
+        """For callers that make the call themselves (streaming): False means answer with a fallback."""
+        if self.breaker.allow():
+            return True
+        self._count('short_circuits')
+        return False
+
+    def record(self, seconds, error=False):
+        """Report the outcome of a call made outside `complete` (e.g. a stream)."""
+        self._count('calls')
+        if error:
+            self._count('failures')
+            self.breaker.record_failure()
+        else:
+            self.latencies.record(seconds)
+            self.breaker.record_success()
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+
+    def _admit(self):
+        if not self.allow():
+            raise CircuitOpenError("LLM circuit breaker is open")
+        self._count('calls')
+
+    def _succeeded(self, start, kind):
+        self.latencies.record(self._clock() - start)
+        self.breaker.record_success()
+        if kind != 'primary':
+            self._count(f'{kind}_won')
+
+    def _failed(self, pending, last_error):
+        self._count('failures')
+        self.breaker.record_failure()
+        if pending or last_error is None:
+            self._count('timeouts')
+            raise TimeoutError(f"LLM call missed its {self.deadline}s deadline") from last_error
+        raise last_error
+
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+        get_telemetry().increment(f'llm_{name}')
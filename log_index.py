@@ -0,0 +1,327 @@
+# log_index.py
+"""Incrementally index the interaction logs into SQLite and query them without touching the bucket.
+
+    python log_index.py ingest --dir ./logs-copy          # or --bucket my-bucket
+    python log_index.py query --phone +15551234567 --since 2024-05-01 --text refund
+
+Each log object is remembered with its generation, so re-running `ingest` only
+downloads objects that are new or were rewritten. Both layouts are read: the
+legacy one-record `logs/<timestamp>.json` objects and the batched
+`logs/dt=YYYY-MM-DD/*.ndjson.gz` objects written by the log sink.
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import date, datetime, timedelta, timezone
+
+from log_sink import decode_batch
+
+DEFAULT_INDEX_PATH = 'log_index.db'
+DEFAULT_PREFIX = 'logs'
+DEFAULT_LIMIT = 100
+
+FIELDS = ('timestamp', 'from_number', 'to_number', 'incoming_message', 'terse_response')
+
+
+def parse_time(value):
+    """Seconds since the epoch for an ISO date or datetime (naive values are taken as UTC), or None."""
+    if value is None or value == '':
+        return None
+    try:
+        parsed = datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+def parse_object(name, data):
+    """Return the log records stored in one object, in either layout."""
+    if name.endswith('.ndjson.gz'):
+        return decode_batch(data)
+    records = json.loads(data.decode('UTF-8'))
+    return records if isinstance(records, list) else [records]
+
+
+class DirectorySource:
+    """Log objects under a local directory laid out like the bucket (e.g. LOG_DIR or a `gsutil rsync` copy).
+
+    The file's modification time in nanoseconds stands in for the GCS generation.
+    """
+
+    def __init__(self, root):
+        self.root = root
+
+    def list(self, prefix=DEFAULT_PREFIX, start_offset=None, end_offset=None):
+        """Yield (name, generation) for objects under `prefix`, optionally limited to a name range."""
+        top = os.path.join(self.root, prefix)
+        for dirpath, dirnames, filenames in os.walk(top):
+            dirnames.sort()
+            for filename in sorted(filenames):
+                if filename.endswith('.tmp'):
+                    continue
+                path = os.path.join(dirpath, filename)
+                name = os.path.relpath(path, self.root).replace(os.sep, '/')
+                if (start_offset and name < start_offset) or (end_offset and name >= end_offset):
+                    continue
+                yield name, os.stat(path).st_mtime_ns
+
+    def read(self, name, generation):
+        with open(os.path.join(self.root, name), 'rb') as f:
+            return f.read()
+
+
+class GCSSource:
+    """Log objects in a Cloud Storage bucket."""
+
+    def __init__(self, storage_client, bucket_name):
+        self.storage_client = storage_client
+        self.bucket_name = bucket_name
+
+    def list(self, prefix=DEFAULT_PREFIX, start_offset=None, end_offset=None):
+        blobs = self.storage_client.list_blobs(
+            self.bucket_name, prefix=prefix + '/', start_offset=start_offset, end_offset=end_offset,
+        )
+        for blob in blobs:
+            yield blob.name, blob.generation
+
+    def read(self, name, generation):
+        bucket = self.storage_client.bucket(self.bucket_name)
+        return bucket.blob(name, generation=generation).download_as_bytes()
+
+
+class LogIndex:
+    """SQLite index of log records, keyed by the object (and generation) each came from.
+
+    Text search uses an FTS5 table over the message and reply when SQLite has it,
+    and falls back to LIKE otherwise.
+    """
+
+    def __init__(self, path=DEFAULT_INDEX_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock, self._conn:
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.executescript(
+                'CREATE TABLE IF NOT EXISTS objects ('
+                ' name TEXT PRIMARY KEY,'
+                ' generation INTEGER NOT NULL,'
+                ' records INTEGER NOT NULL,'
+                ' ingested_at REAL NOT NULL);'
+                'CREATE TABLE IF NOT EXISTS messages ('
+                ' id INTEGER PRIMARY KEY,'
+                ' object TEXT NOT NULL,'
+                ' timestamp TEXT,'
+                ' epoch REAL,'
+                ' from_number TEXT,'
+                ' to_number TEXT,'
+                ' incoming_message TEXT,'
+                ' terse_response TEXT);'
+                'CREATE INDEX IF NOT EXISTS messages_epoch ON messages (epoch);'
+                'CREATE INDEX IF NOT EXISTS messages_to ON messages (to_number, epoch);'
+                'CREATE INDEX IF NOT EXISTS messages_from ON messages (from_number, epoch);'
+                'CREATE INDEX IF NOT EXISTS messages_object ON messages (object);'
+                'CREATE TABLE IF NOT EXISTS watermarks (key TEXT PRIMARY KEY, value TEXT NOT NULL);'
+            )
+            try:
+                self._conn.execute(
+                    'CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(incoming_message, terse_response)'
+                )
+                self.full_text = True
+            except sqlite3.OperationalError:
+                self.full_text = False
+
+    def ingest(self, source, prefix=DEFAULT_PREFIX, full=False):
+        """Index objects that are new or changed since the last run; returns counts of what was done.
+
+        Normally only the legacy objects after the last one seen, and the partitions
+        from the day before the newest one seen, are listed. `full` lists everything,
+        which also picks up late writes to older partitions.
+        """
+        counts = {'listed': 0, 'ingested': 0, 'records': 0, 'unchanged': 0, 'failed': 0}
+        legacy_end = f'{prefix}/dt='
+        if full:
+            ranges = [(None, None)]
+        else:
+            ranges = [
+                (self._watermark('legacy'), legacy_end),
+                (self._partition_start(prefix), None),
+            ]
+
+        for start_offset, end_offset in ranges:
+            for name, generation in source.list(prefix, start_offset=start_offset, end_offset=end_offset):
+                counts['listed'] += 1
+                if self._generation(name) == generation:
+                    counts['unchanged'] += 1
+                    continue
+                try:
+                    records = parse_object(name, source.read(name, generation))
+                except Exception as e:
+                    # Left unrecorded so the next run tries it again
+                    print(f"Error indexing log object {name}: {e}")
+                    counts['failed'] += 1
+                    continue
+                self._replace(name, generation, records)
+                self._advance_watermark(name, prefix)
+                counts['ingested'] += 1
+                counts['records'] += len(records)
+        return counts
+
+    def query(self, since=None, until=None, phone=None, text=None, limit=DEFAULT_LIMIT):
+        """Records matching every given filter, newest first.
+
+        `since`/`until` are ISO dates or datetimes, `phone` matches either side of
+        the conversation and `text` searches the message and the reply.
+        """
+        clauses, args = [], []
+        start, end = parse_time(since), parse_time(until)
+        if start is not None:
+            clauses.append('m.epoch >= ?')
+            args.append(start)
+        if end is not None:
+            clauses.append('m.epoch < ?')
+            args.append(end)
+        if phone:
+            clauses.append('(m.to_number = ? OR m.from_number = ?)')
+            args += [phone, phone]
+        if text:
+            if self.full_text:
+                clauses.append('m.id IN (SELECT rowid FROM messages_fts WHERE messages_fts MATCH ?)')
+                args.append('"' + text.replace('"', '""') + '"')
+            else:
+                clauses.append('(m.incoming_message LIKE ? OR m.terse_response LIKE ?)')
+                args += [f'%{text}%'] * 2
+        where = ' WHERE ' + ' AND '.join(clauses) if clauses else ''
+        with self._lock:
+            rows = self._conn.execute(
+                f'SELECT m.object, {", ".join("m." + field for field in FIELDS)} FROM messages m{where}'
+                ' ORDER BY m.epoch DESC, m.id DESC LIMIT ?',
+                args + [limit],
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def stats(self):
+        with self._lock:
+            objects = self._conn.execute('SELECT COUNT(*) FROM objects').fetchone()[0]
+            records, oldest, newest = self._conn.execute(
+                'SELECT COUNT(*), MIN(timestamp), MAX(timestamp) FROM messages'
+            ).fetchone()
+        return {'objects': objects, 'records': records, 'oldest': oldest, 'newest': newest}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _generation(self, name):
+        with self._lock:
+            row = self._conn.execute('SELECT generation FROM objects WHERE name = ?', (name,)).fetchone()
+        return row[0] if row else None
+
+    def _replace(self, name, generation, records):
+        rows = []
+        for record in records:
+            if not isinstance(record, dict):
+                continue
+            values = [record.get(field) for field in FIELDS]
+            rows.append([name, values[0], parse_time(values[0])] + values[1:])
+        with self._lock, self._conn:
+            self._delete_object(name)
+            for row in rows:
+                cursor = self._conn.execute(
+                    'INSERT INTO messages (object, timestamp, epoch, from_number, to_number,'
+                    ' incoming_message, terse_response) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                    row,
+                )
+                if self.full_text:
+                    self._conn.execute(
+                        'INSERT INTO messages_fts (rowid, incoming_message, terse_response) VALUES (?, ?, ?)',
+                        (cursor.lastrowid, row[5], row[6]),
+                    )
+            self._conn.execute(
+                'INSERT OR REPLACE INTO objects (name, generation, records, ingested_at) VALUES (?, ?, ?, ?)',
+                (name, generation, len(rows), time.time()),
+            )
+
+    def _delete_object(self, name):
+        if self.full_text:
+            self._conn.execute(
+                'DELETE FROM messages_fts WHERE rowid IN (SELECT id FROM messages WHERE object = ?)', (name,)
+            )
+        self._conn.execute('DELETE FROM messages WHERE object = ?', (name,))
+
+    def _watermark(self, key):
+        with self._lock:
+            row = self._conn.execute('SELECT value FROM watermarks WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else None
+
+    def _partition_start(self, prefix):
+        partition = self._watermark('partition')
+        if partition is None:
+            return f'{prefix}/dt='
+        # The log sink can still flush yesterday's records just after midnight
+        previous_day = date.fromisoformat(partition) - timedelta(days=1)
+        return f'{prefix}/dt={previous_day.isoformat()}'
+
+    def _advance_watermark(self, name, prefix):
+        relative = name[len(prefix) + 1:]
+        if relative.startswith('dt='):
+            key, value = 'partition', relative[3:13]
+        else:
+            key, value = 'legacy', name
+        with self._lock, self._conn:
+            self._conn.execute(
+                'INSERT INTO watermarks (key, value) VALUES (?, ?)'
+                ' ON CONFLICT (key) DO UPDATE SET value = MAX(value, excluded.value)',
+                (key, value),
+            )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Index the interaction logs locally and query them.')
+    parser.add_argument('--index', default=os.getenv('LOG_INDEX_DB', DEFAULT_INDEX_PATH), help='SQLite index file')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    ingest = commands.add_parser('ingest', help='index new or changed log objects')
+    where = ingest.add_mutually_exclusive_group()
+    where.add_argument('--dir', default=os.getenv('LOG_DIR'), help='local directory laid out like the bucket')
+    where.add_argument('--bucket', help='Cloud Storage bucket (default BUCKET_NAME)')
+    ingest.add_argument('--prefix', default=DEFAULT_PREFIX)
+    ingest.add_argument('--full', action='store_true', help='list every object, not just recent partitions')
+
+    query = commands.add_parser('query', help='print matching records as JSON lines, newest first')
+    query.add_argument('--since', help='ISO date or datetime (inclusive)')
+    query.add_argument('--until', help='ISO date or datetime (exclusive)')
+    query.add_argument('--phone', help='phone number on either side of the conversation')
+    query.add_argument('--text', help='words or phrase to search for in messages and replies')
+    query.add_argument('--limit', type=int, default=DEFAULT_LIMIT)
+
+    commands.add_parser('stats', help='print what the index holds')
+    args = parser.parse_args(argv)
+
+    index = LogIndex(args.index)
+    try:
+        if args.command == 'ingest':
+            if args.bucket or not args.dir:
+                from google.cloud import storage
+                source = GCSSource(storage.Client(), args.bucket or os.environ['BUCKET_NAME'])
+            else:
+                source = DirectorySource(args.dir)
+            print(json.dumps(index.ingest(source, prefix=args.prefix, full=args.full)))
+        elif args.command == 'query':
+            for record in index.query(args.since, args.until, args.phone, args.text, args.limit):
+                print(json.dumps(record))
+        else:
+            print(json.dumps(index.stats()))
+    finally:
+        index.close()
+
+
+if __name__ == '__main__':
+    main()
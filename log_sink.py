@@ -0,0 +1,220 @@
+# log_sink.py
+
+import atexit
+import gzip
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+
+DEFAULT_MAX_RECORDS = 500
+DEFAULT_MAX_BYTES = 1024 * 1024
+DEFAULT_FLUSH_INTERVAL = 60.0
+
+# Failed batches are kept for retry, but never more than this many times the flush size
+MAX_BUFFER_MULTIPLIER = 10
+
+CONTENT_TYPE = 'application/gzip'
+
+
+def object_name(partition_date, prefix='logs', now=None):
+    """Return a collision-free name like logs/dt=2024-05-01/134501123456-host-123-<uuid>.ndjson.gz."""
+    now = now or datetime.now(timezone.utc)
+    host = socket.gethostname().split('.')[0] or 'host'
+    return (f'{prefix}/dt={partition_date}/'
+            f'{now.strftime("%H%M%S%f")}-{host}-{os.getpid()}-{uuid.uuid4().hex}.ndjson.gz')
+
+
+def encode_batch(lines):
+    """Gzip a list of already-serialized JSON lines into one NDJSON payload."""
+    return gzip.compress(''.join(line + '\n' for line in lines).encode('UTF-8'))
+
+
+def decode_batch(data):
+    """Inverse of encode_batch: return the records in a gzipped NDJSON payload."""
+    text = gzip.decompress(data).decode('UTF-8')
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+
+def _partition(record):
+    timestamp = record.get('timestamp') if isinstance(record, dict) else None
+    if isinstance(timestamp, str) and len(timestamp) >= 10:
+        return timestamp[:10]
+    return datetime.now(timezone.utc).strftime('%Y-%m-%d')
+
+
+class GCSBackend:
+    """Uploads log batches to a Cloud Storage bucket."""
+
+    def __init__(self, storage_client, bucket_name):
+        self.storage_client = storage_client
+        self.bucket_name = bucket_name
+
+    def write(self, name, data):
+        bucket = self.storage_client.bucket(self.bucket_name)
+        blob = bucket.blob(name)
+        blob.upload_from_string(data=data, content_type=CONTENT_TYPE)
+
+
+class FileSystemBackend:
+    """Writes log batches under a local directory laid out like the bucket."""
+
+    def __init__(self, root):
+        self.root = root
+
+    def write(self, name, data):
+        path = os.path.join(self.root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+
+def write_batch(backend, records, prefix='logs'):
+    """Write records immediately, one compressed object per date partition. Returns the object names."""
+    partitions = {}
+    for record in records:
+        partitions.setdefault(_partition(record), []).append(json.dumps(record))
+    names = []
+    for partition_date, lines in sorted(partitions.items()):
+        name = object_name(partition_date, prefix)
+        backend.write(name, encode_batch(lines))
+        names.append(name)
+    return names
+
+
+class LogSink:
+    """Buffers log records in memory and flushes them as gzipped NDJSON objects.
+
+    A flush happens when `max_records` or `max_bytes` of serialized records are
+    buffered, when the oldest buffered record is `flush_interval` seconds old, or
+    on close(). Records it has to give up on (the retry buffer is full, or a
+    flush at close fails) are handed to `spill`, if given, instead of dropped.
+    """
+
+    def __init__(self, backend, max_records=DEFAULT_MAX_RECORDS, max_bytes=DEFAULT_MAX_BYTES,
+                 flush_interval=DEFAULT_FLUSH_INTERVAL, prefix='logs', spill=None):
+        self.backend = backend
+        self.spill = spill
+        self.max_records = max_records
+        self.max_bytes = max_bytes
+        self.flush_interval = flush_interval
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._buffer = []  # (partition_date, json_line)
+        self._buffered_bytes = 0
+        self._oldest = None
+        self._stop = threading.Event()
+        self._timer = None
+        self.objects_written = 0
+        self.records_written = 0
+        self.records_dropped = 0
+
+    @classmethod
+    def from_env(cls, backend, spill=None):
+        """Build a sink with thresholds from LOG_FLUSH_RECORDS, LOG_FLUSH_BYTES and LOG_FLUSH_INTERVAL."""
+        return cls(
+            backend,
+            spill=spill,
+            max_records=int(os.getenv('LOG_FLUSH_RECORDS', DEFAULT_MAX_RECORDS)),
+            max_bytes=int(os.getenv('LOG_FLUSH_BYTES', DEFAULT_MAX_BYTES)),
+            flush_interval=float(os.getenv('LOG_FLUSH_INTERVAL', DEFAULT_FLUSH_INTERVAL)),
+        )
+
+    def write(self, record):
+        """Buffer one record, flushing if a size threshold is reached."""
+        line = json.dumps(record)
+        with self._lock:
+            self._buffer.append((_partition(record), line))
+            self._buffered_bytes += len(line) + 1
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+            full = len(self._buffer) >= self.max_records or self._buffered_bytes >= self.max_bytes
+        self._ensure_timer()
+        if full:
+            self.flush()
+
+    @property
+    def buffered(self):
+        return len(self._buffer)
+
+    def flush(self):
+        """Upload everything buffered so far. Failed batches go back in the buffer."""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._buffer = self._buffer, []
+                self._buffered_bytes = 0
+                self._oldest = None
+            if not batch:
+                return
+
+            partitions = {}
+            for partition_date, line in batch:
+                partitions.setdefault(partition_date, []).append(line)
+
+            for partition_date, lines in sorted(partitions.items()):
+                try:
+                    self.backend.write(object_name(partition_date, self.prefix), encode_batch(lines))
+                    self.objects_written += 1
+                    self.records_written += len(lines)
+                except Exception as e:
+                    print(f"Error flushing {len(lines)} log records: {e}")
+                    self._requeue(partition_date, lines)
+
+    def _requeue(self, partition_date, lines):
+        with self._lock:
+            room = self.max_records * MAX_BUFFER_MULTIPLIER - len(self._buffer)
+            kept = lines[:max(room, 0)]
+            self._buffer[:0] = [(partition_date, line) for line in kept]
+            self._buffered_bytes += sum(len(line) + 1 for line in kept)
+            if self._oldest is None and self._buffer:
+                self._oldest = time.monotonic()
+        self._give_up(lines[len(kept):])
+
+    def _give_up(self, lines):
+        if not lines:
+            return
+        if self.spill is not None:
+            try:
+                self.spill([json.loads(line) for line in lines])
+                return
+            except Exception as e:
+                print(f"Error spilling {len(lines)} log records: {e}")
+        with self._lock:
+            self.records_dropped += len(lines)
+
+    def _ensure_timer(self):
+        if self._timer is not None or self.flush_interval <= 0:
+            return
+        with self._lock:
+            if self._timer is None:
+                self._timer = threading.Thread(target=self._run_timer, name='log-sink-flush', daemon=True)
+                self._timer.start()
+
+    def _run_timer(self):
+        tick = min(self.flush_interval, 1.0)
+        while not self._stop.wait(tick):
+            oldest = self._oldest
+            if oldest is not None and time.monotonic() - oldest >= self.flush_interval:
+                self.flush()
+
+    def close(self):
+        """Stop the flush timer and write out anything still buffered."""
+        self._stop.set()
+        self.flush()
+        # Whatever failed to flush would otherwise be lost with the process
+        with self._lock:
+            leftover, self._buffer = self._buffer, []
+            self._buffered_bytes = 0
+            self._oldest = None
+        self._give_up([line for _, line in leftover])
+
+    def register_shutdown(self):
+        """Flush on interpreter exit so buffered records survive instance shutdown."""
+        atexit.register(self.close)
+        return self
@@ -1,59 +1,101 @@
 # main.py
 
+# Keep module-level imports light: this runs on every cold start. The OpenAI,
+# Twilio REST and Google Cloud SDKs are imported by utils on first use, after
+# the request's signature has been validated.
+
+import json
 import os
-from flask import jsonify, request
-import openai
+from urllib.parse import parse_qsl
+from flask import Response, jsonify, request
 from dotenv import load_dotenv
-import datetime
 from datetime import datetime, timezone
-import time
-import base64
-import urllib.parse
+from xml.sax.saxutils import escape
 
-from twilio.request_validator import RequestValidator
+from signature import RequestValidator, ValidatorCache
 from utils import (
+    cache_reply,
+    env_flag,
+    get_auth_tokens,
     initialize_environment,
+    is_fallback_reply,
+    is_partial_reply,
     get_LLM_response,
     send_message_via_twilio,
-    access_secret,
+    send_streamed_LLM_response,
     write_log_to_storage
 )
+from dedup import get_deduplicator
+from pipeline import get_pipeline
+from rate_limit import get_throttle
+from telemetry import PROMETHEUS_CONTENT_TYPE, get_telemetry
+from tenants import lookup_tenant
+from tokens import truncate_to_tokens
 
 # Load environment variables from .env
 load_dotenv()
 
+SYSTEM_PROMPT = 'This is a test of a local system. Please provide a terse response (a haiku).'
+
+# Empty TwiML: tells Twilio we received the message without replying inline
+EMPTY_TWIML = '<?xml version="1.0" encoding="UTF-8"?><Response></Response>'
+MESSAGE_TWIML = '<?xml version="1.0" encoding="UTF-8"?><Response><Message>{}</Message></Response>'
+
+# Twilio's webhook posts are a few KB; anything far bigger is not from Twilio
+DEFAULT_MAX_REQUEST_BYTES = 64 * 1024
+# An SMS is at most 1600 characters, roughly 400 tokens
+DEFAULT_MESSAGE_TOKEN_BUDGET = 500
+
+# Built once per auth token rather than per request
+validators = ValidatorCache(lambda auth_token: RequestValidator(auth_token))
+
 def auto_responder(request):
-    # Initialize environment inside the function, not at import time
-    env_vars = initialize_environment()
-    print(f' ENVVARS: {env_vars}')
+    if request.method == 'GET' and request.path == '/metrics' and env_flag('METRICS_ENDPOINT'):
+        return Response(get_telemetry().render_prometheus(), content_type=PROMETHEUS_CONTENT_TYPE)
+
+    with get_telemetry().trace('webhook', mode=request_mode()) as trace:
+        response = handle_webhook(request)
+        trace['status'] = response[1] if isinstance(response, tuple) else response.status_code
+    return response
 
-    print(f'\n\n\nRequest: \n{request}')
+def handle_webhook(request):
+    telemetry = get_telemetry()
 
     # Validate incoming request
-    start = time.time()
+    twilio_signature = request.headers.get('X-Twilio-Signature', '')
+    if not twilio_signature:
+        # Unsigned junk is turned away before parsing the body or fetching any secret
+        print("Missing Twilio signature")
+        return jsonify({'statusCode': 403, 'body': 'Invalid request.'}), 403
+
+    # Read at most one byte past the limit, so oversized bodies are refused
+    # before any parsing or secret fetch however they are framed (chunked
+    # uploads carry no Content-Length)
     try:
-        headers = request.headers
-        print(f'\n\nHEADER RETRIEVED\n{headers}\n\n')
-        twilio_signature = headers.get('X-Twilio-Signature', '')
-        print(f'\nTwilio_signature: {twilio_signature}\n\n')
-
-        # Reconstruct full URL
-        forwarded_proto = request.headers.get('X-Forwarded-Proto', 'http')
-        forwarded_host = request.headers.get('X-Forwarded-Host', request.host)
-        url = f"{forwarded_proto}://{forwarded_host}{request.full_path}"
-
-        # Get request parameters
-        if request.content_type == 'application/json':
-            params = request.get_json() or {}
-        else:
-            params = request.form.to_dict()
-        print(f'params: {params}\n\n')
+        body = read_body(request, max_request_bytes())
+    except RequestTooLarge as e:
+        print(f"Request rejected: {e}")
+        return jsonify({'statusCode': 413, 'body': 'Request too large.'}), 413
+
+    try:
+        with telemetry.span('validation'):
+            # Reconstruct full URL
+            forwarded_proto = request.headers.get('X-Forwarded-Proto', 'http')
+            forwarded_host = request.headers.get('X-Forwarded-Host', request.host)
+            url = f"{forwarded_proto}://{forwarded_host}{request.full_path}"
+
+            # Get request parameters
+            params = parse_params(body, request.content_type or '')
+
+            # Each Twilio number may belong to a tenant with its own credentials
+            tenant = lookup_tenant(params.get('To'))
+            auth_tokens = tenant.auth_tokens() if tenant is not None else get_auth_tokens()
 
-        # Validate Twilio signature
-        auth_token = env_vars["TWILIO_AUTH_TOKEN"]
-        validator = RequestValidator(auth_token)
+            # Validate Twilio signature before building any clients, so forged
+            # requests never pay for environment initialization
+            valid = validators.validate(url, params, twilio_signature, auth_tokens)
 
-        if not validator.validate(url, params, twilio_signature):
+        if not valid:
             print("Twilio signature validation failed")
             return jsonify({'statusCode': 403, 'body': 'Invalid request.'}), 403
 
@@ -61,38 +103,216 @@ def auto_responder(request):
         print(f'An error occurred: {e}')
         return jsonify({'statusCode': 500, 'body': 'Internal Server Error'}), 500
 
-    print(f"VALIDATION TOOK {time.time() - start}")
+    # Twilio retries slow webhooks with the same MessageSid; acknowledge repeats
+    # without calling the LLM or texting the sender a second time
+    message_sid = params.get('MessageSid')
+    deduplicator = get_deduplicator()
+    if not deduplicator.claim(message_sid):
+        print(f"Duplicate delivery of {message_sid}, already handled")
+        return Response(EMPTY_TWIML, status=200, mimetype='text/xml')
 
     phone_number = params.get('From')
-    message_body = params.get('Body', '')
+    message_body = limit_message(params.get('Body', ''))
 
-    print(f'received message from {phone_number}: {message_body}')
+    if tenant is not None:
+        telemetry.annotate(tenant=tenant.name)
 
- # Prepare content for LLM request
-    context = {'role': 'system', "content": 'This is a test of a local system. Please provide a terse response (a haiku).'}
-    current_message = {"role": "user", "content": message_body}
+    # Checked before any client is built, so a flooding sender costs almost nothing
+    throttle = tenant.throttle() if tenant is not None else get_throttle()
+    if not throttle.allow_sender(phone_number):
+        print("Sender is over the rate limit, throttling")
+        return throttled_response(throttle.canned_reply(phone_number))
+
+    # Initialize environment inside the function, not at import time.
+    # The bundle is cached per instance, so only the first request pays for it.
+    try:
+        with telemetry.span('env_init'):
+            env_vars = tenant.env_vars() if tenant is not None else initialize_environment()
+    except Exception as e:
+        print(f'An error occurred: {e}')
+        deduplicator.release(message_sid)
+        return jsonify({'statusCode': 500, 'body': 'Internal Server Error'}), 500
 
+    if env_flag('ASYNC_PIPELINE'):
+        # Acknowledge the webhook now; generate, send and log on a background worker
+        if not get_pipeline().submit(respond_in_background, phone_number, message_body, env_vars):
+            print("Background pipeline is full, shedding request")
+            deduplicator.release(message_sid)
+            return jsonify({'statusCode': 503, 'body': 'Service Unavailable'}), 503
+        return Response(EMPTY_TWIML, status=200, mimetype='text/xml')
+
+    if not throttle.acquire_llm_slot():
+        print("Too many LLM calls in flight, shedding request")
+        deduplicator.release(message_sid)
+        return jsonify({'statusCode': 503, 'body': 'Service Unavailable'}), 503
+
+    streaming = env_flag('STREAM_RESPONSES')
     try:
-        llm_response = get_LLM_response([context, current_message], env_vars)
+        if streaming:
+            # Segments are texted as they are generated
+            with telemetry.span('llm_stream_send'):
+                llm_response = stream_reply(phone_number, message_body, env_vars)
+        else:
+            with telemetry.span('llm'):
+                llm_response = generate_reply(phone_number, message_body, env_vars)
     except Exception as e:
         print(f"Error generating LLM response: {e}")
+        deduplicator.release(message_sid)
         return jsonify({'statusCode': 500, 'body': 'Internal Server Error'}), 500
+    finally:
+        throttle.release_llm_slot()
 
     if llm_response is None:
+        deduplicator.release(message_sid)
         return jsonify({'statusCode': 500, 'body': 'Internal Server Error'}), 500
-    # Send response via Twilio
-    msg_id = send_message_via_twilio(phone_number, llm_response, None, env_vars)
+    if not streaming:
+        # Send response via Twilio
+        with telemetry.span('twilio_send'):
+            msg_id = send_message_via_twilio(phone_number, llm_response, None, env_vars)
+        if msg_id is None:
+            # Neither sent nor queued for replay: have Twilio retry rather than log a reply that never went out
+            deduplicator.release(message_sid)
+            return jsonify({'statusCode': 500, 'body': 'Internal Server Error'}), 500
+    remember_exchange(phone_number, message_body, llm_response, env_vars)
+
+    # Write log to Cloud Storage
+    with telemetry.span('log_write'):
+        write_log_to_storage(build_log_data(phone_number, message_body, llm_response, env_vars), env_vars)
+
+    return jsonify({'status': 'Message sent'}), 200
+
+def throttled_response(reply):
+    """Answer a throttled sender inline in TwiML (no API call), or acknowledge and drop if `reply` is None."""
+    if reply is None:
+        return Response(EMPTY_TWIML, status=200, mimetype='text/xml')
+    return Response(MESSAGE_TWIML.format(escape(reply)), status=200, mimetype='text/xml')
+
+def max_request_bytes():
+    return int(os.getenv('MAX_REQUEST_BYTES', DEFAULT_MAX_REQUEST_BYTES))
+
+class RequestTooLarge(ValueError):
+    """The request body is bigger than MAX_REQUEST_BYTES."""
+
+def read_body(request, max_bytes):
+    """Read the body, giving up as soon as it passes `max_bytes`."""
+    if request.content_length is not None and request.content_length > max_bytes:
+        raise RequestTooLarge(f"Content-Length {request.content_length} is over the limit")
+    body = bytearray()
+    while len(body) <= max_bytes:
+        chunk = request.stream.read(max_bytes + 1 - len(body))
+        if not chunk:
+            break
+        body += chunk
+    if len(body) > max_bytes:
+        raise RequestTooLarge(f"Body passed {max_bytes} bytes")
+    return bytes(body)
+
+def parse_params(body, content_type):
+    """Webhook parameters from a buffered JSON or form-encoded body."""
+    if content_type.startswith('application/json'):
+        return (json.loads(body) if body else None) or {}
+    # Twilio posts application/x-www-form-urlencoded
+    return dict(parse_qsl(body.decode('UTF-8'), keep_blank_values=True))
+
+def limit_message(message_body):
+    """Cut the incoming message to MESSAGE_TOKEN_BUDGET tokens before it reaches the prompt and the log."""
+    budget = int(os.getenv('MESSAGE_TOKEN_BUDGET', DEFAULT_MESSAGE_TOKEN_BUDGET))
+    if not isinstance(message_body, str):
+        message_body = '' if message_body is None else str(message_body)
+    if budget <= 0:
+        return message_body
+    truncated = truncate_to_tokens(message_body, budget)
+    if len(truncated) < len(message_body):
+        print(f"Truncated incoming message from {len(message_body)} to {len(truncated)} characters")
+    return truncated
+
+def request_mode():
+    """Which response path this instance is configured for, recorded on each trace."""
+    if env_flag('ASYNC_PIPELINE'):
+        return 'pipeline'
+    return 'stream' if env_flag('STREAM_RESPONSES') else 'sync'
+
+def build_prompt(phone_number, message_body, env_vars):
+    """Return the LLM messages, including recent history with this sender when a store is configured."""
+    # Prepare content for LLM request
+    context = {'role': 'system', "content": env_vars.get('SYSTEM_PROMPT', SYSTEM_PROMPT)}
+    current_message = {"role": "user", "content": message_body}
+
+    conversation_store = env_vars.get('conversation_store')
+    if conversation_store is None:
+        return [context, current_message]
+    return conversation_store.build_messages(conversation_key(phone_number, env_vars), context, current_message)
+
+def conversation_key(phone_number, env_vars):
+    """History is kept per sender, and per tenant when one deployment serves several numbers."""
+    tenant = env_vars.get('tenant')
+    return f'{tenant}:{phone_number}' if tenant else phone_number
 
-    # Prepare log data
+def remember_exchange(phone_number, message_body, llm_response, env_vars):
+    """Record a delivered reply in the sender's history and the response cache.
+
+    Called only after the reply was sent or queued for replay, so a failed send
+    that Twilio retries doesn't leave the exchange in history twice.
+    """
+    cache_reply(llm_response, env_vars)
+    conversation_store = env_vars.get('conversation_store')
+    # Canned fallbacks and replies cut short by a failed stream aren't real answers to build on
+    if conversation_store is not None and llm_response is not None \
+            and not is_fallback_reply(llm_response, env_vars) and not is_partial_reply(llm_response):
+        conversation_store.append(conversation_key(phone_number, env_vars), message_body, llm_response)
+
+def generate_reply(phone_number, message_body, env_vars):
+    """Ask the LLM for a complete reply."""
+    return get_LLM_response(build_prompt(phone_number, message_body, env_vars), env_vars)
+
+def stream_reply(phone_number, message_body, env_vars):
+    """Stream the reply, texting each SMS segment as soon as it is complete."""
+    messages = build_prompt(phone_number, message_body, env_vars)
+    return send_streamed_LLM_response(phone_number, messages, env_vars)
+
+def build_log_data(phone_number, message_body, llm_response, env_vars):
     log_data = {
         'timestamp': datetime.now(timezone.utc).isoformat(),
         'from_number': env_vars['TWILIO_PHONE_NUMBER'],
         'to_number': phone_number,
         'incoming_message': message_body,
-        'terse_response': llm_response,
+        'terse_response': str(llm_response) if llm_response is not None else None,
     }
+    if is_partial_reply(llm_response):
+        log_data['partial'] = True
+    return log_data
 
-    # Write log to Cloud Storage
-    write_log_to_storage(log_data, env_vars)
+def respond_in_background(phone_number, message_body, env_vars):
+    """Pipeline job: generate the reply, send it and log it, timing each stage."""
+    telemetry = get_telemetry()
+    throttle = env_vars.get('throttle') or get_throttle()
+    # The webhook is already acknowledged, so wait for an LLM slot rather than shed
+    if not throttle.acquire_llm_slot(wait=True):
+        print("Timed out waiting for an LLM slot; dropping background message")
+        return
 
-    return jsonify({'status': 'Message sent'}), 200
+    streaming = env_flag('STREAM_RESPONSES')
+    try:
+        if streaming:
+            # Generation and sending overlap, so they are timed as one stage
+            with telemetry.span('llm_stream_send'):
+                llm_response = stream_reply(phone_number, message_body, env_vars)
+        else:
+            with telemetry.span('llm'):
+                llm_response = generate_reply(phone_number, message_body, env_vars)
+    finally:
+        throttle.release_llm_slot()
+
+    if llm_response is None:
+        print("No LLM response for background message; nothing sent")
+        return
+
+    if not streaming:
+        with telemetry.span('twilio_send'):
+            if send_message_via_twilio(phone_number, llm_response, None, env_vars) is None:
+                print("Could not send background reply; not logging it")
+                return
+    remember_exchange(phone_number, message_body, llm_response, env_vars)
+
+    with telemetry.span('log_write'):
+        write_log_to_storage(build_log_data(phone_number, message_body, llm_response, env_vars), env_vars)
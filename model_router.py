@@ -0,0 +1,164 @@
+# model_router.py
+
+import json
+import os
+import re
+import threading
+import time
+from collections import deque
+
+from config import env_flag
+from tokens import count_message_tokens, count_tokens
+
+DEFAULT_MODEL = 'gpt-4o'
+DEFAULT_MAX_TOKENS = 500
+DEFAULT_FALLBACK_MODEL = 'gpt-4o-mini'
+
+# Checked in order; the first route whose limits the request fits wins
+DEFAULT_ROUTES = (
+    {'name': 'small', 'model': 'gpt-4o-mini', 'max_prompt_tokens': 1000, 'max_output_tokens': 150},
+    {'name': 'default', 'model': DEFAULT_MODEL},
+)
+
+# Replies the system prompt asks for, by expected length in tokens
+_SHORT_FORMS = (
+    (re.compile(r'\bhaiku\b', re.I), 40),
+    (re.compile(r'\b(one|single) (word|sentence|line)\b', re.I), 40),
+    (re.compile(r'\b(terse|brief|short|concise)\b', re.I), 120),
+)
+_MIN_OUTPUT_TOKENS = 150
+OUTPUT_HEADROOM = 2  # max_tokens = expected reply x this, so replies are not cut off
+MIN_MAX_TOKENS = 64
+
+
+def expected_output_tokens(messages, ceiling=DEFAULT_MAX_TOKENS):
+    """Estimate how long the reply will be from what the system prompt asks for and the question's length."""
+    system = ' '.join(m.get('content') or '' for m in messages if m.get('role') == 'system')
+    for pattern, tokens in _SHORT_FORMS:
+        if pattern.search(system):
+            return tokens
+    question = messages[-1].get('content') or '' if messages else ''
+    return min(ceiling, max(_MIN_OUTPUT_TOKENS, 2 * count_tokens(question)))
+
+
+class ModelHealth:
+    """Latency and error rate of recent calls to one model, over the last `window` seconds."""
+
+    def __init__(self, window=60.0, clock=time.monotonic):
+        self.window = window
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._calls = deque()  # (finished_at, seconds, error)
+
+    def record(self, seconds, error=False):
+        with self._lock:
+            self._calls.append((self._clock(), seconds, error))
+            self._expire()
+
+    def snapshot(self):
+        """{'calls', 'error_rate', 'p95_seconds'} over the window."""
+        with self._lock:
+            self._expire()
+            calls = list(self._calls)
+        if not calls:
+            return {'calls': 0, 'error_rate': 0.0, 'p95_seconds': 0.0}
+        latencies = sorted(seconds for _, seconds, error in calls if not error)
+        p95 = latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))] if latencies else 0.0
+        return {
+            'calls': len(calls),
+            'error_rate': sum(1 for _, _, error in calls if error) / len(calls),
+            'p95_seconds': p95,
+        }
+
+    def _expire(self):
+        cutoff = self._clock() - self.window
+        while self._calls and self._calls[0][0] < cutoff:
+            self._calls.popleft()
+
+
+class ModelRouter:
+    """Chooses the model and max_tokens for each LLM request.
+
+    Routes are tried in order and the first one whose `max_prompt_tokens` and
+    `max_output_tokens` the request fits is used. If a route's model has been slow
+    (p95 above `max_latency`) or failing (error rate above `max_error_rate`) over
+    the health window, requests go to `fallback_model` until it recovers. Health
+    needs `min_calls` recent calls before it can trip.
+    """
+
+    def __init__(self, routes=DEFAULT_ROUTES, fallback_model=DEFAULT_FALLBACK_MODEL, max_latency=10.0,
+                 max_error_rate=0.2, min_calls=10, health_window=60.0, clock=time.monotonic):
+        self.routes = [dict(route) for route in routes]
+        self.fallback_model = fallback_model
+        self.max_latency = max_latency
+        self.max_error_rate = max_error_rate
+        self.min_calls = min_calls
+        self.health_window = health_window
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._health = {}
+        self._stats = {}
+
+    @classmethod
+    def from_env(cls):
+        """Build from MODEL_ROUTES (JSON list of routes) and MODEL_FALLBACK_*; None unless MODEL_ROUTING is on."""
+        if not env_flag('MODEL_ROUTING'):
+            return None
+        routes = json.loads(os.environ['MODEL_ROUTES']) if os.getenv('MODEL_ROUTES') else DEFAULT_ROUTES
+        return cls(
+            routes=routes,
+            fallback_model=os.getenv('MODEL_FALLBACK', DEFAULT_FALLBACK_MODEL),
+            max_latency=float(os.getenv('MODEL_FALLBACK_LATENCY', 10.0)),
+            max_error_rate=float(os.getenv('MODEL_FALLBACK_ERROR_RATE', 0.2)),
+        )
+
+    def route(self, messages):
+        """Return {'name', 'model', 'max_tokens'} for these messages."""
+        prompt_tokens = count_message_tokens(messages)
+        expected = expected_output_tokens(messages)
+        route = self.routes[-1]
+        for candidate in self.routes:
+            if prompt_tokens <= candidate.get('max_prompt_tokens', float('inf')) and \
+                    expected <= candidate.get('max_output_tokens', float('inf')):
+                route = candidate
+                break
+
+        max_tokens = route.get('max_tokens') or min(
+            DEFAULT_MAX_TOKENS, max(MIN_MAX_TOKENS, expected * OUTPUT_HEADROOM)
+        )
+        name, model = route['name'], route['model']
+        if model != self.fallback_model and self.degraded(model):
+            name, model = f'{name}-fallback', self.fallback_model
+        return {'name': name, 'model': model, 'max_tokens': max_tokens}
+
+    def degraded(self, model):
+        health = self._health.get(model)
+        if health is None:
+            return False
+        snapshot = health.snapshot()
+        if snapshot['calls'] < self.min_calls:
+            return False
+        return snapshot['error_rate'] > self.max_error_rate or snapshot['p95_seconds'] > self.max_latency
+
+    def record(self, route, seconds, error=False, tokens=0):
+        """Report how a routed call went; feeds model health and per-route stats."""
+        with self._lock:
+            health = self._health.get(route['model'])
+            if health is None:
+                health = self._health[route['model']] = ModelHealth(self.health_window, self._clock)
+            stats = self._stats.setdefault(
+                route['name'], {'calls': 0, 'errors': 0, 'tokens': 0, 'total_seconds': 0.0}
+            )
+            stats['calls'] += 1
+            stats['errors'] += int(error)
+            stats['tokens'] += tokens or 0
+            stats['total_seconds'] += seconds
+        health.record(seconds, error)
+
+    def stats(self):
+        """Per-route call counts, errors, tokens and mean latency, for measuring savings."""
+        with self._lock:
+            stats = {name: dict(values) for name, values in self._stats.items()}
+        for values in stats.values():
+            values['mean_seconds'] = values['total_seconds'] / values['calls'] if values['calls'] else 0.0
+        return stats
@@ -0,0 +1,200 @@
+# outbox.py
+
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+
+DEFAULT_DB_PATH = '/tmp/outbox.sqlite3'
+DEFAULT_MAX_ATTEMPTS = 8
+DEFAULT_BASE_DELAY = 5.0
+DEFAULT_MAX_DELAY = 600.0
+DEFAULT_BATCH_SIZE = 50
+DEFAULT_INTERVAL = 10.0
+DEFAULT_LEASE = 120.0
+
+KINDS = ('sms', 'log')
+
+
+class Outbox:
+    """Failed outbound messages and log records, kept in a SQLite WAL file until they go through.
+
+    Entries are replayed in batches, oldest first, by `replay()` or a background
+    worker. A failed replay is retried with exponential backoff and full jitter.
+    After `max_attempts` the entry is marked dead and kept for inspection rather
+    than retried forever. Because the file is on disk, entries survive a restart
+    of the process (though not the loss of the instance's disk).
+
+    Several processes may share one file (e.g. gunicorn workers). Each batch is
+    claimed for `lease` seconds before it is replayed, so no two processes send
+    the same entry. If a process dies mid-batch, its claim lapses and another
+    picks the entries up.
+    """
+
+    def __init__(self, path=DEFAULT_DB_PATH, max_attempts=DEFAULT_MAX_ATTEMPTS, base_delay=DEFAULT_BASE_DELAY,
+                 max_delay=DEFAULT_MAX_DELAY, batch_size=DEFAULT_BATCH_SIZE, lease=DEFAULT_LEASE, clock=time.time,
+                 rng=random.random):
+        self.path = path
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.batch_size = batch_size
+        self.lease = lease
+        self._clock = clock
+        self._rng = rng
+        self._lock = threading.Lock()
+        self._replay_lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._worker = None
+        self.replayed = 0
+        self.failed = 0
+        with self._lock, self._conn:
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS outbox ('
+                ' id INTEGER PRIMARY KEY AUTOINCREMENT,'
+                ' kind TEXT NOT NULL,'
+                ' payload TEXT NOT NULL,'
+                ' attempts INTEGER NOT NULL DEFAULT 0,'
+                ' next_attempt_at REAL NOT NULL,'
+                ' created_at REAL NOT NULL,'
+                ' dead INTEGER NOT NULL DEFAULT 0,'
+                ' last_error TEXT)'
+            )
+            self._conn.execute('CREATE INDEX IF NOT EXISTS outbox_due ON outbox (dead, next_attempt_at)')
+
+    @classmethod
+    def from_env(cls):
+        """Build from the OUTBOX_* settings."""
+        return cls(
+            os.getenv('OUTBOX_DB', DEFAULT_DB_PATH),
+            max_attempts=int(os.getenv('OUTBOX_MAX_ATTEMPTS', DEFAULT_MAX_ATTEMPTS)),
+            max_delay=float(os.getenv('OUTBOX_MAX_DELAY', DEFAULT_MAX_DELAY)),
+            batch_size=int(os.getenv('OUTBOX_BATCH_SIZE', DEFAULT_BATCH_SIZE)),
+            lease=float(os.getenv('OUTBOX_LEASE', DEFAULT_LEASE)),
+        )
+
+    def put(self, kind, payload, error=None):
+        """Queue one entry for replay; the first attempt is after `base_delay`."""
+        return self.put_many(kind, [payload], error)
+
+    def put_many(self, kind, payloads, error=None):
+        if kind not in KINDS:
+            raise ValueError(f"Outbox entries must be one of {KINDS}, not {kind!r}")
+        now = self._clock()
+        rows = [(kind, json.dumps(payload), now + self.base_delay, now, _error_text(error)) for payload in payloads]
+        with self._lock, self._conn:
+            self._conn.executemany(
+                'INSERT INTO outbox (kind, payload, next_attempt_at, created_at, last_error) VALUES (?, ?, ?, ?, ?)',
+                rows,
+            )
+        return len(rows)
+
+    def replay(self, handlers, now=None):
+        """Replay one batch of due entries; returns {'replayed', 'failed', 'dead'} counts.
+
+        `handlers[kind]` is called with the list of payloads of that kind, and returns
+        one result per payload: None for success, or the exception it failed with.
+        """
+        now = self._clock() if now is None else now
+        counts = {'replayed': 0, 'failed': 0, 'dead': 0}
+        with self._replay_lock:
+            rows = self._claim(now)
+            by_kind = {}
+            for row in rows:
+                by_kind.setdefault(row[1], []).append(row)
+
+            done, retry, dead = [], [], []
+            for kind, entries in by_kind.items():
+                try:
+                    results = handlers[kind]([json.loads(payload) for _, _, payload, _ in entries])
+                except Exception as e:
+                    results = [e] * len(entries)
+                for (entry_id, _, _, attempts), error in zip(entries, results):
+                    if error is None:
+                        done.append((entry_id,))
+                    elif attempts + 1 >= self.max_attempts:
+                        dead.append((attempts + 1, _error_text(error), entry_id))
+                    else:
+                        retry.append((attempts + 1, now + self._backoff(attempts + 1), _error_text(error), entry_id))
+
+            with self._lock, self._conn:
+                self._conn.executemany('DELETE FROM outbox WHERE id = ?', done)
+                self._conn.executemany(
+                    'UPDATE outbox SET attempts = ?, next_attempt_at = ?, last_error = ? WHERE id = ?', retry
+                )
+                self._conn.executemany('UPDATE outbox SET attempts = ?, dead = 1, last_error = ? WHERE id = ?', dead)
+            self.replayed += len(done)
+            self.failed += len(retry) + len(dead)
+        for entry in dead:
+            print(f"Giving up on outbox entry {entry[2]} after {entry[0]} attempts: {entry[1]}")
+        counts.update(replayed=len(done), failed=len(retry), dead=len(dead))
+        return counts
+
+    def _claim(self, now):
+        """Take up to a batch of due entries, pushing them out of reach of other processes for `lease` seconds."""
+        with self._lock:
+            # IMMEDIATE takes the write lock up front, so two processes can't select the same rows
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                rows = self._conn.execute(
+                    'SELECT id, kind, payload, attempts FROM outbox WHERE dead = 0 AND next_attempt_at <= ?'
+                    ' ORDER BY next_attempt_at, id LIMIT ?',
+                    (now, self.batch_size),
+                ).fetchall()
+                self._conn.executemany(
+                    'UPDATE outbox SET next_attempt_at = ? WHERE id = ?', [(now + self.lease, row[0]) for row in rows]
+                )
+            except BaseException:
+                self._conn.rollback()
+                raise
+            self._conn.commit()
+        return rows
+
+    def start(self, handlers, interval=DEFAULT_INTERVAL):
+        """Replay due entries on a background thread every `interval` seconds (sooner after a full batch)."""
+        if self._worker is not None:
+            return self
+
+        def run():
+            while not self._stop.is_set():
+                try:
+                    counts = self.replay(handlers)
+                except Exception as e:
+                    print(f"Error replaying outbox: {e}")
+                    counts = {}
+                if sum(counts.values()) < self.batch_size:
+                    self._wake.wait(interval)
+                    self._wake.clear()
+
+        self._worker = threading.Thread(target=run, name='outbox-replay', daemon=True)
+        self._worker.start()
+        return self
+
+    def stats(self):
+        with self._lock:
+            pending, dead = self._conn.execute(
+                'SELECT COALESCE(SUM(dead = 0), 0), COALESCE(SUM(dead = 1), 0) FROM outbox'
+            ).fetchone()
+        return {'pending': pending, 'dead': dead, 'replayed': self.replayed, 'failed': self.failed}
+
+    def close(self):
+        """Stop the worker; whatever is still queued stays on disk for the next process."""
+        self._stop.set()
+        self._wake.set()
+        if self._worker is not None:
+            self._worker.join(timeout=5)
+        with self._lock:
+            self._conn.close()
+
+    def _backoff(self, attempts):
+        # Full jitter: uniform in [0, min(max_delay, base * 2^attempts)]
+        return self._rng() * min(self.max_delay, self.base_delay * 2 ** attempts)
+
+
+def _error_text(error):
+    return None if error is None else f'{type(error).__name__}: {error}'[:500]
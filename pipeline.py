@@ -0,0 +1,117 @@
+# pipeline.py
+
+import atexit
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from telemetry import get_telemetry
+
+DEFAULT_WORKERS = 8
+DEFAULT_MAX_PENDING = 64
+
+
+class LocalQueueBackend:
+    """Runs jobs on an in-process thread pool. The default pipeline backend."""
+
+    def __init__(self, max_workers=DEFAULT_WORKERS):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='pipeline')
+
+    def submit(self, fn, *args):
+        return self._executor.submit(fn, *args)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+
+
+class BackgroundPipeline:
+    """Bounded queue of post-response work (LLM call, outbound send, log write).
+
+    `submit` never blocks: once `max_pending` jobs are queued or running it returns
+    False so the caller can shed load instead of piling up memory and latency.
+    """
+
+    def __init__(self, backend=None, max_pending=DEFAULT_MAX_PENDING):
+        self.backend = backend or LocalQueueBackend()
+        self.max_pending = max_pending
+        self._pending = 0
+        self._rejected = 0
+        self._closed = False
+        self._cond = threading.Condition()
+
+    @classmethod
+    def from_env(cls):
+        """Build a pipeline sized by PIPELINE_WORKERS and PIPELINE_MAX_PENDING."""
+        workers = int(os.getenv('PIPELINE_WORKERS', DEFAULT_WORKERS))
+        max_pending = int(os.getenv('PIPELINE_MAX_PENDING', DEFAULT_MAX_PENDING))
+        return cls(LocalQueueBackend(workers), max_pending)
+
+    @property
+    def pending(self):
+        return self._pending
+
+    @property
+    def rejected(self):
+        return self._rejected
+
+    def submit(self, job, *args):
+        """Queue `job(*args)`; returns False if the pipeline is full or shutting down."""
+        with self._cond:
+            if self._closed or self._pending >= self.max_pending:
+                self._rejected += 1
+                return False
+            self._pending += 1
+
+        queued_at = time.perf_counter()
+        try:
+            self.backend.submit(self._run, job, args, queued_at)
+        except Exception:
+            self._finish()
+            raise
+        return True
+
+    def _run(self, job, args, queued_at):
+        telemetry = get_telemetry()
+        telemetry.record('pipeline_queue_wait', time.perf_counter() - queued_at)
+        try:
+            with telemetry.span('pipeline_job'):
+                job(*args)
+        except Exception as e:
+            print(f"Error in background pipeline job: {e}")
+        finally:
+            self._finish()
+
+    def _finish(self):
+        with self._cond:
+            self._pending -= 1
+            self._cond.notify_all()
+
+    def drain(self, timeout=None):
+        """Stop accepting work and wait for queued jobs. Returns True if all finished."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            self._closed = True
+            while self._pending:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            drained = self._pending == 0
+        self.backend.shutdown()
+        return drained
+
+
+_pipeline = None
+_pipeline_lock = threading.Lock()
+
+
+def get_pipeline():
+    """Return the instance-wide pipeline, creating it (and its shutdown hook) on first use."""
+    global _pipeline
+    if _pipeline is None:
+        with _pipeline_lock:
+            if _pipeline is None:
+                _pipeline = BackgroundPipeline.from_env()
+                atexit.register(_pipeline.drain, float(os.getenv('PIPELINE_DRAIN_TIMEOUT', 30)))
+    return _pipeline
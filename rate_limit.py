@@ -0,0 +1,236 @@
+# rate_limit.py
+
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_WINDOW_SECONDS = 60
+DEFAULT_MAX_SENDERS = 100000
+DEFAULT_SLOT_TIMEOUT = 30.0
+DEFAULT_REPLY = "You're sending messages faster than we can answer. Please wait a minute and try again."
+
+ACTIONS = ('reply', 'drop')
+
+
+def sliding_count(previous, current, elapsed_fraction):
+    """Sliding-window estimate: the previous window's count weighted by how much of it still overlaps."""
+    return previous * (1.0 - elapsed_fraction) + current
+
+
+class InMemoryRateBackend:
+    """Sliding-window counters for up to `max_keys` senders, least recently seen evicted first.
+
+    Each sender costs one small list: [window index, count in that window, count in the one before].
+    """
+
+    def __init__(self, max_keys=DEFAULT_MAX_SENDERS):
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        self._counters = OrderedDict()
+
+    def acquire(self, key, limit, window, now):
+        """Count one request for `key` if that keeps it within `limit` per `window`; return whether it did."""
+        index, offset = divmod(now, window)
+        index = int(index)
+        with self._lock:
+            counter = self._counters.get(key)
+            if counter is None:
+                counter = self._counters[key] = [index, 0, 0]
+                while len(self._counters) > self.max_keys:
+                    self._counters.popitem(last=False)
+            else:
+                self._counters.move_to_end(key)
+            if counter[0] != index:
+                counter[2] = counter[1] if counter[0] == index - 1 else 0
+                counter[1] = 0
+                counter[0] = index
+            if sliding_count(counter[2], counter[1], offset / window) + 1 > limit:
+                return False
+            counter[1] += 1
+            return True
+
+    def __len__(self):
+        return len(self._counters)
+
+
+class SQLiteRateBackend:
+    """The same sliding-window counters in a SQLite file, shared by every process that opens it."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=5.0, isolation_level=None)
+        with self._lock:
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS rate_counters ('
+                ' key TEXT NOT NULL,'
+                ' window_index INTEGER NOT NULL,'
+                ' count INTEGER NOT NULL,'
+                ' PRIMARY KEY (key, window_index))'
+            )
+
+    def acquire(self, key, limit, window, now):
+        index, offset = divmod(now, window)
+        index = int(index)
+        with self._lock:
+            # BEGIN IMMEDIATE takes the write lock up front, so check-and-increment is atomic across processes
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                counts = dict(self._conn.execute(
+                    'SELECT window_index, count FROM rate_counters WHERE key = ? AND window_index >= ?',
+                    (key, index - 1),
+                ).fetchall())
+                allowed = sliding_count(counts.get(index - 1, 0), counts.get(index, 0), offset / window) + 1 <= limit
+                if allowed:
+                    self._conn.execute(
+                        'INSERT INTO rate_counters (key, window_index, count) VALUES (?, ?, 1)'
+                        ' ON CONFLICT (key, window_index) DO UPDATE SET count = count + 1',
+                        (key, index),
+                    )
+                    self._conn.execute(
+                        'DELETE FROM rate_counters WHERE key = ? AND window_index < ?', (key, index - 1)
+                    )
+                self._conn.execute('COMMIT')
+            except Exception:
+                self._conn.execute('ROLLBACK')
+                raise
+        return allowed
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class SenderRateLimiter:
+    """Allows each sender at most `limit` messages per sliding `window` seconds."""
+
+    def __init__(self, limit, window=DEFAULT_WINDOW_SECONDS, backend=None, clock=time.time, namespace=''):
+        self.limit = limit
+        self.window = window
+        self.backend = backend if backend is not None else InMemoryRateBackend()
+        self.namespace = namespace  # keeps limiters sharing a SQLite file from counting each other's senders
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._notified = {}  # sender -> window index in which they were last told they are throttled
+        self.throttled = 0
+
+    def allow(self, sender):
+        key = f'{self.namespace}{sender}' if self.namespace else sender
+        try:
+            allowed = self.backend.acquire(key, self.limit, self.window, self._clock())
+        except Exception as e:
+            # Fail open: a broken shared store shouldn't take the service down with it
+            print(f"Error checking rate limit: {e}")
+            return True
+        if not allowed:
+            with self._lock:
+                self.throttled += 1
+        return allowed
+
+    def should_notify(self, sender):
+        """True the first time `sender` is throttled in a window, so they get one canned reply, not one per message."""
+        index = int(self._clock() // self.window)
+        with self._lock:
+            if self._notified.get(sender) == index:
+                return False
+            self._notified[sender] = index
+            if len(self._notified) > DEFAULT_MAX_SENDERS:
+                self._notified = {key: value for key, value in self._notified.items() if value == index}
+            return True
+
+
+class ConcurrencyLimiter:
+    """Caps how many LLM calls run at once across the instance."""
+
+    def __init__(self, max_concurrent):
+        self.max_concurrent = max_concurrent
+        self._semaphore = threading.BoundedSemaphore(max_concurrent)
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.rejected = 0
+
+    def acquire(self, timeout=0.0):
+        """Take a slot, waiting up to `timeout` seconds; returns False if none freed up."""
+        acquired = self._semaphore.acquire(timeout=timeout) if timeout else self._semaphore.acquire(blocking=False)
+        with self._lock:
+            if acquired:
+                self.in_flight += 1
+            else:
+                self.rejected += 1
+        return acquired
+
+    def release(self):
+        with self._lock:
+            self.in_flight -= 1
+        self._semaphore.release()
+
+
+class Throttle:
+    """Per-sender rate limit plus global LLM concurrency cap, either of which may be off (None)."""
+
+    def __init__(self, sender_limiter=None, concurrency=None, action='reply', reply=DEFAULT_REPLY,
+                 slot_timeout=DEFAULT_SLOT_TIMEOUT):
+        if action not in ACTIONS:
+            raise ValueError(f"RATE_LIMIT_ACTION must be one of {ACTIONS}, not {action!r}")
+        self.sender_limiter = sender_limiter
+        self.concurrency = concurrency
+        self.action = action
+        self.reply = reply
+        self.slot_timeout = slot_timeout
+
+    @classmethod
+    def from_env(cls):
+        """Build from RATE_LIMIT_* and LLM_MAX_CONCURRENCY; both limits are off unless configured."""
+        sender_limiter = None
+        limit = int(os.getenv('RATE_LIMIT_MESSAGES', 0))
+        if limit > 0:
+            path = os.getenv('RATE_LIMIT_DB')
+            sender_limiter = SenderRateLimiter(
+                limit,
+                window=float(os.getenv('RATE_LIMIT_WINDOW', DEFAULT_WINDOW_SECONDS)),
+                backend=SQLiteRateBackend(path) if path else None,
+            )
+        max_concurrent = int(os.getenv('LLM_MAX_CONCURRENCY', 0))
+        return cls(
+            sender_limiter=sender_limiter,
+            concurrency=ConcurrencyLimiter(max_concurrent) if max_concurrent > 0 else None,
+            action=os.getenv('RATE_LIMIT_ACTION', 'reply').strip().lower(),
+            reply=os.getenv('RATE_LIMIT_REPLY', DEFAULT_REPLY),
+            slot_timeout=float(os.getenv('LLM_SLOT_TIMEOUT', DEFAULT_SLOT_TIMEOUT)),
+        )
+
+    def allow_sender(self, sender):
+        return self.sender_limiter is None or self.sender_limiter.allow(sender)
+
+    def canned_reply(self, sender):
+        """The text to answer a throttled sender with, or None to drop the message silently."""
+        if self.action == 'reply' and self.sender_limiter.should_notify(sender):
+            return self.reply
+        return None
+
+    def acquire_llm_slot(self, wait=False):
+        """Reserve an LLM call; waits up to `slot_timeout` only when `wait` is set (background work)."""
+        if self.concurrency is None:
+            return True
+        return self.concurrency.acquire(self.slot_timeout if wait else 0.0)
+
+    def release_llm_slot(self):
+        if self.concurrency is not None:
+            self.concurrency.release()
+
+
+_throttle = None
+_throttle_lock = threading.Lock()
+
+
+def get_throttle():
+    """Return the instance-wide Throttle, creating it on first use."""
+    global _throttle
+    if _throttle is None:
+        with _throttle_lock:
+            if _throttle is None:
+                _throttle = Throttle.from_env()
+    return _throttle
@@ -0,0 +1,244 @@
+# response_cache.py
+
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from config import env_flag
+
+DEFAULT_MAX_ENTRIES = 1024
+DEFAULT_TTL_SECONDS = 3600.0
+DEFAULT_MAX_DISTANCE = 3
+# Very short texts ("yes"/"no") have unstable fingerprints, so only exact matches apply
+MIN_NEAR_DUPLICATE_CHARS = 20
+
+FINGERPRINT_BITS = 64
+BANDS = 4
+BAND_BITS = FINGERPRINT_BITS // BANDS
+
+_WHITESPACE = re.compile(r'\s+')
+_WORDS = re.compile(r'\w+')
+
+
+def normalize_text(text):
+    """Lowercase and collapse whitespace so trivially different messages share a key."""
+    return _WHITESPACE.sub(' ', (text or '').strip().lower())
+
+
+def _digest(value):
+    return hashlib.sha256(json.dumps(value, sort_keys=True).encode('UTF-8')).hexdigest()
+
+
+def cache_key(messages, params):
+    """Exact-match key over the normalized message list and model parameters."""
+    normalized = [(m.get('role'), normalize_text(m.get('content'))) for m in messages]
+    return _digest({'messages': normalized, 'params': params})
+
+
+def fingerprint(text):
+    """64-bit SimHash of a text's words and word pairs; similar texts differ in few bits."""
+    words = _WORDS.findall(normalize_text(text))
+    features = words + [f'{a} {b}' for a, b in zip(words, words[1:])]
+    weights = [0] * FINGERPRINT_BITS
+    for feature in features:
+        value = int.from_bytes(hashlib.blake2b(feature.encode('UTF-8'), digest_size=8).digest(), 'big')
+        for bit in range(FINGERPRINT_BITS):
+            weights[bit] += 1 if value >> bit & 1 else -1
+    return sum(1 << bit for bit, weight in enumerate(weights) if weight > 0)
+
+
+def _bands(value):
+    mask = (1 << BAND_BITS) - 1
+    return [(index, value >> (index * BAND_BITS) & mask) for index in range(BANDS)]
+
+
+class SQLiteResponseTier:
+    """Optional persistent tier so cached replies survive instance restarts."""
+
+    def __init__(self, path):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS responses ('
+                ' key TEXT PRIMARY KEY, response TEXT NOT NULL, expires_at REAL NOT NULL)'
+            )
+
+    def get(self, key, now):
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT response FROM responses WHERE key = ? AND expires_at > ?', (key, now)
+            ).fetchone()
+        return row[0] if row else None
+
+    def put(self, key, response, expires_at):
+        with self._lock, self._conn:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO responses (key, response, expires_at) VALUES (?, ?, ?)',
+                (key, response, expires_at),
+            )
+
+    def prune(self, now):
+        with self._lock, self._conn:
+            self._conn.execute('DELETE FROM responses WHERE expires_at <= ?', (now,))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class ResponseCache:
+    """TTL + LRU cache of LLM replies keyed on the normalized prompt and model parameters.
+
+    With `near_duplicate` enabled, a miss on the exact key falls back to replies
+    whose conversation prefix matches exactly and whose final user message has a
+    fingerprint within `max_distance` bits. Candidates are found through four
+    16-bit band buckets, so lookups never scan the whole cache.
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, ttl=DEFAULT_TTL_SECONDS, persistent=None,
+                 near_duplicate=False, max_distance=DEFAULT_MAX_DISTANCE, clock=time.time):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.persistent = persistent
+        self.near_duplicate = near_duplicate
+        self.max_distance = max_distance
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> entry dict
+        self._band_index = {}  # (prefix_key, band, value) -> set of keys
+        self._stats = {
+            'hits': 0, 'near_hits': 0, 'persistent_hits': 0, 'misses': 0,
+            'tokens_saved': 0, 'latency_saved_seconds': 0.0,
+        }
+
+    @classmethod
+    def from_env(cls):
+        """Build a cache from RESPONSE_CACHE_* settings, or return None if RESPONSE_CACHE_SIZE is 0."""
+        max_entries = int(os.getenv('RESPONSE_CACHE_SIZE', DEFAULT_MAX_ENTRIES))
+        if max_entries <= 0:
+            return None
+        db_path = os.getenv('RESPONSE_CACHE_DB')
+        return cls(
+            max_entries=max_entries,
+            ttl=float(os.getenv('RESPONSE_CACHE_TTL', DEFAULT_TTL_SECONDS)),
+            persistent=SQLiteResponseTier(db_path) if db_path else None,
+            near_duplicate=env_flag('RESPONSE_CACHE_NEAR_DUPLICATE'),
+        )
+
+    def get(self, messages, params):
+        """Return a cached reply for this prompt, or None."""
+        key = cache_key(messages, params)
+        now = self._clock()
+        with self._lock:
+            entry = self._live_entry(key, now)
+            if entry is None and self.near_duplicate:
+                entry = self._near_match(messages, params, now)
+                if entry is not None:
+                    self._stats['near_hits'] += 1
+            if entry is not None:
+                self._entries.move_to_end(entry['key'])
+                return self._hit(entry)
+
+        if self.persistent is not None:
+            response = self.persistent.get(key, now)
+            if response is not None:
+                with self._lock:
+                    self._stats['persistent_hits'] += 1
+                    self._stats['hits'] += 1
+                    self._insert(key, messages, params, response, now + self.ttl, 0, 0.0)
+                return response
+
+        with self._lock:
+            self._stats['misses'] += 1
+        return None
+
+    def put(self, messages, params, response, tokens=0, latency=0.0):
+        """Cache a reply along with what producing it cost, for the savings counters."""
+        if response is None:
+            return
+        key = cache_key(messages, params)
+        expires_at = self._clock() + self.ttl
+        with self._lock:
+            self._insert(key, messages, params, response, expires_at, tokens or 0, latency or 0.0)
+        if self.persistent is not None:
+            self.persistent.put(key, response, expires_at)
+
+    def stats(self):
+        """Return hit/miss counters plus estimated tokens and seconds saved."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        return stats
+
+    def _hit(self, entry):
+        self._stats['hits'] += 1
+        self._stats['tokens_saved'] += entry['tokens']
+        self._stats['latency_saved_seconds'] += entry['latency']
+        return entry['response']
+
+    def _live_entry(self, key, now):
+        entry = self._entries.get(key)
+        if entry is not None and entry['expires_at'] <= now:
+            self._remove(key)
+            return None
+        return entry
+
+    def _near_match(self, messages, params, now):
+        prefix_key, text = self._split(messages, params)
+        if prefix_key is None:
+            return None
+        target = fingerprint(text)
+        candidates = set()
+        for band in _bands(target):
+            candidates |= self._band_index.get((prefix_key,) + band, set())
+        best = None
+        for key in candidates:
+            entry = self._live_entry(key, now)
+            if entry is None:
+                continue
+            distance = bin(entry['fingerprint'] ^ target).count('1')
+            if distance <= self.max_distance and (best is None or distance < best[0]):
+                best = (distance, entry)
+        return best[1] if best else None
+
+    def _split(self, messages, params):
+        """Return (key of everything but the last user message, that message's text)."""
+        if not messages or messages[-1].get('role') != 'user':
+            return None, None
+        text = messages[-1].get('content') or ''
+        if len(normalize_text(text)) < MIN_NEAR_DUPLICATE_CHARS:
+            return None, None
+        return cache_key(messages[:-1], params), text
+
+    def _insert(self, key, messages, params, response, expires_at, tokens, latency):
+        if key in self._entries:
+            self._remove(key)
+        entry = {'key': key, 'response': response, 'expires_at': expires_at,
+                 'tokens': tokens, 'latency': latency, 'bands': []}
+        if self.near_duplicate:
+            prefix_key, text = self._split(messages, params)
+            if prefix_key is not None:
+                entry['fingerprint'] = fingerprint(text)
+                entry['bands'] = [(prefix_key,) + band for band in _bands(entry['fingerprint'])]
+                for band_key in entry['bands']:
+                    self._band_index.setdefault(band_key, set()).add(key)
+        self._entries[key] = entry
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        for band_key in entry['bands']:
+            keys = self._band_index.get(band_key)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._band_index[band_key]
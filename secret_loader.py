@@ -0,0 +1,198 @@
+# secret_loader.py
+
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+def parse_pinned_versions(value):
+    """Parse 'NAME=3,OTHER=7' into {'NAME': '3', 'OTHER': '7'}."""
+    pinned = {}
+    for item in (value or '').split(','):
+        if '=' in item:
+            name, version = item.split('=', 1)
+            pinned[name.strip()] = version.strip()
+    return pinned
+
+
+class EncryptedSecretCache:
+    """On-disk secret cache keyed by (name, version), encrypted with a Fernet key.
+
+    Point `directory` at a tmpfs mount (e.g. /tmp on Cloud Functions) to keep
+    plaintext-equivalent material off persistent disks entirely.
+    """
+
+    MANIFEST = 'versions.json'
+
+    def __init__(self, directory, key):
+        from cryptography.fernet import Fernet
+
+        self.directory = directory
+        self._fernet = Fernet(key)
+        self._lock = threading.Lock()
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+
+    def _path(self, name, version):
+        return os.path.join(self.directory, name, f'{version}.enc')
+
+    def get(self, name, version):
+        try:
+            with open(self._path(name, version), 'rb') as f:
+                return self._fernet.decrypt(f.read()).decode('UTF-8')
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print(f"Ignoring unreadable cached secret '{name}' version {version}: {e}")
+            return None
+
+    def put(self, name, version, value):
+        path = self._path(name, version)
+        os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+        self._atomic_write(path, self._fernet.encrypt(value.encode('UTF-8')))
+
+    def load_versions(self):
+        try:
+            with open(os.path.join(self.directory, self.MANIFEST)) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def save_versions(self, versions):
+        with self._lock:
+            manifest = self.load_versions()
+            manifest.update(versions)
+            data = json.dumps(manifest, sort_keys=True).encode('UTF-8')
+            self._atomic_write(os.path.join(self.directory, self.MANIFEST), data)
+
+    def _atomic_write(self, path, data):
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+
+class SecretLoader:
+    """Fetches secrets concurrently over one shared Secret Manager client.
+
+    Resolved version numbers are remembered, so later lookups hit the in-memory
+    (or encrypted on-disk) cache instead of asking Secret Manager for 'latest' again.
+    Versions in `pinned_versions` are always used as-is.
+    """
+
+    def __init__(self, project_id, client=None, client_factory=None, cache=None,
+                 pinned_versions=None, max_workers=8):
+        if not project_id:
+            raise ValueError("GCLOUD_PROJECT environment variable is not set.")
+        self.project_id = project_id
+        self._client = client
+        self._client_factory = client_factory
+        self._client_lock = threading.Lock()
+        self.cache = cache
+        self.pinned_versions = dict(pinned_versions or {})
+        self.max_workers = max_workers
+        self._lock = threading.Lock()
+        self._values = {}
+        self.versions = cache.load_versions() if cache else {}
+
+    @classmethod
+    def from_env(cls, client=None):
+        """Build a loader configured from GCLOUD_PROJECT, SECRET_VERSIONS and SECRET_CACHE_DIR/KEY."""
+        cache = None
+        cache_dir = os.getenv('SECRET_CACHE_DIR')
+        cache_key = os.getenv('SECRET_CACHE_KEY')
+        if cache_dir and cache_key:
+            cache = EncryptedSecretCache(cache_dir, cache_key)
+        return cls(
+            os.getenv('GCLOUD_PROJECT'),
+            client=client,
+            cache=cache,
+            pinned_versions=parse_pinned_versions(os.getenv('SECRET_VERSIONS')),
+        )
+
+    @property
+    def client(self):
+        """The shared Secret Manager client, created on first use."""
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    if self._client_factory is not None:
+                        self._client = self._client_factory()
+                    else:
+                        self._client = _default_client()
+        return self._client
+
+    def get(self, secret_name, refresh=False):
+        """Return a single secret value, raising RuntimeError on failure."""
+        try:
+            return self._get(secret_name, refresh)
+        except Exception as e:
+            raise RuntimeError(f"Failed to retrieve secret '{secret_name}': {e}")
+
+    def load(self, secret_names, refresh=False):
+        """Fetch several secrets at once, returning {name: value}."""
+        secret_names = list(secret_names)
+        if not secret_names:
+            return {}
+        # Create the shared client before fanning out so threads don't race to build it
+        self.client
+        workers = min(self.max_workers, len(secret_names))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            values = executor.map(lambda name: self.get(name, refresh), secret_names)
+            return dict(zip(secret_names, values))
+
+    def _get(self, secret_name, refresh):
+        pinned = self.pinned_versions.get(secret_name)
+        version = pinned or (None if refresh else self.versions.get(secret_name))
+
+        if version is not None:
+            cached = self._cached(secret_name, version)
+            if cached is not None:
+                return cached
+
+        name = f"projects/{self.project_id}/secrets/{secret_name}/versions/{version or 'latest'}"
+        response = self.client.access_secret_version(name=name)
+        value = response.payload.data.decode('UTF-8')
+        resolved = _version_from_name(getattr(response, 'name', None)) or version
+
+        if resolved is not None:
+            with self._lock:
+                self._values[(secret_name, resolved)] = value
+                self.versions[secret_name] = resolved
+            if self.cache:
+                self.cache.put(secret_name, resolved, value)
+                self.cache.save_versions({secret_name: resolved})
+        return value
+
+    def _cached(self, secret_name, version):
+        value = self._values.get((secret_name, version))
+        if value is None and self.cache:
+            value = self.cache.get(secret_name, version)
+            if value is not None:
+                with self._lock:
+                    self._values[(secret_name, version)] = value
+        return value
+
+
+def _default_client():
+    from google.cloud import secretmanager
+
+    emulator_host = os.getenv('SECRET_MANAGER_EMULATOR_HOST')
+    if emulator_host:
+        # Local stand-in (see benchmarks/fake_services.py): plain HTTP, no credentials
+        from google.auth.credentials import AnonymousCredentials
+        return secretmanager.SecretManagerServiceClient(
+            transport='rest',
+            credentials=AnonymousCredentials(),
+            client_options={'api_endpoint': emulator_host},
+        )
+    return secretmanager.SecretManagerServiceClient()
+
+
+def _version_from_name(name):
+    """Extract '3' from 'projects/p/secrets/s/versions/3'."""
+    if not isinstance(name, str) or '/versions/' not in name:
+        return None
+    version = name.rsplit('/', 1)[-1]
+    return version if version.isdigit() else None
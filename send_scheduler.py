@@ -0,0 +1,223 @@
+# send_scheduler.py
+
+import heapq
+import itertools
+import os
+import random
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+DEFAULT_RATE = 1.0  # messages per second per messaging service (Twilio long-code default)
+DEFAULT_BURST = 1
+DEFAULT_WORKERS = 8
+DEFAULT_MAX_ATTEMPTS = 5
+DEFAULT_BASE_DELAY = 0.5
+DEFAULT_MAX_DELAY = 30.0
+
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+
+def is_retryable(error):
+    """Throttling, upstream 5xx and connection problems are worth retrying; bad requests are not."""
+    status = getattr(error, 'status', None)
+    if status is not None:
+        return status in RETRYABLE_STATUSES
+    return isinstance(error, (ConnectionError, TimeoutError)) or type(error).__name__ in (
+        'ConnectionError', 'Timeout', 'ConnectTimeout', 'ReadTimeout'
+    )
+
+
+class SchedulerClosedError(ConnectionError):
+    """The scheduler was closed before this message could be sent; it is safe to send it again."""
+
+
+class TokenBucket:
+    """Classic token bucket: `rate` tokens per second, holding at most `capacity`."""
+
+    def __init__(self, rate, capacity, clock=time.monotonic):
+        self.rate = rate
+        self.capacity = capacity
+        self._clock = clock
+        self._tokens = capacity
+        self._updated = clock()
+
+    def try_acquire(self):
+        """Take a token if one is available; otherwise return seconds until one will be."""
+        now = self._clock()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return 0.0
+        return (1 - self._tokens) / self.rate
+
+
+class SendScheduler:
+    """Paces outbound SMS per messaging service and retries transient failures.
+
+    Messages wait in a time-ordered queue; a dispatcher thread hands each one to a
+    worker pool once its service's token bucket allows. Retryable failures go back
+    in the queue with exponential backoff and full jitter, up to `max_attempts`.
+    Every submission returns a Future resolving to the Twilio message (or raising
+    the final error).
+    """
+
+    def __init__(self, send_fn, rate=DEFAULT_RATE, burst=DEFAULT_BURST, max_workers=DEFAULT_WORKERS,
+                 max_attempts=DEFAULT_MAX_ATTEMPTS, base_delay=DEFAULT_BASE_DELAY,
+                 max_delay=DEFAULT_MAX_DELAY, clock=time.monotonic, rng=random.random):
+        self._send_fn = send_fn
+        self.rate = rate
+        self.burst = burst
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._clock = clock
+        self._rng = rng
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='sms-send')
+        self._buckets = {}
+        self._queue = []  # (ready_at, sequence, item)
+        self._sequence = itertools.count()
+        self._cond = threading.Condition()
+        self._in_flight = 0
+        self._closed = False
+        self._stopped = False
+        self.stats = {'sent': 0, 'retried': 0, 'failed': 0, 'throttled': 0}
+        self._dispatcher = threading.Thread(target=self._dispatch, name='sms-dispatch', daemon=True)
+        self._dispatcher.start()
+
+    @classmethod
+    def from_env(cls, twilio_client, max_workers=None):
+        """Build a scheduler over `twilio_client` using the SEND_* settings."""
+        return cls(
+            twilio_client.messages.create,
+            rate=float(os.getenv('SEND_RATE', DEFAULT_RATE)),
+            burst=int(os.getenv('SEND_BURST', DEFAULT_BURST)),
+            max_workers=max_workers or int(os.getenv('SEND_WORKERS', DEFAULT_WORKERS)),
+            max_attempts=int(os.getenv('SEND_MAX_ATTEMPTS', DEFAULT_MAX_ATTEMPTS)),
+        )
+
+    def submit(self, to, body, messaging_service_sid=None, from_=None):
+        """Queue one message; returns a Future."""
+        item = {
+            'kwargs': {'messaging_service_sid': messaging_service_sid, 'from_': from_, 'body': body, 'to': to},
+            'service': messaging_service_sid or from_,
+            'attempts': 0,
+            'future': Future(),
+        }
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Send scheduler is closed")
+            self._push(item, self._clock())
+        return item['future']
+
+    def send_batch(self, recipients, body, messaging_service_sid=None, from_=None):
+        """Queue the same message to many recipients; returns one Future per recipient."""
+        return [self.submit(to, body, messaging_service_sid, from_) for to in recipients]
+
+    @property
+    def pending(self):
+        return len(self._queue) + self._in_flight
+
+    def drain(self, timeout=None):
+        """Wait until every queued message is sent or has failed. Returns True if drained."""
+        deadline = None if timeout is None else self._clock() + timeout
+        with self._cond:
+            while self._queue or self._in_flight:
+                remaining = None if deadline is None else deadline - self._clock()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining if remaining is None else min(remaining, 0.1))
+        return True
+
+    def close(self, timeout=None):
+        """Stop accepting messages, drain the queue and shut down the workers.
+
+        Messages still queued after `timeout` are not sent: their futures fail with
+        SchedulerClosedError (or the last retryable error), so callers can hand them
+        to the outbox. Sends already in flight are allowed to finish.
+        """
+        with self._cond:
+            self._closed = True
+        drained = self.drain(timeout)
+        with self._cond:
+            self._stopped = True
+            abandoned = [item for _, _, item in self._queue]
+            self._queue.clear()
+            self.stats['failed'] += len(abandoned)
+            self._cond.notify_all()
+        # The dispatcher must be gone before the executor shuts down, or its next submit() fails
+        if threading.current_thread() is not self._dispatcher:
+            self._dispatcher.join()
+        for item in abandoned:
+            error = item.get('error') or SchedulerClosedError("Send scheduler closed before the message was sent")
+            print(f"Not sending to {item['kwargs']['to']}: send scheduler closed")
+            item['future'].set_exception(error)
+        self._executor.shutdown(wait=drained)
+        return drained
+
+    def _push(self, item, ready_at):
+        heapq.heappush(self._queue, (ready_at, next(self._sequence), item))
+        self._cond.notify_all()
+
+    def _bucket(self, service):
+        bucket = self._buckets.get(service)
+        if bucket is None:
+            bucket = self._buckets[service] = TokenBucket(self.rate, self.burst, self._clock)
+        return bucket
+
+    def _dispatch(self):
+        with self._cond:
+            while True:
+                if self._stopped:
+                    return
+                if not self._queue:
+                    if self._closed and not self._in_flight:
+                        return
+                    self._cond.wait(0.1)
+                    continue
+                ready_at, _, item = self._queue[0]
+                now = self._clock()
+                if ready_at > now:
+                    self._cond.wait(ready_at - now)
+                    continue
+                wait = self._bucket(item['service']).try_acquire()
+                heapq.heappop(self._queue)
+                if wait:
+                    self.stats['throttled'] += 1
+                    self._push(item, now + wait)
+                    continue
+                self._in_flight += 1
+                self._executor.submit(self._attempt, item)
+
+    def _attempt(self, item):
+        item['attempts'] += 1
+        try:
+            message = self._send_fn(**item['kwargs'])
+        except Exception as e:
+            with self._cond:
+                # Once closed, nothing dispatches the queue any more, so a retry would be lost
+                if is_retryable(e) and item['attempts'] < self.max_attempts and not self._stopped:
+                    item['error'] = e
+                    self._in_flight -= 1
+                    self.stats['retried'] += 1
+                    self._push(item, self._clock() + self._backoff(item['attempts']))
+                    return
+            print(f"Giving up sending to {item['kwargs']['to']} after {item['attempts']} attempts: {e}")
+            item['future'].set_exception(e)
+            with self._cond:
+                self._in_flight -= 1
+                self.stats['failed'] += 1
+                self._cond.notify_all()
+            return
+
+        # Resolve the future before counting it done, so drain() implies resolved futures
+        item['future'].set_result(message)
+        with self._cond:
+            self._in_flight -= 1
+            self.stats['sent'] += 1
+            self._cond.notify_all()
+
+    def _backoff(self, attempts):
+        # Full jitter: uniform in [0, min(max_delay, base * 2^(attempt-1))]
+        return self._rng() * min(self.max_delay, self.base_delay * 2 ** (attempts - 1))
@@ -0,0 +1,138 @@
+# server.py
+#
+# Long-running server mode: the same webhook handler as the Cloud Function,
+# served by gunicorn with preforked workers and a thread pool in each. Every
+# worker builds its clients once at startup and keeps them warm, so there are
+# no cold starts after boot. Run it with:
+#
+#   python server.py            # SERVER_WORKERS, SERVER_THREADS, PORT
+
+import os
+import threading
+
+from flask import Flask, Response, jsonify, request
+
+from main import auto_responder
+from pipeline import get_pipeline
+from telemetry import PROMETHEUS_CONTENT_TYPE, get_telemetry
+from tenants import get_tenant_registry
+from utils import env_flag, environment_cache, initialize_environment
+
+DEFAULT_PORT = 8080
+DEFAULT_THREADS = 8
+DEFAULT_GRACEFUL_TIMEOUT = 30
+
+app = Flask(__name__)
+
+_shutting_down = threading.Event()
+
+
+@app.route('/healthz')
+def healthz():
+    """Liveness: the worker is up and serving requests."""
+    return jsonify({'status': 'ok'}), 200
+
+
+@app.route('/readyz')
+def readyz():
+    """Readiness: clients are built and the worker isn't shutting down."""
+    if _shutting_down.is_set():
+        return jsonify({'status': 'shutting down'}), 503
+    if environment_cache.peek() is None:
+        return jsonify({'status': 'warming up'}), 503
+    return jsonify({'status': 'ready'}), 200
+
+
+@app.route('/metrics')
+def metrics():
+    """Prometheus metrics, when METRICS_ENDPOINT is set; otherwise the route doesn't exist."""
+    if not env_flag('METRICS_ENDPOINT'):
+        return jsonify({'status': 'not found'}), 404
+    return Response(get_telemetry().render_prometheus(), content_type=PROMETHEUS_CONTENT_TYPE)
+
+
+@app.route('/', methods=['POST'])
+@app.route('/auto_responder', methods=['POST'])
+def webhook():
+    return auto_responder(request)
+
+
+def warm_up():
+    """Build this worker's env_vars bundle before it takes traffic. Returns True on success."""
+    try:
+        initialize_environment()
+        return True
+    except Exception as e:
+        # Requests will retry the load; /readyz stays 503 until one succeeds
+        print(f"Error warming up worker: {e}")
+        return False
+
+
+def shutdown(timeout=DEFAULT_GRACEFUL_TIMEOUT):
+    """Finish background replies, then flush queued sends and buffered logs.
+
+    Runs once in-flight requests are done. Background jobs go first because they
+    produce sends and log records of their own.
+    """
+    _shutting_down.set()
+    if env_flag('ASYNC_PIPELINE') and not get_pipeline().drain(timeout):
+        print("Background pipeline did not drain before shutdown")
+
+    bundles = [environment_cache.peek()]
+    registry = get_tenant_registry()
+    if registry is not None:
+        bundles += [tenant.peek() for tenant in registry]
+    schedulers, sinks = [], []
+    for env_vars in bundles:
+        if env_vars is None:
+            continue
+        # Tenants may share the default's scheduler and sink; close each one once
+        if env_vars.get('send_scheduler') is not None and env_vars['send_scheduler'] not in schedulers:
+            schedulers.append(env_vars['send_scheduler'])
+        if env_vars.get('log_sink') is not None and env_vars['log_sink'] not in sinks:
+            sinks.append(env_vars['log_sink'])
+
+    for scheduler in schedulers:
+        if not scheduler.close(timeout):
+            print("Send scheduler did not drain before shutdown")
+    for sink in sinks:
+        sink.close()
+
+
+def gunicorn_options():
+    """gunicorn settings from SERVER_* and PORT, with hooks that warm up and drain each worker."""
+    timeout = int(os.getenv('SERVER_GRACEFUL_TIMEOUT', DEFAULT_GRACEFUL_TIMEOUT))
+    return {
+        'bind': f"{os.getenv('SERVER_HOST', '0.0.0.0')}:{os.getenv('PORT', DEFAULT_PORT)}",
+        'workers': int(os.getenv('SERVER_WORKERS', os.cpu_count() or 1)),
+        'worker_class': 'gthread',
+        'threads': int(os.getenv('SERVER_THREADS', DEFAULT_THREADS)),
+        'timeout': int(os.getenv('SERVER_TIMEOUT', 60)),
+        'graceful_timeout': timeout,
+        'keepalive': int(os.getenv('SERVER_KEEPALIVE', 5)),
+        # Clients hold sockets and threads, so each worker builds its own after the fork
+        'post_worker_init': lambda worker: warm_up(),
+        'worker_exit': lambda server, worker: shutdown(timeout),
+    }
+
+
+def run():
+    from gunicorn.app.base import BaseApplication
+
+    class Server(BaseApplication):
+        def __init__(self, options):
+            self.options = options
+            super().__init__()
+
+        def load_config(self):
+            for key, value in self.options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            return app
+
+    Server(gunicorn_options()).run()
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,93 @@
+# sms_segments.py
+
+import re
+
+# Characters in the GSM 03.38 basic set and its extension table. Any other
+# character forces UCS-2 encoding, which cuts a single SMS from 160 to 70 chars.
+GSM7_CHARS = set(
+    '@£$¥èéùìòÇ\nØø\rÅåΔ_ΦΓΛΩΠΨΣΘΞÆæßÉ !"#¤%&\'()*+,-./0123456789:;<=>?'
+    '¡ABCDEFGHIJKLMNOPQRSTUVWXYZÄÖÑÜ§¿abcdefghijklmnopqrstuvwxyzäöñüà'
+    '^{}\\[~]|€'
+)
+GSM7_EXTENDED = set('^{}\\[~]|€')
+
+GSM7_LIMIT = 160
+UCS2_LIMIT = 70
+
+# End of a sentence or line: punctuation followed by whitespace, or a newline
+_BOUNDARY = re.compile(r'[.!?…](?:["\')\]]*)\s+|\n+')
+
+
+def is_gsm7(text):
+    return all(char in GSM7_CHARS for char in text)
+
+
+def _char_units(char, gsm):
+    if gsm:
+        return 2 if char in GSM7_EXTENDED else 1
+    # UCS-2 segments count UTF-16 code units; emoji outside the BMP take two
+    return 2 if ord(char) > 0xFFFF else 1
+
+
+def sms_length(text):
+    """Length in encoding units, which is what the 160/70 limits are measured in."""
+    gsm = is_gsm7(text)
+    return sum(_char_units(char, gsm) for char in text)
+
+
+def segment_limit(text):
+    return GSM7_LIMIT if is_gsm7(text) else UCS2_LIMIT
+
+
+def _cut_point(text, limit):
+    """Index to cut `text` so the head fits in one SMS, preferring sentence then word boundaries."""
+    gsm = is_gsm7(text)
+    fits = used = 0
+    for char in text:
+        used += _char_units(char, gsm)
+        if used > limit:
+            break
+        fits += 1
+
+    best = 0
+    for match in _BOUNDARY.finditer(text):
+        if match.end() > fits:
+            # Trailing whitespace may overflow; the stripped sentence still fits
+            if match.start() + 1 <= fits:
+                best = match.end()
+            break
+        best = match.end()
+    if best:
+        return best
+
+    space = text.rfind(' ', 0, fits + 1)
+    return space + 1 if space > 0 else fits
+
+
+class SegmentSplitter:
+    """Splits streamed text into SMS-sized segments, emitting each as soon as it is full."""
+
+    def __init__(self):
+        self._buffer = ''
+
+    def feed(self, chunk):
+        """Add streamed text; return the segments completed by it."""
+        self._buffer += chunk or ''
+        segments = []
+        while sms_length(self._buffer) > segment_limit(self._buffer):
+            cut = _cut_point(self._buffer, segment_limit(self._buffer))
+            segment, self._buffer = self._buffer[:cut].strip(), self._buffer[cut:].lstrip()
+            if segment:
+                segments.append(segment)
+        return segments
+
+    def finish(self):
+        """Return whatever is left once the stream ends."""
+        segment, self._buffer = self._buffer.strip(), ''
+        return [segment] if segment else []
+
+
+def split_text(text):
+    """Split a complete message into SMS-sized segments."""
+    splitter = SegmentSplitter()
+    return splitter.feed(text) + splitter.finish()
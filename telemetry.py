@@ -0,0 +1,211 @@
+# telemetry.py
+
+import contextvars
+import json
+import os
+import random
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+DEFAULT_SAMPLE_RATE = 0.01
+
+# Upper bounds in seconds; webhook stages range from sub-millisecond validation to multi-second LLM calls
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+_current_trace = contextvars.ContextVar('telemetry_trace', default=None)
+
+
+class Histogram:
+    """Cumulative latency histogram with fixed buckets, like a Prometheus histogram."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # last slot is +Inf
+        self.count = 0
+        self.errors = 0
+        self.sum = 0.0
+
+    def observe(self, seconds, error=False):
+        index = 0
+        for bound in self.buckets:
+            if seconds <= bound:
+                break
+            index += 1
+        self.counts[index] += 1
+        self.count += 1
+        self.errors += int(error)
+        self.sum += seconds
+
+    def cumulative(self):
+        """[(upper bound, observations <= bound)], ending with ('+Inf', count)."""
+        total = 0
+        result = []
+        for bound, count in zip(self.buckets + ('+Inf',), self.counts):
+            total += count
+            result.append((bound, total))
+        return result
+
+
+class Telemetry:
+    """Per-stage spans feeding in-process histograms and sampled JSON trace logs.
+
+    Every span is counted in a histogram, which costs a clock read and a lock. Only
+    a `sample_rate` fraction of traces (one per webhook) are also written out, as a
+    single structured log line listing their spans.
+    """
+
+    def __init__(self, sample_rate=DEFAULT_SAMPLE_RATE, emit=None, buckets=DEFAULT_BUCKETS, rng=random.random):
+        self.sample_rate = sample_rate
+        self._emit = emit or _print_json
+        self.buckets = tuple(buckets)
+        self._rng = rng
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = {}
+
+    @classmethod
+    def from_env(cls):
+        """Build from TELEMETRY_SAMPLE_RATE (0 disables trace logs; histograms are always kept)."""
+        return cls(sample_rate=float(os.getenv('TELEMETRY_SAMPLE_RATE', DEFAULT_SAMPLE_RATE)))
+
+    def record(self, name, seconds, error=False):
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = Histogram(self.buckets)
+            histogram.observe(seconds, error)
+
+    def increment(self, name, amount=1):
+        """Bump the event counter `name` (e.g. hedges fired), exported as sms_events_total."""
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    def counters(self):
+        with self._lock:
+            return dict(self._counters)
+
+    @contextmanager
+    def span(self, name):
+        """Time the wrapped block as stage `name`."""
+        start = time.perf_counter()
+        error = False
+        try:
+            yield
+        except BaseException:
+            error = True
+            raise
+        finally:
+            seconds = time.perf_counter() - start
+            self.record(name, seconds, error)
+            trace = _current_trace.get()
+            if trace is not None:
+                span = {'name': name, 'duration_ms': round(seconds * 1000, 3)}
+                if error:
+                    span['error'] = True
+                trace['spans'].append(span)
+
+    @contextmanager
+    def trace(self, name, **attributes):
+        """Time a whole request; yields a dict whose entries are added to the trace log."""
+        sampled = self.sample_rate > 0 and self._rng() < self.sample_rate
+        fields = dict(attributes)
+        trace = {'spans': [], 'fields': fields} if sampled else None
+        token = _current_trace.set(trace)
+        start = time.perf_counter()
+        error = False
+        try:
+            yield fields
+        except BaseException:
+            error = True
+            raise
+        finally:
+            seconds = time.perf_counter() - start
+            _current_trace.reset(token)
+            self.record(name, seconds, error)
+            if sampled:
+                entry = {
+                    'severity': 'ERROR' if error else 'INFO',
+                    'message': f'{name} trace',
+                    'trace': name,
+                    'trace_id': uuid.uuid4().hex,
+                    'duration_ms': round(seconds * 1000, 3),
+                    'spans': trace['spans'],
+                }
+                entry.update(fields)
+                self._emit(entry)
+
+    def annotate(self, **fields):
+        """Add fields to the current trace's log line, if it is being sampled."""
+        trace = _current_trace.get()
+        if trace is not None:
+            trace['fields'].update(fields)
+
+    def snapshot(self):
+        """{name: {'count', 'errors', 'sum_seconds', 'buckets'}} for every stage seen so far."""
+        with self._lock:
+            return {
+                name: {
+                    'count': histogram.count,
+                    'errors': histogram.errors,
+                    'sum_seconds': histogram.sum,
+                    'buckets': histogram.cumulative(),
+                }
+                for name, histogram in self._histograms.items()
+            }
+
+    def render_prometheus(self):
+        """The histograms in Prometheus text exposition format."""
+        snapshot = self.snapshot()
+        lines = [
+            '# HELP sms_stage_duration_seconds Time spent in each webhook stage.',
+            '# TYPE sms_stage_duration_seconds histogram',
+        ]
+        for name in sorted(snapshot):
+            stats = snapshot[name]
+            for bound, count in stats['buckets']:
+                lines.append(f'sms_stage_duration_seconds_bucket{{stage="{name}",le="{bound}"}} {count}')
+            lines.append(f'sms_stage_duration_seconds_sum{{stage="{name}"}} {stats["sum_seconds"]:.6f}')
+            lines.append(f'sms_stage_duration_seconds_count{{stage="{name}"}} {stats["count"]}')
+        lines += [
+            '# HELP sms_stage_errors_total Stages that ended in an exception.',
+            '# TYPE sms_stage_errors_total counter',
+        ]
+        for name in sorted(snapshot):
+            lines.append(f'sms_stage_errors_total{{stage="{name}"}} {snapshot[name]["errors"]}')
+        counters = self.counters()
+        if counters:
+            lines += [
+                '# HELP sms_events_total Counted events, such as LLM hedges fired and won.',
+                '# TYPE sms_events_total counter',
+            ]
+            for name in sorted(counters):
+                lines.append(f'sms_events_total{{event="{name}"}} {counters[name]}')
+        return '\n'.join(lines) + '\n'
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+
+def _print_json(entry):
+    # Cloud Functions turns JSON lines on stdout into structured log entries
+    print(json.dumps(entry, separators=(',', ':')))
+
+
+_telemetry = None
+_telemetry_lock = threading.Lock()
+
+
+def get_telemetry():
+    """Return the instance-wide Telemetry, creating it on first use."""
+    global _telemetry
+    if _telemetry is None:
+        with _telemetry_lock:
+            if _telemetry is None:
+                _telemetry = Telemetry.from_env()
+    return _telemetry
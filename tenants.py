@@ -0,0 +1,211 @@
+# tenants.py
+
+import json
+import os
+import threading
+
+from rate_limit import ConcurrencyLimiter, SQLiteRateBackend, SenderRateLimiter, Throttle, get_throttle
+from utils import _build_clients, get_auth_tokens, get_secret, initialize_environment
+
+SECRET_PREFIX = 'secret:'
+
+# Settings a tenant may override; anything it leaves out comes from the default environment
+TENANT_SETTINGS = (
+    'TWILIO_ACCOUNT_SID',
+    'TWILIO_AUTH_TOKEN',
+    'TWILIO_AUTH_TOKEN_SECONDARY',
+    'TWILIO_MESSAGING_SERVICE_SID',
+    'OPENAI_API_KEY',
+    'BUCKET_NAME',
+)
+
+
+class Tenant:
+    """One inbound Twilio number: its prompt, credentials, bucket and rate limits.
+
+    Settings whose value starts with `secret:` name a Secret Manager secret and are
+    fetched on first use. The tenant's clients are built on its first request and
+    reused after that; clients whose credentials match the default environment's
+    are shared with it rather than duplicated.
+    """
+
+    def __init__(self, phone_number, name=None, system_prompt=None, settings=None, rate_limit_messages=0,
+                 rate_limit_window=60, llm_max_concurrency=0, resolve_secret=get_secret,
+                 default_env=initialize_environment):
+        self.phone_number = phone_number
+        self.name = name or phone_number
+        self.system_prompt = system_prompt
+        self.settings = {key: value for key, value in (settings or {}).items() if key in TENANT_SETTINGS}
+        self.rate_limit_messages = rate_limit_messages
+        self.rate_limit_window = rate_limit_window
+        self.llm_max_concurrency = llm_max_concurrency
+        self._resolve_secret = resolve_secret
+        self._default_env = default_env
+        self._lock = threading.Lock()
+        self._resolved = None
+        self._bundle = None   # (default env_vars it was built from, tenant env_vars)
+        self._throttle = None
+
+    @classmethod
+    def from_config(cls, entry, **kwargs):
+        return cls(
+            entry['phone_number'],
+            name=entry.get('name'),
+            system_prompt=entry.get('system_prompt'),
+            settings=entry,
+            rate_limit_messages=int(entry.get('rate_limit_messages', 0)),
+            rate_limit_window=float(entry.get('rate_limit_window', 60)),
+            llm_max_concurrency=int(entry.get('llm_max_concurrency', 0)),
+            **kwargs,
+        )
+
+    def resolved_settings(self):
+        """The tenant's own settings with `secret:` references fetched (once)."""
+        if self._resolved is None:
+            self._resolved = {
+                key: self._resolve_secret(value[len(SECRET_PREFIX):])
+                if isinstance(value, str) and value.startswith(SECRET_PREFIX) else value
+                for key, value in self.settings.items()
+            }
+        return self._resolved
+
+    def auth_tokens(self):
+        """Tokens this number's webhooks may be signed with, without building any clients."""
+        settings = self.resolved_settings()
+        if 'TWILIO_AUTH_TOKEN' not in settings:
+            return get_auth_tokens()
+        primary, secondary = settings['TWILIO_AUTH_TOKEN'], settings.get('TWILIO_AUTH_TOKEN_SECONDARY')
+        return (primary, secondary) if secondary and secondary != primary else (primary,)
+
+    def throttle(self):
+        """The tenant's own Throttle if it sets limits, otherwise the instance-wide one."""
+        if not self.rate_limit_messages and not self.llm_max_concurrency:
+            return get_throttle()
+        if self._throttle is None:
+            with self._lock:
+                if self._throttle is None:
+                    self._throttle = self._build_throttle()
+        return self._throttle
+
+    def peek(self):
+        """The tenant's env_vars if they have been built, else None."""
+        bundle = self._bundle
+        return bundle[1] if bundle is not None else None
+
+    def env_vars(self):
+        """The tenant's env_vars bundle, built on first use and rebuilt when the default one refreshes."""
+        default = self._default_env()
+        bundle = self._bundle
+        if bundle is not None and bundle[0] is default:
+            return bundle[1]
+        with self._lock:
+            bundle = self._bundle
+            if bundle is not None and bundle[0] is default:
+                return bundle[1]
+            previous = bundle[1] if bundle is not None else None
+            env_vars = self._build(default, previous)
+            self._bundle = (default, env_vars)
+            return env_vars
+
+    def _build(self, default, previous):
+        settings = {key: value for key, value in default.items() if key not in _CLIENT_KEYS}
+        settings.update(self.resolved_settings())
+        settings['TWILIO_PHONE_NUMBER'] = self.phone_number
+
+        twilio_keys = ('TWILIO_ACCOUNT_SID', 'TWILIO_AUTH_TOKEN')
+        own_twilio = any(settings[key] != default.get(key) for key in twilio_keys)
+        if previous is None:
+            # Start from the default clients; _build_clients keeps those whose credentials match
+            previous = dict(default)
+            if settings['BUCKET_NAME'] != default.get('BUCKET_NAME'):
+                previous['log_sink'] = None
+            if own_twilio:
+                # Otherwise _build_clients would treat this as a rotation and retire the default's scheduler
+                previous['twilio_client'] = None
+        elif not own_twilio:
+            # Follow the default's Twilio client across rotations, so both keep sharing its send scheduler
+            previous = dict(previous, twilio_client=default.get('twilio_client'),
+                            **{key: default.get(key) for key in twilio_keys})
+
+        env_vars = dict(settings)
+        env_vars.update(_build_clients(settings, previous))
+        env_vars['tenant'] = self.name
+        env_vars['throttle'] = self.throttle()
+        if self.system_prompt:
+            env_vars['SYSTEM_PROMPT'] = self.system_prompt
+        return env_vars
+
+    def _build_throttle(self):
+        shared = get_throttle()
+        sender_limiter = shared.sender_limiter
+        if self.rate_limit_messages:
+            path = os.getenv('RATE_LIMIT_DB')
+            sender_limiter = SenderRateLimiter(
+                self.rate_limit_messages,
+                window=self.rate_limit_window,
+                backend=SQLiteRateBackend(path) if path else None,
+                namespace=f'{self.phone_number}:',
+            )
+        concurrency = shared.concurrency
+        if self.llm_max_concurrency:
+            concurrency = ConcurrencyLimiter(self.llm_max_concurrency)
+        return Throttle(sender_limiter, concurrency, action=shared.action, reply=shared.reply,
+                        slot_timeout=shared.slot_timeout)
+
+
+# Entries of an env_vars bundle that are clients or caches rather than settings
+_CLIENT_KEYS = (
+    'twilio_client', 'openai_client', 'storage_client', 'secretmanager_client', 'secret_loader',
+    'log_sink', 'conversation_store', 'response_cache', 'model_router', 'llm_client', 'send_scheduler',
+    'outbox', 'tenant', 'throttle', 'SYSTEM_PROMPT',
+)
+
+
+class TenantRegistry:
+    """Tenants keyed by their Twilio number (the webhook's `To`)."""
+
+    def __init__(self, tenants):
+        self._tenants = {tenant.phone_number: tenant for tenant in tenants}
+
+    @classmethod
+    def from_env(cls):
+        """Load TENANTS (a JSON list) or the JSON file at TENANTS_FILE; None when neither is set."""
+        if os.getenv('TENANTS'):
+            entries = json.loads(os.environ['TENANTS'])
+        elif os.getenv('TENANTS_FILE'):
+            with open(os.environ['TENANTS_FILE']) as f:
+                entries = json.load(f)
+        else:
+            return None
+        return cls(Tenant.from_config(entry) for entry in entries)
+
+    def lookup(self, to_number):
+        """The tenant for this number, or None (the default environment answers it)."""
+        return self._tenants.get(to_number)
+
+    def __len__(self):
+        return len(self._tenants)
+
+    def __iter__(self):
+        return iter(self._tenants.values())
+
+
+_registry = None
+_registry_loaded = False
+_registry_lock = threading.Lock()
+
+
+def get_tenant_registry():
+    """Return the instance-wide TenantRegistry, or None when multi-tenancy isn't configured."""
+    global _registry, _registry_loaded
+    if not _registry_loaded:
+        with _registry_lock:
+            if not _registry_loaded:
+                _registry = TenantRegistry.from_env()
+                _registry_loaded = True
+    return _registry
+
+
+def lookup_tenant(to_number):
+    registry = get_tenant_registry()
+    return registry.lookup(to_number) if registry is not None else None
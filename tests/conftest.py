@@ -0,0 +1,18 @@
+# tests/conftest.py
+
+import pytest
+
+
+class FakeClock:
+    """A clock that only moves when a test sets `now`; pass it wherever code takes `clock=`."""
+
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
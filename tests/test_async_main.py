@@ -0,0 +1,124 @@
+# tests/test_async_main.py
+
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, patch
+from urllib.parse import urlencode
+from starlette.requests import Request
+import async_main
+from async_main import auto_responder_async, request_url
+
+
+@pytest.fixture(autouse=True)
+def clear_validators():
+    async_main.validators.clear()
+
+
+def make_request(data, headers, path='/'):
+    body = urlencode(data).encode()
+    raw_headers = [(b'content-type', b'application/x-www-form-urlencoded'), (b'host', b'testserver')]
+    raw_headers += [(key.lower().encode(), value.encode()) for key, value in headers.items()]
+
+    async def receive():
+        return {'type': 'http.request', 'body': body, 'more_body': False}
+
+    scope = {
+        'type': 'http', 'method': 'POST', 'scheme': 'http', 'path': path,
+        'query_string': b'', 'headers': raw_headers, 'server': ('testserver', 80),
+    }
+    return Request(scope, receive)
+
+
+def fake_env_vars():
+    return {
+        'TWILIO_AUTH_TOKEN': 'test_auth_token',
+        'TWILIO_PHONE_NUMBER': '+15555555555',
+        'TWILIO_MESSAGING_SERVICE_SID': 'test_messaging_sid',
+        'BUCKET_NAME': 'practice-dev-bucket',
+    }
+
+
+HEADERS = {'X-Twilio-Signature': 'valid_signature', 'X-Forwarded-Proto': 'https', 'X-Forwarded-Host': 'example.com'}
+
+
+@patch('async_main.initialize_environment_async', new_callable=AsyncMock)
+@patch('async_main.get_LLM_response_async', new_callable=AsyncMock)
+@patch('async_main.send_message_via_twilio_async', new_callable=AsyncMock)
+@patch('async_main.write_log_to_storage_async', new_callable=AsyncMock)
+@patch('async_main.RequestValidator')
+def test_auto_responder_async_valid_request(
+    mock_request_validator, mock_write_log, mock_send_message, mock_get_llm_response, mock_initialize_environment
+):
+    env_vars = fake_env_vars()
+    mock_initialize_environment.return_value = env_vars
+    mock_request_validator.return_value.validate.return_value = True
+    mock_get_llm_response.return_value = 'Mocked LLM response'
+
+    response = asyncio.run(auto_responder_async(make_request({'From': '+1234567890', 'Body': 'Hello'}, HEADERS)))
+
+    assert response.status_code == 200
+    mock_request_validator.return_value.validate.assert_called_once_with(
+        'https://example.com/', {'From': '+1234567890', 'Body': 'Hello'}, 'valid_signature'
+    )
+    mock_send_message.assert_awaited_once_with('+1234567890', 'Mocked LLM response', None, env_vars)
+    mock_write_log.assert_awaited_once()
+
+
+@patch('async_main.initialize_environment_async', new_callable=AsyncMock)
+@patch('async_main.get_LLM_response_async', new_callable=AsyncMock)
+@patch('async_main.RequestValidator')
+def test_auto_responder_async_invalid_signature(
+    mock_request_validator, mock_get_llm_response, mock_initialize_environment
+):
+    mock_initialize_environment.return_value = fake_env_vars()
+    mock_request_validator.return_value.validate.return_value = False
+
+    response = asyncio.run(auto_responder_async(make_request({'From': '+1234567890', 'Body': 'Hello'}, HEADERS)))
+
+    assert response.status_code == 403
+    mock_get_llm_response.assert_not_awaited()
+
+
+@patch('async_main.initialize_environment_async', new_callable=AsyncMock)
+@patch('async_main.get_LLM_response_async', new_callable=AsyncMock)
+@patch('async_main.RequestValidator')
+def test_auto_responder_async_llm_failure(
+    mock_request_validator, mock_get_llm_response, mock_initialize_environment
+):
+    mock_initialize_environment.return_value = fake_env_vars()
+    mock_request_validator.return_value.validate.return_value = True
+    mock_get_llm_response.return_value = None
+
+    response = asyncio.run(auto_responder_async(make_request({'From': '+1234567890', 'Body': 'Hello'}, HEADERS)))
+
+    assert response.status_code == 500
+
+
+def test_request_url_without_proxy_headers():
+    request = make_request({}, {}, path='/auto_responder')
+    assert request_url(request) == 'http://testserver/auto_responder'
+
+
+@patch('async_main.RequestValidator')
+def test_auto_responder_async_rejects_oversized_body_while_streaming(mock_request_validator, monkeypatch):
+    # Arrange
+    monkeypatch.setenv('MAX_REQUEST_BYTES', '1000')
+    chunks = [b'Body=' + b'x' * 600, b'x' * 600, b'x' * 600]
+
+    async def receive():
+        # No Content-Length: the limit has to be enforced as chunks arrive
+        return {'type': 'http.request', 'body': chunks.pop(0), 'more_body': bool(chunks)}
+
+    scope = {
+        'type': 'http', 'method': 'POST', 'scheme': 'http', 'path': '/', 'query_string': b'',
+        'headers': [(b'x-twilio-signature', b'valid_signature'), (b'host', b'testserver')],
+        'server': ('testserver', 80),
+    }
+
+    # Act
+    response = asyncio.run(auto_responder_async(Request(scope, receive)))
+
+    # Assert
+    assert response.status_code == 413
+    assert len(chunks) == 1     # stopped reading before the last chunk
+    mock_request_validator.return_value.validate.assert_not_called()
@@ -0,0 +1,141 @@
+# tests/test_async_utils.py
+
+import asyncio
+import time
+import pytest
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+from async_utils import (
+    get_LLM_response_async,
+    send_message_via_twilio_async,
+    write_log_to_storage_async,
+)
+
+
+@pytest.fixture
+def env_vars():
+    async_clients = SimpleNamespace(openai_client=MagicMock(), twilio_client=MagicMock())
+    async_clients.openai_client.chat.completions.create = AsyncMock()
+    async_clients.twilio_client.messages.create_async = AsyncMock()
+    return {
+        'TWILIO_PHONE_NUMBER': 'test_twilio_phone_number',
+        'TWILIO_MESSAGING_SERVICE_SID': 'test_messaging_service_sid',
+        'BUCKET_NAME': 'test_bucket',
+        'storage_client': MagicMock(),
+        'async_clients': async_clients,
+    }
+
+
+def test_get_LLM_response_async_success(env_vars):
+    # Arrange
+    create = env_vars['async_clients'].openai_client.chat.completions.create
+    create.return_value = MagicMock(choices=[MagicMock(message=MagicMock(content='Mocked LLM response'))])
+
+    # Act
+    response = asyncio.run(get_LLM_response_async([{'role': 'user', 'content': 'Hello'}], env_vars))
+
+    # Assert
+    assert response == 'Mocked LLM response'
+    create.assert_awaited_once()
+
+
+def test_get_LLM_response_async_exception(env_vars):
+    # Arrange
+    env_vars['async_clients'].openai_client.chat.completions.create.side_effect = Exception('OpenAI API error')
+
+    # Act
+    response = asyncio.run(get_LLM_response_async([{'role': 'user', 'content': 'Hello'}], env_vars))
+
+    # Assert
+    assert response is None
+
+
+def test_send_message_via_twilio_async_success(env_vars):
+    # Act
+    unique_id = asyncio.run(send_message_via_twilio_async('+1234567890', 'Test message', None, env_vars))
+
+    # Assert
+    assert unique_id is not None
+    env_vars['async_clients'].twilio_client.messages.create_async.assert_awaited_once_with(
+        messaging_service_sid='test_messaging_service_sid',
+        from_='test_twilio_phone_number',
+        body='Test message',
+        to='+1234567890'
+    )
+
+
+def test_send_message_via_twilio_async_exception(env_vars):
+    # Arrange
+    env_vars['async_clients'].twilio_client.messages.create_async.side_effect = Exception('Twilio API error')
+
+    # Act
+    unique_id = asyncio.run(send_message_via_twilio_async('+1234567890', 'Test message', None, env_vars))
+
+    # Assert
+    assert unique_id is None
+
+
+def test_requests_run_concurrently(env_vars):
+    # Arrange
+    async def slow_create(**kwargs):
+        await asyncio.sleep(0.1)
+        return MagicMock(choices=[MagicMock(message=MagicMock(content='reply'))])
+
+    env_vars['async_clients'].openai_client.chat.completions.create = slow_create
+
+    async def many():
+        content = [{'role': 'user', 'content': 'Hello'}]
+        return await asyncio.gather(*(get_LLM_response_async(content, env_vars) for _ in range(20)))
+
+    # Act
+    start = time.monotonic()
+    responses = asyncio.run(many())
+    elapsed = time.monotonic() - start
+
+    # Assert
+    assert responses == ['reply'] * 20
+    assert elapsed < 1.0
+
+
+def test_write_log_to_storage_async_uses_log_sink(env_vars):
+    # Arrange
+    env_vars['log_sink'] = MagicMock()
+
+    # Act
+    asyncio.run(write_log_to_storage_async({'test': 'data'}, env_vars))
+
+    # Assert
+    env_vars['log_sink'].write.assert_called_once_with({'test': 'data'})
+
+
+def test_evicted_client_pools_are_closed(monkeypatch):
+    # Arrange
+    import async_utils
+    created = []
+
+    class FakePool:
+        def __init__(self, env_vars):
+            self.close = AsyncMock()
+            created.append(self)
+
+    monkeypatch.setattr(async_utils, 'AsyncClientPool', FakePool)
+    monkeypatch.setattr(async_utils, 'MAX_POOLS_PER_LOOP', 2)
+
+    def credentials(token):
+        return {'OPENAI_API_KEY': 'sk', 'TWILIO_ACCOUNT_SID': 'AC1', 'TWILIO_AUTH_TOKEN': token}
+
+    async def rotate():
+        first = async_utils.get_async_clients(credentials('one'))
+        second = async_utils.get_async_clients(credentials('two'))
+        async_utils.get_async_clients(credentials('one'))   # used again, so 'two' is now the oldest
+        async_utils.get_async_clients(credentials('three'))
+        await asyncio.sleep(0)
+        return first, second
+
+    # Act
+    first, second = asyncio.run(rotate())
+
+    # Assert
+    assert len(created) == 3
+    second.close.assert_awaited_once()
+    first.close.assert_not_awaited()
@@ -0,0 +1,21 @@
+# tests/test_config.py
+
+import pytest
+from config import env_flag
+
+
+@pytest.mark.parametrize('value, expected', [
+    ('1', True), ('true', True), (' Yes ', True), ('ON', True),
+    ('0', False), ('false', False), ('', False), ('maybe', False),
+])
+def test_env_flag_reads_truthy_values(value, expected, monkeypatch):
+    monkeypatch.setenv('SOME_FLAG', value)
+
+    assert env_flag('SOME_FLAG') is expected
+
+
+def test_env_flag_falls_back_to_default_when_unset(monkeypatch):
+    monkeypatch.delenv('SOME_FLAG', raising=False)
+
+    assert env_flag('SOME_FLAG') is False
+    assert env_flag('SOME_FLAG', default=True) is True
@@ -0,0 +1,106 @@
+# tests/test_conversation_store.py
+
+import pytest
+from unittest.mock import MagicMock
+from conversation_store import ConversationStore, SQLiteHistoryBackend, trim_to_budget
+
+SYSTEM = {'role': 'system', 'content': 'Be terse.'}
+
+
+@pytest.fixture
+def backend(tmp_path):
+    backend = SQLiteHistoryBackend(str(tmp_path / 'conversations.sqlite3'))
+    yield backend
+    backend.close()
+
+
+def test_history_is_kept_per_sender(backend):
+    # Arrange
+    store = ConversationStore(backend)
+
+    # Act
+    store.append('+1111', 'hi', 'hello')
+    store.append('+2222', 'yo', 'hey')
+
+    # Assert
+    assert store.history('+1111') == [
+        {'role': 'user', 'content': 'hi'},
+        {'role': 'assistant', 'content': 'hello'},
+    ]
+    assert store.history('+2222')[0]['content'] == 'yo'
+
+
+def test_history_survives_restart_through_backend(backend):
+    # Arrange
+    ConversationStore(backend).append('+1111', 'hi', 'hello')
+
+    # Act
+    history = ConversationStore(backend).history('+1111')
+
+    # Assert
+    assert [m['content'] for m in history] == ['hi', 'hello']
+
+
+def test_cached_lookups_do_not_hit_backend():
+    # Arrange
+    backend = MagicMock()
+    backend.load.return_value = []
+    store = ConversationStore(backend)
+
+    # Act
+    store.history('+1111')
+    store.history('+1111')
+
+    # Assert
+    backend.load.assert_called_once_with('+1111', store.max_messages)
+
+
+def test_lru_evicts_least_recent_sender():
+    # Arrange
+    backend = MagicMock()
+    backend.load.return_value = []
+    store = ConversationStore(backend, max_conversations=2)
+    store.history('+1111')
+    store.history('+2222')
+    store.history('+1111')
+
+    # Act
+    store.history('+3333')
+    store.history('+2222')
+
+    # Assert
+    assert backend.load.call_count == 4
+
+
+def test_backend_keeps_only_recent_turns(backend):
+    # Arrange
+    store = ConversationStore(backend, max_turns=2)
+
+    # Act
+    for n in range(5):
+        store.append('+1111', f'q{n}', f'a{n}')
+
+    # Assert
+    assert [m['content'] for m in backend.load('+1111', 100)] == ['q3', 'a3', 'q4', 'a4']
+
+
+def test_build_messages_trims_history_to_token_budget(backend):
+    # Arrange
+    store = ConversationStore(backend, token_budget=40)
+    store.append('+1111', 'old question ' * 10, 'old answer ' * 10)
+    store.append('+1111', 'recent question', 'recent answer')
+    current = {'role': 'user', 'content': 'now'}
+
+    # Act
+    messages = store.build_messages('+1111', SYSTEM, current)
+
+    # Assert
+    assert [m['content'] for m in messages] == ['Be terse.', 'recent question', 'recent answer', 'now']
+
+
+def test_trim_to_budget_never_starts_with_assistant():
+    history = [
+        {'role': 'user', 'content': 'a long question ' * 5},
+        {'role': 'assistant', 'content': 'short'},
+    ]
+    assert trim_to_budget(history, 10) == []
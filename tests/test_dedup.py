@@ -0,0 +1,89 @@
+# tests/test_dedup.py
+
+from dedup import MessageDeduplicator, SQLiteDedupBackend
+
+
+def test_repeat_message_sid_is_a_duplicate():
+    # Arrange
+    deduplicator = MessageDeduplicator()
+
+    # Act
+    first = deduplicator.claim('SM1')
+    second = deduplicator.claim('SM1')
+
+    # Assert
+    assert first is True
+    assert second is False
+    assert deduplicator.duplicates == 1
+
+
+def test_missing_message_sid_is_never_deduplicated():
+    deduplicator = MessageDeduplicator()
+
+    assert deduplicator.claim(None) is True
+    assert deduplicator.claim(None) is True
+
+
+def test_claims_expire_after_ttl(clock):
+    # Arrange
+    deduplicator = MessageDeduplicator(ttl=10, clock=clock)
+    deduplicator.claim('SM1')
+
+    # Act
+    clock.now = 11
+
+    # Assert
+    assert deduplicator.claim('SM1') is True
+
+
+def test_released_claim_can_be_retried():
+    # Arrange
+    deduplicator = MessageDeduplicator()
+    deduplicator.claim('SM1')
+
+    # Act
+    deduplicator.release('SM1')
+
+    # Assert
+    assert deduplicator.claim('SM1') is True
+
+
+def test_memory_is_bounded():
+    # Arrange
+    deduplicator = MessageDeduplicator(max_entries=2)
+
+    # Act
+    for sid in ('SM1', 'SM2', 'SM3'):
+        deduplicator.claim(sid)
+
+    # Assert
+    assert len(deduplicator) == 2
+    assert deduplicator.claim('SM1') is True
+
+
+def test_shared_backend_catches_retries_on_other_instances(tmp_path):
+    # Arrange
+    path = str(tmp_path / 'dedup.sqlite3')
+    instance_a = MessageDeduplicator(backend=SQLiteDedupBackend(path))
+    instance_b = MessageDeduplicator(backend=SQLiteDedupBackend(path))
+
+    # Act
+    first = instance_a.claim('SM1')
+    retry = instance_b.claim('SM1')
+    instance_a.release('SM1')
+    after_release = instance_b.claim('SM2'), MessageDeduplicator(backend=SQLiteDedupBackend(path)).claim('SM1')
+
+    # Assert
+    assert first is True
+    assert retry is False
+    assert after_release == (True, True)
+
+
+def test_expired_shared_claims_can_be_reclaimed(tmp_path):
+    # Arrange
+    backend = SQLiteDedupBackend(str(tmp_path / 'dedup.sqlite3'))
+    backend.claim('SM1', ttl=-1)
+
+    # Act / Assert
+    assert backend.claim('SM1', ttl=60) is True
+    assert backend.claim('SM1', ttl=60) is False
@@ -0,0 +1,88 @@
+# tests/test_env_cache.py
+
+import threading
+from unittest.mock import MagicMock
+from env_cache import EnvironmentCache
+
+
+def test_get_loads_once_and_reuses_bundle(clock):
+    # Arrange
+    loader = MagicMock(return_value={'TWILIO_AUTH_TOKEN': 'token'})
+    cache = EnvironmentCache(loader, ttl=60, clock=clock)
+
+    # Act
+    first = cache.get()
+    second = cache.get()
+
+    # Assert
+    assert first is second
+    loader.assert_called_once_with(None)
+
+
+def test_expired_bundle_is_served_while_refreshing_in_background(clock):
+    # Arrange
+    release = threading.Event()
+    bundles = iter([{'version': 1}, {'version': 2}])
+
+    def loader(previous):
+        if previous is not None:
+            release.wait(5)
+        return next(bundles)
+
+    cache = EnvironmentCache(loader, ttl=60, clock=clock)
+    cache.get()
+    clock.now = 61
+
+    # Act
+    stale = cache.get()
+    release.set()
+    cache.wait_for_refresh(5)
+
+    # Assert
+    assert stale == {'version': 1}
+    assert cache.get() == {'version': 2}
+
+
+def test_refresh_passes_previous_bundle_to_loader(clock):
+    # Arrange
+    loader = MagicMock(side_effect=lambda previous: {'previous': previous})
+    cache = EnvironmentCache(loader, ttl=60, clock=clock)
+    first = cache.get()
+
+    # Act
+    second = cache.refresh()
+
+    # Assert
+    assert second['previous'] is first
+
+
+def test_failed_background_refresh_keeps_stale_bundle(clock):
+    # Arrange
+    loader = MagicMock(side_effect=[{'version': 1}, RuntimeError('Secret Manager down')])
+    cache = EnvironmentCache(loader, ttl=60, clock=clock)
+    cache.get()
+    clock.now = 61
+
+    # Act
+    cache.get()
+    cache.wait_for_refresh(5)
+
+    # Assert
+    assert cache.get() == {'version': 1}
+
+
+def test_set_and_clear_allow_injecting_bundles(clock):
+    # Arrange
+    loader = MagicMock(return_value={'source': 'loader'})
+    cache = EnvironmentCache(loader, ttl=60, clock=clock)
+
+    # Act
+    cache.set({'source': 'test'})
+    injected = cache.get()
+    cache.clear()
+    loaded = cache.get()
+
+    # Assert
+    assert injected == {'source': 'test'}
+    assert loaded == {'source': 'loader'}
+    loader.assert_called_once()
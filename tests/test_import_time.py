@@ -0,0 +1,17 @@
+# tests/test_import_time.py
+
+import os
+from benchmarks.import_time import DEFERRED_MODULES, check, measure
+
+# Generous default so slow CI runners don't flake; the deferred-module check is exact
+BUDGET_MS = float(os.getenv('IMPORT_TIME_BUDGET_MS', 1000))
+
+
+def test_main_import_stays_within_budget():
+    best_ms, problems = check('main', BUDGET_MS, runs=2)
+    assert problems == []
+
+
+def test_heavy_sdks_are_not_imported_at_load_time():
+    _, imported = measure('main')
+    assert [module for module in DEFERRED_MODULES if module in imported] == []
@@ -0,0 +1,157 @@
+# tests/test_llm_client.py
+
+import asyncio
+import threading
+
+import pytest
+
+from llm_client import CircuitBreaker, CircuitOpenError, ResilientLLMClient
+
+
+def test_breaker_opens_after_consecutive_failures_and_probes_after_cooldown(clock):
+    # Arrange
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30, clock=clock)
+
+    # Act
+    breaker.record_failure()
+    still_closed = breaker.allow()
+    breaker.record_failure()
+
+    # Assert
+    assert still_closed
+    assert breaker.state == 'open' and not breaker.allow()
+    clock.now = 30
+    assert breaker.allow()          # the one probe
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == 'closed'
+
+
+def test_failed_probe_reopens_the_breaker(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10, clock=clock)
+    breaker.record_failure()
+    clock.now = 10
+    assert breaker.allow()
+
+    breaker.record_failure()
+
+    assert breaker.state == 'open'
+
+
+def test_complete_returns_the_primary_result():
+    # Arrange
+    client = ResilientLLMClient(deadline=1.0, hedge_delay=0.5)
+    calls = []
+
+    def create(**kwargs):
+        calls.append(kwargs)
+        return 'reply'
+
+    # Act
+    result = client.complete(create, model='gpt-4o')
+
+    # Assert
+    assert result == 'reply'
+    assert calls == [{'model': 'gpt-4o', 'timeout': 1.0}]
+    assert client.stats['hedges_fired'] == 0
+
+
+def test_slow_primary_is_hedged_and_the_hedge_wins():
+    # Arrange
+    client = ResilientLLMClient(deadline=2.0, hedge_delay=0.05, min_hedge_delay=0.0)
+    release = threading.Event()
+    calls = []
+
+    def create(**kwargs):
+        calls.append(kwargs)
+        if len(calls) == 1:
+            release.wait(2.0)
+            return 'slow'
+        return 'fast'
+
+    # Act
+    result = client.complete(create)
+    release.set()
+
+    # Assert
+    assert result == 'fast'
+    assert client.stats['hedges_fired'] == 1
+    assert client.stats['hedges_won'] == 1
+
+
+def test_fast_failure_is_retried_once():
+    client = ResilientLLMClient(deadline=1.0, hedge=False)
+    results = iter([RuntimeError('boom'), 'ok'])
+
+    def create(**kwargs):
+        result = next(results)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    assert client.complete(create) == 'ok'
+    assert client.stats['retries_won'] == 1
+
+
+def test_missed_deadline_raises_timeout_and_counts_against_the_breaker():
+    # Arrange
+    client = ResilientLLMClient(deadline=0.05, hedge=False, breaker=CircuitBreaker(failure_threshold=1))
+    release = threading.Event()
+
+    # Act
+    with pytest.raises(TimeoutError):
+        client.complete(lambda **kwargs: release.wait(1.0))
+    release.set()
+
+    # Assert
+    assert client.stats['timeouts'] == 1
+    with pytest.raises(CircuitOpenError):
+        client.complete(lambda **kwargs: 'never called')
+    assert client.stats['short_circuits'] == 1
+
+
+def test_complete_async_hedges_and_cancels_the_loser():
+    # Arrange
+    client = ResilientLLMClient(deadline=2.0, hedge_delay=0.05, min_hedge_delay=0.0)
+    calls = []
+
+    async def create(**kwargs):
+        calls.append(kwargs)
+        if len(calls) == 1:
+            await asyncio.sleep(2.0)
+            return 'slow'
+        return 'fast'
+
+    # Act
+    result = asyncio.run(client.complete_async(create))
+
+    # Assert
+    assert result == 'fast'
+    assert client.stats['hedges_won'] == 1
+
+
+def test_hedge_delay_follows_observed_p95():
+    client = ResilientLLMClient(hedge_delay=3.0, min_hedge_delay=0.5)
+    assert client.hedge_delay() == 3.0
+
+    for seconds in [1.0] * 19 + [2.0]:
+        client.latencies.record(seconds)
+
+    assert client.hedge_delay() == 1.0
+
+
+def test_from_env_is_off_unless_enabled(monkeypatch):
+    monkeypatch.delenv('LLM_RESILIENCE', raising=False)
+    assert ResilientLLMClient.from_env() is None
+
+    monkeypatch.setenv('LLM_RESILIENCE', 'true')
+    monkeypatch.setenv('LLM_DEADLINE', '8')
+    monkeypatch.setenv('LLM_FALLBACK_REPLY', '')
+    client = ResilientLLMClient.from_env()
+
+    assert client.deadline == 8.0
+    assert client.fallback_reply is None
+    assert client.hedge is True     # on unless LLM_HEDGE says otherwise
+
+    monkeypatch.setenv('LLM_HEDGE', 'off')
+    assert ResilientLLMClient.from_env().hedge is False
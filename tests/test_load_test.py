@@ -0,0 +1,89 @@
+# tests/test_load_test.py
+
+import pytest
+from benchmarks.compare import compare
+from benchmarks.fake_services import FakeSecretManager, FakeTwilio, FAKE_SECRETS
+from benchmarks.load_test import percentile, summarize
+from secret_loader import SecretLoader
+from utils import _pooled_twilio_http_client
+
+
+@pytest.fixture
+def fake_twilio():
+    with FakeTwilio() as service:
+        yield service
+
+
+def test_secret_loader_reads_from_secret_manager_emulator(monkeypatch):
+    # Arrange
+    with FakeSecretManager(FAKE_SECRETS) as service:
+        monkeypatch.setenv('SECRET_MANAGER_EMULATOR_HOST', service.url)
+        loader = SecretLoader('loadtest-dev')
+
+        # Act
+        secrets = loader.load(['TWILIO_AUTH_TOKEN', 'OPENAI_API_KEY'])
+
+    # Assert
+    assert secrets == {'TWILIO_AUTH_TOKEN': 'loadtest-auth-token', 'OPENAI_API_KEY': 'sk-loadtest'}
+    assert loader.versions == {'TWILIO_AUTH_TOKEN': '1', 'OPENAI_API_KEY': '1'}
+
+
+def test_twilio_client_is_redirected_to_api_base_url(monkeypatch, fake_twilio):
+    # Arrange
+    from twilio.rest import Client
+    monkeypatch.setenv('TWILIO_API_BASE_URL', fake_twilio.url)
+    client = Client(FAKE_SECRETS['TWILIO_ACCOUNT_SID'], 'token', http_client=_pooled_twilio_http_client())
+
+    # Act
+    message = client.messages.create(to='+15551234567', body='Hello', messaging_service_sid='MG1')
+
+    # Assert
+    assert message.sid.startswith('SM')
+    assert fake_twilio.sent[0]['to'] == '+15551234567'
+    assert fake_twilio.sent[0]['body'] == 'Hello'
+
+
+def test_injected_twilio_failures_are_429s(monkeypatch):
+    # Arrange
+    from twilio.base.exceptions import TwilioRestException
+    from twilio.rest import Client
+    with FakeTwilio(error_rate=1.0) as service:
+        monkeypatch.setenv('TWILIO_API_BASE_URL', service.url)
+        client = Client(FAKE_SECRETS['TWILIO_ACCOUNT_SID'], 'token', http_client=_pooled_twilio_http_client())
+
+        # Act / Assert
+        with pytest.raises(TwilioRestException) as excinfo:
+            client.messages.create(to='+15551234567', body='Hello', messaging_service_sid='MG1')
+    assert excinfo.value.status == 429
+    assert service.stats() == {'requests': 1, 'errors': 1}
+
+
+def test_percentiles_and_summary():
+    # Arrange
+    latencies = [n / 1000 for n in range(1, 101)]
+
+    # Act
+    summary = summarize(latencies, {200: 98, 503: 2}, elapsed=2.0)
+
+    # Assert
+    assert percentile(latencies, 0.5) == 0.05
+    assert percentile([], 0.99) == 0.0
+    assert summary['latency_ms']['p95'] == 95.0
+    assert summary['latency_ms']['p99'] == 99.0
+    assert summary['throughput_rps'] == 49.0
+    assert summary['errors'] == 2
+
+
+def test_compare_flags_regressions_beyond_threshold():
+    # Arrange
+    baseline = {'latency_ms': {'p50': 100, 'p95': 200, 'p99': 300}, 'throughput_rps': 50, 'errors': 0,
+                'memory': {'peak_mb': 150}}
+    candidate = {'latency_ms': {'p50': 105, 'p95': 260, 'p99': 300}, 'throughput_rps': 40, 'errors': 0,
+                 'memory': {'peak_mb': 150}}
+
+    # Act
+    rows, regressions = compare(baseline, candidate, threshold=0.1)
+
+    # Assert
+    assert regressions == ['p95 latency (ms)', 'throughput (req/s)']
+    assert len(rows) == 6
@@ -0,0 +1,123 @@
+# tests/test_log_index.py
+
+import json
+import os
+from unittest.mock import MagicMock
+
+import pytest
+
+from log_index import DirectorySource, GCSSource, LogIndex, main
+from log_sink import FileSystemBackend, write_batch
+
+
+def record(timestamp, phone, message, reply='ok'):
+    return {
+        'timestamp': timestamp,
+        'from_number': '+15550000000',
+        'to_number': phone,
+        'incoming_message': message,
+        'terse_response': reply,
+    }
+
+
+def write_legacy(root, data):
+    path = os.path.join(root, 'logs', f"{data['timestamp']}.json")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(data, f)
+    return path
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = LogIndex(str(tmp_path / 'index.db'))
+    yield index
+    index.close()
+
+
+def test_ingests_both_layouts_and_queries_by_phone_time_and_text(tmp_path, index):
+    # Arrange
+    root = str(tmp_path / 'bucket')
+    write_legacy(root, record('2024-04-30T09:00:00+00:00', '+15551111111', 'Where is my refund?'))
+    write_batch(FileSystemBackend(root), [
+        record('2024-05-01T10:00:00+00:00', '+15551111111', 'What time do you open?'),
+        record('2024-05-02T11:00:00+00:00', '+15552222222', 'Refund please', reply='Done'),
+    ])
+
+    # Act
+    counts = index.ingest(DirectorySource(root))
+
+    # Assert
+    assert counts['ingested'] == 3 and counts['records'] == 3
+    assert [r['incoming_message'] for r in index.query(phone='+15551111111')] == [
+        'What time do you open?', 'Where is my refund?',
+    ]
+    assert [r['to_number'] for r in index.query(text='refund')] == ['+15552222222', '+15551111111']
+    assert [r['incoming_message'] for r in index.query(since='2024-05-01', until='2024-05-02')] == [
+        'What time do you open?',
+    ]
+
+
+def test_second_ingest_only_reads_new_or_rewritten_objects(tmp_path, index):
+    # Arrange
+    root = str(tmp_path / 'bucket')
+    path = write_legacy(root, record('2024-04-30T09:00:00+00:00', '+15551111111', 'first'))
+    index.ingest(DirectorySource(root))
+    write_batch(FileSystemBackend(root), [record('2024-05-01T10:00:00+00:00', '+15551111111', 'second')])
+    with open(path, 'w') as f:
+        json.dump(record('2024-04-30T09:00:00+00:00', '+15551111111', 'first, edited'), f)
+    os.utime(path, ns=(1, 1))
+
+    # Act
+    counts = index.ingest(DirectorySource(root))
+    again = index.ingest(DirectorySource(root))
+
+    # Assert
+    assert counts['ingested'] == 2
+    assert again['ingested'] == 0
+    assert sorted(r['incoming_message'] for r in index.query()) == ['first, edited', 'second']
+    assert index.stats()['records'] == 2
+    assert index.query(text='first')[0]['incoming_message'] == 'first, edited'
+
+
+def test_unreadable_objects_are_skipped_and_retried(tmp_path, index, capsys):
+    root = str(tmp_path / 'bucket')
+    os.makedirs(os.path.join(root, 'logs'))
+    with open(os.path.join(root, 'logs', '2024-05-01T00:00:00.json'), 'w') as f:
+        f.write('{not json')
+
+    assert index.ingest(DirectorySource(root))['failed'] == 1
+    assert index.ingest(DirectorySource(root))['failed'] == 1
+    assert 'Error indexing log object' in capsys.readouterr().out
+
+
+def test_gcs_source_lists_and_downloads_by_generation():
+    # Arrange
+    storage_client = MagicMock()
+    blob = MagicMock()
+    blob.name, blob.generation = 'logs/2024-05-01T00:00:00.json', 7
+    storage_client.list_blobs.return_value = [blob]
+    source = GCSSource(storage_client, 'bucket')
+
+    # Act
+    listed = list(source.list('logs', start_offset='logs/a', end_offset='logs/dt='))
+    source.read('logs/2024-05-01T00:00:00.json', 7)
+
+    # Assert
+    assert listed == [('logs/2024-05-01T00:00:00.json', 7)]
+    storage_client.list_blobs.assert_called_once_with(
+        'bucket', prefix='logs/', start_offset='logs/a', end_offset='logs/dt='
+    )
+    storage_client.bucket.return_value.blob.assert_called_once_with('logs/2024-05-01T00:00:00.json', generation=7)
+
+
+def test_cli_ingests_a_directory_and_prints_matches(tmp_path, capsys):
+    root = str(tmp_path / 'bucket')
+    write_legacy(root, record('2024-04-30T09:00:00+00:00', '+15551111111', 'hello there'))
+    db = str(tmp_path / 'index.db')
+
+    main(['--index', db, 'ingest', '--dir', root])
+    main(['--index', db, 'query', '--text', 'hello'])
+
+    lines = capsys.readouterr().out.strip().splitlines()
+    assert json.loads(lines[-1])['incoming_message'] == 'hello there'
@@ -0,0 +1,112 @@
+# tests/test_log_sink.py
+
+import time
+from unittest.mock import MagicMock
+from log_sink import FileSystemBackend, LogSink, decode_batch, object_name, write_batch
+
+
+def read_objects(root):
+    objects = {}
+    for path in sorted(root.rglob('*.ndjson.gz')):
+        objects[str(path.relative_to(root))] = decode_batch(path.read_bytes())
+    return objects
+
+
+def record(n, day='2024-05-01'):
+    return {'timestamp': f'{day}T12:00:00+00:00', 'incoming_message': f'message {n}'}
+
+
+def test_records_are_buffered_until_size_threshold(tmp_path):
+    # Arrange
+    sink = LogSink(FileSystemBackend(str(tmp_path)), max_records=3, flush_interval=0)
+
+    # Act
+    sink.write(record(1))
+    sink.write(record(2))
+    before = read_objects(tmp_path)
+    sink.write(record(3))
+
+    # Assert
+    assert before == {}
+    objects = read_objects(tmp_path)
+    assert len(objects) == 1
+    assert [r['incoming_message'] for r in list(objects.values())[0]] == ['message 1', 'message 2', 'message 3']
+
+
+def test_flush_partitions_by_record_date(tmp_path):
+    # Arrange
+    sink = LogSink(FileSystemBackend(str(tmp_path)), flush_interval=0)
+    sink.write(record(1, '2024-05-01'))
+    sink.write(record(2, '2024-05-02'))
+
+    # Act
+    sink.close()
+
+    # Assert
+    names = list(read_objects(tmp_path))
+    assert len(names) == 2
+    assert names[0].startswith('logs/dt=2024-05-01/')
+    assert names[1].startswith('logs/dt=2024-05-02/')
+
+
+def test_time_threshold_flushes_in_background(tmp_path):
+    # Arrange
+    sink = LogSink(FileSystemBackend(str(tmp_path)), flush_interval=0.05)
+
+    # Act
+    sink.write(record(1))
+    deadline = time.monotonic() + 5
+    while sink.buffered and time.monotonic() < deadline:
+        time.sleep(0.01)
+    sink.close()
+
+    # Assert
+    assert sink.records_written == 1
+    assert len(read_objects(tmp_path)) == 1
+
+
+def test_failed_flush_keeps_records_for_retry():
+    # Arrange
+    backend = MagicMock()
+    backend.write.side_effect = [Exception('Storage error'), None]
+    sink = LogSink(backend, flush_interval=0)
+    sink.write(record(1))
+
+    # Act
+    sink.flush()
+    kept = sink.buffered
+    sink.flush()
+
+    # Assert
+    assert kept == 1
+    assert sink.buffered == 0
+    assert sink.records_written == 1
+
+
+def test_object_names_are_unique():
+    names = {object_name('2024-05-01') for _ in range(100)}
+    assert len(names) == 100
+
+
+def test_write_batch_writes_immediately(tmp_path):
+    # Act
+    names = write_batch(FileSystemBackend(str(tmp_path)), [record(1)])
+
+    # Assert
+    assert read_objects(tmp_path) == {names[0]: [record(1)]}
+
+
+def test_records_that_cannot_be_flushed_at_close_are_spilled():
+    # Arrange
+    backend = MagicMock()
+    backend.write.side_effect = ConnectionError('GCS unavailable')
+    spilled = []
+    sink = LogSink(backend, flush_interval=0, spill=spilled.extend)
+    sink.write(record(1))
+
+    # Act
+    sink.close()
+
+    # Assert
+    assert [r['incoming_message'] for r in spilled] == ['message 1']
+    assert sink.records_dropped == 0
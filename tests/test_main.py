@@ -1,9 +1,14 @@
 # tests/test_main.py
 
+import io
+import json
+
 import pytest
 from unittest.mock import patch, MagicMock, ANY
 from flask import Flask, request
-from main import auto_responder
+import main
+from main import auto_responder, respond_in_background
+from conversation_store import ConversationStore, SQLiteHistoryBackend
 import os
 
 # Sample data for tests
@@ -13,6 +18,8 @@ INVALID_TWILIO_SIGNATURE = 'invalid_signature'
 @pytest.fixture(autouse=True)
 def set_env():
     os.environ['ENVIRONMENT'] = 'test'
+    # Validators are cached per token; drop any built from a previous test's mock
+    main.validators.clear()
 
 @pytest.fixture
 def app():
@@ -117,6 +124,8 @@ def test_auto_responder_invalid_signature(
         'body': 'Invalid request.'
     }
     mock_request_validator.return_value.validate.assert_called_once()
+    # Forged requests are rejected before any secrets are fetched or clients built
+    mock_initialize_environment.assert_not_called()
 
 
 @patch('main.initialize_environment')
@@ -150,3 +159,570 @@ def test_auto_responder_exception_handling(
         'statusCode': 500,
         'body': 'Internal Server Error'
     }
+
+
+@patch('main.initialize_environment')
+@patch('main.get_pipeline')
+@patch('main.get_LLM_response')
+@patch('main.RequestValidator')
+def test_auto_responder_async_pipeline_acknowledges_immediately(
+    mock_request_validator,
+    mock_get_llm_response,
+    mock_get_pipeline,
+    mock_initialize_environment,
+    app,
+    monkeypatch
+):
+    monkeypatch.setenv('ASYNC_PIPELINE', 'true')
+    mock_initialize_environment.return_value = fake_env_vars()
+    mock_request_validator.return_value.validate.return_value = True
+    mock_get_pipeline.return_value.submit.return_value = True
+
+    data = {
+        'From': '+1234567890',
+        'Body': 'Hello'
+    }
+    headers = {
+        'X-Twilio-Signature': VALID_TWILIO_SIGNATURE,
+        'X-Forwarded-Proto': 'http',
+        'X-Forwarded-Host': 'testserver'
+    }
+
+    with app.test_request_context('/', method='POST', data=data, headers=headers):
+        response = auto_responder(request)
+
+    assert response.status_code == 200
+    assert response.mimetype == 'text/xml'
+    assert b'<Response>' in response.get_data()
+    mock_get_pipeline.return_value.submit.assert_called_once_with(
+        respond_in_background, '+1234567890', 'Hello', mock_initialize_environment.return_value
+    )
+    mock_get_llm_response.assert_not_called()
+
+
+@patch('main.initialize_environment')
+@patch('main.get_pipeline')
+@patch('main.RequestValidator')
+def test_auto_responder_async_pipeline_sheds_load_when_full(
+    mock_request_validator,
+    mock_get_pipeline,
+    mock_initialize_environment,
+    app,
+    monkeypatch
+):
+    monkeypatch.setenv('ASYNC_PIPELINE', 'true')
+    mock_initialize_environment.return_value = fake_env_vars()
+    mock_request_validator.return_value.validate.return_value = True
+    mock_get_pipeline.return_value.submit.return_value = False
+
+    headers = {
+        'X-Twilio-Signature': VALID_TWILIO_SIGNATURE,
+        'X-Forwarded-Proto': 'http',
+        'X-Forwarded-Host': 'testserver'
+    }
+
+    with app.test_request_context('/', method='POST', data={'From': '+1234567890', 'Body': 'Hello'}, headers=headers):
+        response = auto_responder(request)
+
+    assert response[1] == 503
+
+
+@patch('main.initialize_environment')
+@patch('main.get_LLM_response')
+@patch('main.send_message_via_twilio')
+@patch('main.write_log_to_storage')
+@patch('main.RequestValidator')
+def test_auto_responder_includes_conversation_history(
+    mock_request_validator,
+    mock_write_log,
+    mock_send_message,
+    mock_get_llm_response,
+    mock_initialize_environment,
+    app,
+    tmp_path
+):
+    env_vars = fake_env_vars()
+    env_vars['conversation_store'] = ConversationStore(SQLiteHistoryBackend(str(tmp_path / 'history.sqlite3')))
+    env_vars['conversation_store'].append('+1234567890', 'Earlier', 'Earlier reply')
+    mock_initialize_environment.return_value = env_vars
+    mock_request_validator.return_value.validate.return_value = True
+    mock_get_llm_response.return_value = 'Mocked LLM response'
+
+    headers = {
+        'X-Twilio-Signature': VALID_TWILIO_SIGNATURE,
+        'X-Forwarded-Proto': 'http',
+        'X-Forwarded-Host': 'testserver'
+    }
+
+    with app.test_request_context('/', method='POST', data={'From': '+1234567890', 'Body': 'Hello'}, headers=headers):
+        response = auto_responder(request)
+
+    assert response[1] == 200
+    messages = mock_get_llm_response.call_args[0][0]
+    assert [m['content'] for m in messages[1:]] == ['Earlier', 'Earlier reply', 'Hello']
+    assert env_vars['conversation_store'].history('+1234567890')[-1] == {
+        'role': 'assistant', 'content': 'Mocked LLM response'
+    }
+
+
+@patch('main.initialize_environment')
+@patch('main.send_streamed_LLM_response')
+@patch('main.send_message_via_twilio')
+@patch('main.write_log_to_storage')
+@patch('main.RequestValidator')
+def test_auto_responder_streaming_mode(
+    mock_request_validator,
+    mock_write_log,
+    mock_send_message,
+    mock_send_streamed,
+    mock_initialize_environment,
+    app,
+    monkeypatch
+):
+    monkeypatch.setenv('STREAM_RESPONSES', 'true')
+    mock_initialize_environment.return_value = fake_env_vars()
+    mock_request_validator.return_value.validate.return_value = True
+    mock_send_streamed.return_value = 'Streamed response'
+
+    headers = {
+        'X-Twilio-Signature': VALID_TWILIO_SIGNATURE,
+        'X-Forwarded-Proto': 'http',
+        'X-Forwarded-Host': 'testserver'
+    }
+
+    with app.test_request_context('/', method='POST', data={'From': '+1234567890', 'Body': 'Hello'}, headers=headers):
+        response = auto_responder(request)
+
+    assert response[1] == 200
+    mock_send_streamed.assert_called_once_with('+1234567890', ANY, mock_initialize_environment.return_value)
+    mock_send_message.assert_not_called()
+    assert mock_write_log.call_args[0][0]['terse_response'] == 'Streamed response'
+
+
+@patch('main.initialize_environment')
+@patch('main.get_LLM_response')
+@patch('main.send_message_via_twilio')
+@patch('main.write_log_to_storage')
+@patch('main.RequestValidator')
+def test_auto_responder_does_not_print_secrets_or_message_content(
+    mock_request_validator,
+    mock_write_log,
+    mock_send_message,
+    mock_get_llm_response,
+    mock_initialize_environment,
+    app,
+    capsys
+):
+    mock_initialize_environment.return_value = fake_env_vars()
+    mock_request_validator.return_value.validate.return_value = True
+    mock_get_llm_response.return_value = 'Mocked LLM response'
+
+    headers = {
+        'X-Twilio-Signature': VALID_TWILIO_SIGNATURE,
+        'X-Forwarded-Proto': 'http',
+        'X-Forwarded-Host': 'testserver'
+    }
+
+    with app.test_request_context('/', method='POST', data={'From': '+1234567890', 'Body': 'Secret plans'}, headers=headers):
+        response = auto_responder(request)
+
+    assert response[1] == 200
+    output = capsys.readouterr().out
+    for leaked in ('test_auth_token', 'test_openai_key', VALID_TWILIO_SIGNATURE, 'Secret plans'):
+        assert leaked not in output
+
+
+def test_auto_responder_serves_metrics_when_enabled(app, monkeypatch):
+    monkeypatch.setenv('METRICS_ENDPOINT', 'true')
+
+    with app.test_request_context('/metrics', method='GET'):
+        response = auto_responder(request)
+
+    assert response.status_code == 200
+    assert response.content_type.startswith('text/plain')
+    assert b'# TYPE sms_stage_duration_seconds histogram' in response.get_data()
+
+
+@patch('main.initialize_environment')
+@patch('main.get_LLM_response')
+@patch('main.send_message_via_twilio')
+@patch('main.write_log_to_storage')
+@patch('main.RequestValidator')
+def test_auto_responder_acknowledges_retried_message_sid_without_reprocessing(
+    mock_request_validator,
+    mock_write_log,
+    mock_send_message,
+    mock_get_llm_response,
+    mock_initialize_environment,
+    app
+):
+    mock_initialize_environment.return_value = fake_env_vars()
+    mock_request_validator.return_value.validate.return_value = True
+    mock_get_llm_response.return_value = 'Mocked LLM response'
+
+    data = {'From': '+1234567890', 'Body': 'Hello', 'MessageSid': 'SMtest-retried-delivery'}
+    headers = {
+        'X-Twilio-Signature': VALID_TWILIO_SIGNATURE,
+        'X-Forwarded-Proto': 'http',
+        'X-Forwarded-Host': 'testserver'
+    }
+
+    with app.test_request_context('/', method='POST', data=data, headers=headers):
+        first = auto_responder(request)
+    with app.test_request_context('/', method='POST', data=data, headers=headers):
+        retry = auto_responder(request)
+
+    assert first[1] == 200
+    assert retry.status_code == 200
+    assert retry.mimetype == 'text/xml'
+    mock_get_llm_response.assert_called_once()
+    mock_send_message.assert_called_once()
+
+
+@patch('main.initialize_environment')
+@patch('main.get_LLM_response')
+@patch('main.RequestValidator')
+def test_auto_responder_reprocesses_retry_after_failure(
+    mock_request_validator,
+    mock_get_llm_response,
+    mock_initialize_environment,
+    app
+):
+    mock_initialize_environment.return_value = fake_env_vars()
+    mock_request_validator.return_value.validate.return_value = True
+    mock_get_llm_response.return_value = None
+
+    data = {'From': '+1234567890', 'Body': 'Hello', 'MessageSid': 'SMtest-failed-delivery'}
+    headers = {
+        'X-Twilio-Signature': VALID_TWILIO_SIGNATURE,
+        'X-Forwarded-Proto': 'http',
+        'X-Forwarded-Host': 'testserver'
+    }
+
+    with app.test_request_context('/', method='POST', data=data, headers=headers):
+        first = auto_responder(request)
+    with app.test_request_context('/', method='POST', data=data, headers=headers):
+        retry = auto_responder(request)
+
+    assert first[1] == 500
+    assert retry[1] == 500
+    assert mock_get_llm_response.call_count == 2
+
+
+@patch('main.get_auth_tokens')
+@patch('main.initialize_environment')
+def test_auto_responder_rejects_unsigned_request_without_fetching_secrets(
+    mock_initialize_environment,
+    mock_get_auth_tokens,
+    app
+):
+    with app.test_request_context('/', method='POST', data={'From': '+1234567890', 'Body': 'Hello'}):
+        response = auto_responder(request)
+
+    assert response[1] == 403
+    mock_get_auth_tokens.assert_not_called()
+    mock_initialize_environment.assert_not_called()
+
+
+@patch('main.initialize_environment')
+@patch('main.get_LLM_response')
+@patch('main.send_message_via_twilio')
+@patch('main.write_log_to_storage')
+def test_auto_responder_accepts_secondary_auth_token(
+    mock_write_log,
+    mock_send_message,
+    mock_get_llm_response,
+    mock_initialize_environment,
+    app,
+    monkeypatch
+):
+    from twilio.request_validator import RequestValidator as TwilioRequestValidator
+    monkeypatch.delenv('FUNCTION_NAME', raising=False)
+    monkeypatch.setenv('TWILIO_AUTH_TOKEN', 'old_token')
+    monkeypatch.setenv('TWILIO_AUTH_TOKEN_SECONDARY', 'new_token')
+    mock_initialize_environment.return_value = fake_env_vars()
+    mock_get_llm_response.return_value = 'Mocked LLM response'
+
+    data = {'From': '+1234567890', 'Body': 'Hello'}
+    signature = TwilioRequestValidator('new_token').compute_signature('https://testserver/', data)
+    headers = {
+        'X-Twilio-Signature': signature,
+        'X-Forwarded-Proto': 'https',
+        'X-Forwarded-Host': 'testserver'
+    }
+
+    with app.test_request_context('/', method='POST', data=data, headers=headers):
+        response = auto_responder(request)
+
+    assert response[1] == 200
+
+
+@patch('main.get_throttle')
+@patch('main.initialize_environment')
+@patch('main.get_LLM_response')
+@patch('main.RequestValidator')
+def test_auto_responder_throttles_sender_over_rate_limit(
+    mock_request_validator,
+    mock_get_llm_response,
+    mock_initialize_environment,
+    mock_get_throttle,
+    app
+):
+    from rate_limit import SenderRateLimiter, Throttle
+    mock_get_throttle.return_value = Throttle(sender_limiter=SenderRateLimiter(0), reply='Slow down & wait')
+    mock_request_validator.return_value.validate.return_value = True
+
+    headers = {
+        'X-Twilio-Signature': VALID_TWILIO_SIGNATURE,
+        'X-Forwarded-Proto': 'http',
+        'X-Forwarded-Host': 'testserver'
+    }
+
+    with app.test_request_context('/', method='POST', data={'From': '+1234567890', 'Body': 'Hello'}, headers=headers):
+        response = auto_responder(request)
+
+    assert response.status_code == 200
+    assert response.mimetype == 'text/xml'
+    assert b'<Message>Slow down &amp; wait</Message>' in response.get_data()
+    mock_initialize_environment.assert_not_called()
+    mock_get_llm_response.assert_not_called()
+
+
+@patch('main.get_throttle')
+@patch('main.initialize_environment')
+@patch('main.get_LLM_response')
+@patch('main.RequestValidator')
+def test_auto_responder_sheds_load_when_llm_concurrency_is_full(
+    mock_request_validator,
+    mock_get_llm_response,
+    mock_initialize_environment,
+    mock_get_throttle,
+    app
+):
+    from rate_limit import ConcurrencyLimiter, Throttle
+    throttle = Throttle(concurrency=ConcurrencyLimiter(1))
+    throttle.acquire_llm_slot()
+    mock_get_throttle.return_value = throttle
+    mock_initialize_environment.return_value = fake_env_vars()
+    mock_request_validator.return_value.validate.return_value = True
+
+    headers = {
+        'X-Twilio-Signature': VALID_TWILIO_SIGNATURE,
+        'X-Forwarded-Proto': 'http',
+        'X-Forwarded-Host': 'testserver'
+    }
+
+    with app.test_request_context('/', method='POST', data={'From': '+1234567890', 'Body': 'Hello'}, headers=headers):
+        response = auto_responder(request)
+
+    assert response[1] == 503
+    mock_get_llm_response.assert_not_called()
+
+
+@patch('main.get_LLM_response')
+@patch('main.send_message_via_twilio')
+@patch('main.write_log_to_storage')
+@patch('main.lookup_tenant')
+def test_auto_responder_routes_to_tenant_by_to_number(
+    mock_lookup_tenant,
+    mock_write_log,
+    mock_send_message,
+    mock_get_llm_response,
+    app
+):
+    from twilio.request_validator import RequestValidator as TwilioRequestValidator
+    tenant = MagicMock()
+    tenant.auth_tokens.return_value = ('tenant_token',)
+    tenant_env = dict(fake_env_vars(), TWILIO_PHONE_NUMBER='+15550001111', SYSTEM_PROMPT='You work for Acme.')
+    tenant.env_vars.return_value = tenant_env
+    mock_lookup_tenant.return_value = tenant
+    mock_get_llm_response.return_value = 'Mocked LLM response'
+
+    data = {'From': '+1234567890', 'To': '+15550001111', 'Body': 'Hello'}
+    signature = TwilioRequestValidator('tenant_token').compute_signature('https://testserver/', data)
+    headers = {'X-Twilio-Signature': signature, 'X-Forwarded-Proto': 'https', 'X-Forwarded-Host': 'testserver'}
+
+    with app.test_request_context('/', method='POST', data=data, headers=headers):
+        response = auto_responder(request)
+
+    assert response[1] == 200
+    mock_lookup_tenant.assert_called_once_with('+15550001111')
+    messages = mock_get_llm_response.call_args[0][0]
+    assert messages[0] == {'role': 'system', 'content': 'You work for Acme.'}
+    mock_send_message.assert_called_once_with('+1234567890', 'Mocked LLM response', None, tenant_env)
+
+
+@patch('main.initialize_environment')
+@patch('main.get_LLM_response')
+@patch('main.send_message_via_twilio')
+@patch('main.write_log_to_storage')
+@patch('main.RequestValidator')
+def test_auto_responder_does_not_log_a_reply_that_was_not_sent(
+    mock_request_validator,
+    mock_write_log,
+    mock_send_message,
+    mock_get_llm_response,
+    mock_initialize_environment,
+    app
+):
+    mock_initialize_environment.return_value = fake_env_vars()
+    mock_request_validator.return_value.validate.return_value = True
+    mock_get_llm_response.return_value = 'Mocked LLM response'
+    mock_send_message.return_value = None
+
+    headers = {
+        'X-Twilio-Signature': VALID_TWILIO_SIGNATURE,
+        'X-Forwarded-Proto': 'http',
+        'X-Forwarded-Host': 'testserver'
+    }
+    data = {'From': '+1234567890', 'Body': 'Hello', 'MessageSid': 'SMnotsent'}
+
+    with app.test_request_context('/', method='POST', data=data, headers=headers):
+        response = auto_responder(request)
+
+    assert response[1] == 500
+    mock_write_log.assert_not_called()
+
+
+@patch('main.initialize_environment')
+@patch('main.get_LLM_response')
+@patch('main.send_message_via_twilio')
+@patch('main.write_log_to_storage')
+@patch('main.RequestValidator')
+def test_failed_send_is_not_remembered_or_cached_until_the_retry_succeeds(
+    mock_request_validator,
+    mock_write_log,
+    mock_send_message,
+    mock_get_llm_response,
+    mock_initialize_environment,
+    app,
+    tmp_path
+):
+    # Arrange
+    from response_cache import ResponseCache
+    from utils import fresh_reply
+
+    env_vars = fake_env_vars()
+    env_vars['conversation_store'] = ConversationStore(SQLiteHistoryBackend(str(tmp_path / 'history.sqlite3')))
+    env_vars['response_cache'] = ResponseCache()
+    mock_initialize_environment.return_value = env_vars
+    mock_request_validator.return_value.validate.return_value = True
+    prompt = [{'role': 'user', 'content': 'Hello'}]
+    mock_get_llm_response.side_effect = lambda messages, env: fresh_reply('Mocked LLM response', prompt, {})
+    mock_send_message.side_effect = [None, 'sent']
+
+    headers = {
+        'X-Twilio-Signature': VALID_TWILIO_SIGNATURE,
+        'X-Forwarded-Proto': 'http',
+        'X-Forwarded-Host': 'testserver'
+    }
+    data = {'From': '+1234567890', 'Body': 'Hello', 'MessageSid': 'SMretried'}
+
+    # Act
+    with app.test_request_context('/', method='POST', data=data, headers=headers):
+        failed = auto_responder(request)
+    history_after_failure = env_vars['conversation_store'].history('+1234567890')
+    cached_after_failure = env_vars['response_cache'].get(prompt, {})
+    with app.test_request_context('/', method='POST', data=data, headers=headers):
+        retried = auto_responder(request)
+
+    # Assert
+    assert failed[1] == 500 and retried[1] == 200
+    assert history_after_failure == [] and cached_after_failure is None
+    assert env_vars['conversation_store'].history('+1234567890') == [
+        {'role': 'user', 'content': 'Hello'},
+        {'role': 'assistant', 'content': 'Mocked LLM response'},
+    ]
+    assert env_vars['response_cache'].get(prompt, {}) == 'Mocked LLM response'
+
+
+@patch('main.RequestValidator')
+def test_auto_responder_rejects_oversized_body_before_parsing(mock_request_validator, app, monkeypatch):
+    monkeypatch.setenv('MAX_REQUEST_BYTES', '1000')
+    headers = {'X-Twilio-Signature': VALID_TWILIO_SIGNATURE}
+
+    with app.test_request_context('/', method='POST', data={'Body': 'x' * 5000}, headers=headers):
+        response = auto_responder(request)
+
+    assert response[1] == 413
+    mock_request_validator.return_value.validate.assert_not_called()
+
+
+@pytest.mark.parametrize('content_type, body', [
+    ('application/x-www-form-urlencoded', b'Body=' + b'x' * 5000),
+    ('application/json', json.dumps({'Body': 'x' * 5000}).encode()),
+])
+@patch('main.initialize_environment')
+@patch('main.RequestValidator')
+def test_auto_responder_rejects_oversized_chunked_body(
+    mock_request_validator, mock_initialize_environment, content_type, body, app, monkeypatch
+):
+    # Arrange
+    monkeypatch.setenv('MAX_REQUEST_BYTES', '1000')
+    headers = {
+        'X-Twilio-Signature': VALID_TWILIO_SIGNATURE,
+        'Content-Type': content_type,
+        'Transfer-Encoding': 'chunked',     # no Content-Length to check up front
+    }
+    stream = io.BytesIO(body)
+
+    # Act
+    with app.test_request_context(
+        '/', method='POST', input_stream=stream, headers=headers,
+        environ_overrides={'wsgi.input_terminated': True},
+    ):
+        response = auto_responder(request)
+
+    # Assert
+    assert response[1] == 413
+    assert stream.tell() == 1001        # read one byte past the limit, no more
+    mock_request_validator.return_value.validate.assert_not_called()
+    mock_initialize_environment.assert_not_called()
+
+
+@patch('main.initialize_environment')
+@patch('main.get_LLM_response')
+@patch('main.send_message_via_twilio')
+@patch('main.write_log_to_storage')
+@patch('main.RequestValidator')
+def test_auto_responder_truncates_long_messages_to_token_budget(
+    mock_request_validator,
+    mock_write_log,
+    mock_send_message,
+    mock_get_llm_response,
+    mock_initialize_environment,
+    app,
+    monkeypatch
+):
+    monkeypatch.setenv('MESSAGE_TOKEN_BUDGET', '5')
+    mock_initialize_environment.return_value = fake_env_vars()
+    mock_request_validator.return_value.validate.return_value = True
+    mock_get_llm_response.return_value = 'Mocked LLM response'
+    headers = {'X-Twilio-Signature': VALID_TWILIO_SIGNATURE}
+    data = {'From': '+1234567890', 'Body': 'one two three four five six seven', 'MessageSid': 'SMlong'}
+
+    with app.test_request_context('/', method='POST', data=data, headers=headers):
+        response = auto_responder(request)
+
+    assert response[1] == 200
+    assert mock_get_llm_response.call_args[0][0][-1] == {'role': 'user', 'content': 'one two three four five'}
+    assert mock_write_log.call_args[0][0]['incoming_message'] == 'one two three four five'
+
+
+def test_partial_streamed_reply_is_logged_as_partial_and_not_remembered(tmp_path):
+    # Arrange
+    from main import build_log_data, remember_exchange
+    from utils import PartialReply
+    env_vars = fake_env_vars()
+    env_vars['conversation_store'] = ConversationStore(SQLiteHistoryBackend(str(tmp_path / 'history.sqlite3')))
+    reply = PartialReply('The quick brown')
+
+    # Act
+    remember_exchange('+1234567890', 'Hello', reply, env_vars)
+    log_data = build_log_data('+1234567890', 'Hello', reply, env_vars)
+
+    # Assert
+    assert env_vars['conversation_store'].history('+1234567890') == []
+    assert log_data['terse_response'] == 'The quick brown'
+    assert log_data['partial'] is True
+    assert 'partial' not in build_log_data('+1234567890', 'Hello', 'Whole answer.', env_vars)
@@ -0,0 +1,19 @@
+# tests/test_memory_profile.py
+
+from benchmarks.memory_profile import run
+
+
+def test_oversized_bodies_are_rejected_with_flat_memory(monkeypatch):
+    # Arrange
+    monkeypatch.setenv('MAX_REQUEST_BYTES', str(64 * 1024))
+    # run() fills these in if unset; set them here so they are restored afterwards
+    monkeypatch.setenv('TWILIO_AUTH_TOKEN', 'benchmark_token')
+    monkeypatch.setenv('TELEMETRY_SAMPLE_RATE', '0')
+
+    # Act
+    small, large = run(sizes=(1024, 4 * 1024 * 1024))
+
+    # Assert
+    assert small['status'] == 403       # forged signature, parsed normally
+    assert large['status'] == 413
+    assert large['peak_request_kb'] < 64
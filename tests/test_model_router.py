@@ -0,0 +1,107 @@
+# tests/test_model_router.py
+
+from model_router import DEFAULT_MODEL, ModelHealth, ModelRouter, expected_output_tokens
+
+HAIKU_PROMPT = {'role': 'system', 'content': 'Please provide a terse response (a haiku).'}
+PLAIN_PROMPT = {'role': 'system', 'content': 'You are a helpful assistant.'}
+
+
+def test_expected_output_follows_the_system_prompt():
+    assert expected_output_tokens([HAIKU_PROMPT, {'role': 'user', 'content': 'Hi'}]) == 40
+    assert expected_output_tokens([PLAIN_PROMPT, {'role': 'user', 'content': 'Hi'}]) == 150
+    assert expected_output_tokens([PLAIN_PROMPT, {'role': 'user', 'content': 'word ' * 400}]) == 500
+
+
+def test_short_replies_go_to_the_small_model():
+    # Arrange
+    router = ModelRouter()
+
+    # Act
+    route = router.route([HAIKU_PROMPT, {'role': 'user', 'content': 'Tell me about the sea'}])
+
+    # Assert
+    assert route == {'name': 'small', 'model': 'gpt-4o-mini', 'max_tokens': 80}
+
+
+def test_long_prompts_go_to_the_default_model():
+    # Arrange
+    router = ModelRouter()
+
+    # Act
+    route = router.route([PLAIN_PROMPT, {'role': 'user', 'content': 'word ' * 2000}])
+
+    # Assert
+    assert route == {'name': 'default', 'model': DEFAULT_MODEL, 'max_tokens': 500}
+
+
+def test_custom_routes_can_pin_max_tokens():
+    router = ModelRouter(routes=[{'name': 'only', 'model': 'gpt-4o', 'max_tokens': 300}])
+
+    assert router.route([PLAIN_PROMPT, {'role': 'user', 'content': 'Hi'}])['max_tokens'] == 300
+
+
+def test_slow_model_falls_back_until_it_recovers(clock):
+    # Arrange
+    router = ModelRouter(routes=[{'name': 'default', 'model': 'gpt-4o'}], max_latency=2.0,
+                         min_calls=3, health_window=60, clock=clock)
+    messages = [PLAIN_PROMPT, {'role': 'user', 'content': 'Hi'}]
+    for _ in range(3):
+        router.record(router.route(messages), seconds=5.0)
+
+    # Act
+    degraded = router.route(messages)
+    clock.now = 61
+    recovered = router.route(messages)
+
+    # Assert
+    assert degraded['name'] == 'default-fallback'
+    assert degraded['model'] == 'gpt-4o-mini'
+    assert recovered['model'] == 'gpt-4o'
+
+
+def test_failing_model_falls_back():
+    # Arrange
+    router = ModelRouter(routes=[{'name': 'default', 'model': 'gpt-4o'}], min_calls=4)
+    route = router.route([PLAIN_PROMPT])
+    for error in (True, False, False, False):
+        router.record(route, seconds=0.5, error=error)
+
+    # Act / Assert
+    assert router.degraded('gpt-4o') is True
+
+
+def test_stats_are_tagged_by_route():
+    # Arrange
+    router = ModelRouter()
+    route = router.route([HAIKU_PROMPT, {'role': 'user', 'content': 'Hi'}])
+
+    # Act
+    router.record(route, seconds=0.4, tokens=30)
+    router.record(route, seconds=0.6, tokens=50)
+
+    # Assert
+    assert router.stats()['small'] == {
+        'calls': 2, 'errors': 0, 'tokens': 80, 'total_seconds': 1.0, 'mean_seconds': 0.5
+    }
+
+
+def test_health_reports_p95_of_successful_calls():
+    # Arrange
+    health = ModelHealth()
+
+    # Act
+    for seconds in range(1, 21):
+        health.record(float(seconds))
+    health.record(100.0, error=True)
+
+    # Assert
+    assert health.snapshot() == {'calls': 21, 'error_rate': 1 / 21, 'p95_seconds': 20.0}
+
+
+def test_from_env_is_off_unless_enabled(monkeypatch):
+    monkeypatch.delenv('MODEL_ROUTING', raising=False)
+    assert ModelRouter.from_env() is None
+
+    monkeypatch.setenv('MODEL_ROUTING', 'true')
+    monkeypatch.setenv('MODEL_ROUTES', '[{"name": "mini", "model": "gpt-4o-mini"}]')
+    assert ModelRouter.from_env().routes == [{'name': 'mini', 'model': 'gpt-4o-mini'}]
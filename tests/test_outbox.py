@@ -0,0 +1,123 @@
+# tests/test_outbox.py
+
+import pytest
+
+from outbox import Outbox
+
+
+@pytest.fixture
+def outbox(tmp_path, clock):
+    outbox = Outbox(str(tmp_path / 'outbox.sqlite3'), max_attempts=3, base_delay=5, clock=clock, rng=lambda: 1.0)
+    yield outbox
+    outbox.close()
+
+
+def test_entries_are_replayed_in_batches_once_due(outbox, clock):
+    # Arrange
+    outbox.put_many('log', [{'n': 1}, {'n': 2}])
+    outbox.put('sms', {'to': '+1234567890', 'body': 'hi'})
+    batches = []
+
+    def handle(payloads):
+        batches.append(payloads)
+        return [None] * len(payloads)
+
+    # Act
+    early = outbox.replay({'log': handle, 'sms': handle})
+    clock.now += 5
+    due = outbox.replay({'log': handle, 'sms': handle})
+
+    # Assert
+    assert early == {'replayed': 0, 'failed': 0, 'dead': 0}
+    assert due == {'replayed': 3, 'failed': 0, 'dead': 0}
+    assert sorted(batches, key=len) == [[{'to': '+1234567890', 'body': 'hi'}], [{'n': 1}, {'n': 2}]]
+    assert outbox.stats()['pending'] == 0
+
+
+def test_failures_back_off_and_give_up_after_max_attempts(outbox, clock):
+    # Arrange
+    outbox.put('sms', {'to': '+1234567890', 'body': 'hi'})
+    failing = {'sms': lambda payloads: [ConnectionError('Twilio down')] * len(payloads)}
+
+    # Act
+    clock.now += 5
+    first = outbox.replay(failing)
+    not_yet = outbox.replay(failing)
+    clock.now += 20
+    second = outbox.replay(failing)
+    clock.now += 40
+    third = outbox.replay(failing)
+
+    # Assert
+    assert first['failed'] == 1
+    assert not_yet['failed'] == 0     # backing off for 10s
+    assert second['failed'] == 1
+    assert third['dead'] == 1
+    assert outbox.stats() == {'pending': 0, 'dead': 1, 'replayed': 0, 'failed': 3}
+
+
+def test_only_failed_entries_of_a_batch_are_retried(outbox, clock):
+    outbox.put_many('log', [{'n': 1}, {'n': 2}])
+    clock.now += 5
+
+    counts = outbox.replay({'log': lambda payloads: [None, RuntimeError('bucket gone')]})
+
+    assert counts == {'replayed': 1, 'failed': 1, 'dead': 0}
+    assert outbox.stats()['pending'] == 1
+
+
+def test_entries_survive_a_restart(tmp_path, clock):
+    path = str(tmp_path / 'outbox.sqlite3')
+    first = Outbox(path, clock=clock)
+    first.put('log', {'n': 1})
+    first.close()
+
+    second = Outbox(path, clock=clock)
+
+    assert second.stats()['pending'] == 1
+    second.close()
+
+
+def test_unknown_kinds_are_rejected(outbox):
+    with pytest.raises(ValueError):
+        outbox.put('fax', {})
+
+
+def test_two_instances_on_one_file_never_replay_the_same_entry(tmp_path, clock):
+    # Arrange
+    path = str(tmp_path / 'outbox.sqlite3')
+    first = Outbox(path, clock=clock, rng=lambda: 1.0)
+    second = Outbox(path, clock=clock, rng=lambda: 1.0)
+    first.put_many('sms', [{'n': n} for n in range(3)])
+    clock.now += 5
+    sent = []
+
+    def send(payloads):
+        # The other process replays while this one's batch is still being sent
+        sent.extend(payloads)
+        if len(sent) == len(payloads):
+            second.replay({'sms': send})
+        return [None] * len(payloads)
+
+    # Act
+    counts = first.replay({'sms': send})
+
+    # Assert
+    assert counts['replayed'] == 3
+    assert sorted(payload['n'] for payload in sent) == [0, 1, 2]
+    assert second.stats()['pending'] == 0
+    first.close()
+    second.close()
+
+
+def test_claims_lapse_if_the_replaying_process_dies(outbox, clock):
+    outbox.put('sms', {'to': '+1234567890', 'body': 'hi'})
+    clock.now += 5
+    outbox._claim(clock.now)    # claimed, then the process died before replaying
+
+    during = outbox.replay({'sms': lambda payloads: [None] * len(payloads)})
+    clock.now += outbox.lease
+    after = outbox.replay({'sms': lambda payloads: [None] * len(payloads)})
+
+    assert during['replayed'] == 0
+    assert after['replayed'] == 1
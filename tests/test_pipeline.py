@@ -0,0 +1,82 @@
+# tests/test_pipeline.py
+
+import threading
+import pytest
+from unittest.mock import patch
+from pipeline import BackgroundPipeline, LocalQueueBackend
+from telemetry import Telemetry
+
+
+@pytest.fixture
+def pipeline():
+    pipeline = BackgroundPipeline(LocalQueueBackend(max_workers=2), max_pending=2)
+    yield pipeline
+    pipeline.drain(timeout=5)
+
+
+def test_submit_runs_job_in_background(pipeline):
+    # Arrange
+    done = threading.Event()
+
+    # Act
+    accepted = pipeline.submit(done.set)
+
+    # Assert
+    assert accepted
+    assert done.wait(5)
+
+
+def test_submit_rejects_when_full(pipeline):
+    # Arrange
+    release = threading.Event()
+    pipeline.submit(release.wait, 5)
+    pipeline.submit(release.wait, 5)
+
+    # Act
+    accepted = pipeline.submit(release.wait, 5)
+    release.set()
+
+    # Assert
+    assert not accepted
+    assert pipeline.rejected == 1
+
+
+def test_drain_waits_for_queued_jobs_and_stops_accepting(pipeline):
+    # Arrange
+    results = []
+    release = threading.Event()
+
+    def job():
+        release.wait(5)
+        results.append('done')
+
+    pipeline.submit(job)
+    threading.Timer(0.05, release.set).start()
+
+    # Act
+    drained = pipeline.drain(timeout=5)
+
+    # Assert
+    assert drained
+    assert results == ['done']
+    assert not pipeline.submit(job)
+
+
+def test_failing_job_is_recorded_and_does_not_leak_capacity(pipeline):
+    # Arrange
+    telemetry = Telemetry(sample_rate=0)
+
+    def job():
+        raise RuntimeError('boom')
+
+    # Act
+    with patch('pipeline.get_telemetry', return_value=telemetry):
+        pipeline.submit(job)
+        pipeline.drain(timeout=5)
+
+    # Assert
+    assert pipeline.pending == 0
+    stats = telemetry.snapshot()
+    assert stats['pipeline_queue_wait']['count'] == 1
+    assert stats['pipeline_job']['count'] == 1
+    assert stats['pipeline_job']['errors'] == 1
@@ -0,0 +1,131 @@
+# tests/test_rate_limit.py
+
+import threading
+import pytest
+from rate_limit import (
+    ConcurrencyLimiter,
+    InMemoryRateBackend,
+    SenderRateLimiter,
+    SQLiteRateBackend,
+    Throttle,
+    sliding_count,
+)
+
+
+def test_sliding_count_weights_previous_window():
+    assert sliding_count(previous=10, current=2, elapsed_fraction=0.25) == pytest.approx(9.5)
+
+
+def test_sender_is_limited_within_window(clock):
+    # Arrange
+    limiter = SenderRateLimiter(3, window=60, clock=clock)
+
+    # Act
+    results = [limiter.allow('+1555') for _ in range(4)]
+
+    # Assert
+    assert results == [True, True, True, False]
+    assert limiter.allow('+1666') is True
+    assert limiter.throttled == 1
+
+
+def test_previous_window_still_counts_until_it_slides_out(clock):
+    # Arrange
+    limiter = SenderRateLimiter(2, window=60, clock=clock)
+    limiter.allow('+1555')
+    limiter.allow('+1555')
+
+    # Act / Assert
+    clock.now = 61   # previous window weighs ~98%, so still full
+    assert limiter.allow('+1555') is False
+    clock.now = 100  # previous window weighs ~33%
+    assert limiter.allow('+1555') is True
+    clock.now = 200  # two windows later nothing carries over
+    assert limiter.allow('+1555') is True
+    assert limiter.allow('+1555') is True
+
+
+def test_in_memory_backend_is_bounded():
+    # Arrange
+    backend = InMemoryRateBackend(max_keys=2)
+
+    # Act
+    for sender in ('a', 'b', 'c'):
+        backend.acquire(sender, 1, 60, 0)
+
+    # Assert
+    assert len(backend) == 2
+    assert backend.acquire('a', 1, 60, 0) is True
+
+
+def test_sqlite_backend_is_shared_between_limiters(tmp_path, clock):
+    # Arrange
+    clock.now = 5
+    path = str(tmp_path / 'rates.sqlite3')
+    first = SenderRateLimiter(2, window=60, backend=SQLiteRateBackend(path), clock=clock)
+    second = SenderRateLimiter(2, window=60, backend=SQLiteRateBackend(path), clock=clock)
+
+    # Act
+    results = [first.allow('+1555'), second.allow('+1555'), first.allow('+1555')]
+
+    # Assert
+    assert results == [True, True, False]
+
+
+def test_canned_reply_is_sent_once_per_window(clock):
+    # Arrange
+    throttle = Throttle(sender_limiter=SenderRateLimiter(1, window=60, clock=clock), reply='Slow down')
+
+    # Act
+    replies = [throttle.canned_reply('+1555'), throttle.canned_reply('+1555')]
+    clock.now = 60
+
+    # Assert
+    assert replies == ['Slow down', None]
+    assert throttle.canned_reply('+1555') == 'Slow down'
+
+
+def test_drop_action_never_replies():
+    throttle = Throttle(sender_limiter=SenderRateLimiter(1), action='drop')
+
+    assert throttle.canned_reply('+1555') is None
+
+
+def test_invalid_action_is_rejected():
+    with pytest.raises(ValueError):
+        Throttle(action='ignore')
+
+
+def test_concurrency_limiter_caps_in_flight_calls():
+    # Arrange
+    limiter = ConcurrencyLimiter(2)
+
+    # Act
+    acquired = [limiter.acquire() for _ in range(3)]
+    limiter.release()
+
+    # Assert
+    assert acquired == [True, True, False]
+    assert limiter.rejected == 1
+    assert limiter.acquire() is True
+
+
+def test_waiting_for_a_slot_succeeds_when_one_frees_up():
+    # Arrange
+    throttle = Throttle(concurrency=ConcurrencyLimiter(1), slot_timeout=2.0)
+    throttle.acquire_llm_slot()
+    threading.Timer(0.05, throttle.release_llm_slot).start()
+
+    # Act / Assert
+    assert throttle.acquire_llm_slot() is False
+    assert throttle.acquire_llm_slot(wait=True) is True
+
+
+def test_from_env_disables_limits_by_default(monkeypatch):
+    monkeypatch.delenv('RATE_LIMIT_MESSAGES', raising=False)
+    monkeypatch.delenv('LLM_MAX_CONCURRENCY', raising=False)
+
+    throttle = Throttle.from_env()
+
+    assert throttle.allow_sender('+1555') is True
+    assert throttle.acquire_llm_slot() is True
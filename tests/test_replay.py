@@ -0,0 +1,135 @@
+# tests/test_replay.py
+
+import json
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from benchmarks.fake_services import FAKE_SECRETS
+from benchmarks.replay import ReplayOpenAI, Replayer, conversations, load_records, summarize_replay
+from log_index import DirectorySource
+from log_sink import FileSystemBackend, write_batch
+
+
+def record(timestamp, sender, message, reply='Sure thing.'):
+    return {
+        'timestamp': timestamp,
+        'from_number': '+15550000000',
+        'to_number': sender,
+        'incoming_message': message,
+        'terse_response': reply,
+    }
+
+
+@pytest.fixture
+def llm():
+    records = [
+        record('2024-05-01T10:00:00+00:00', '+15551110000', 'Is it raining?', 'No, it is sunny and warm today.'),
+        record('2024-05-01T10:05:00+00:00', '+15552220000', 'Is it raining?', 'Yes.'),
+    ]
+    with ReplayOpenAI(records) as service:
+        yield service
+
+
+def test_records_are_read_from_both_layouts_in_time_order(tmp_path):
+    # Arrange
+    write_batch(FileSystemBackend(str(tmp_path)), [
+        record('2024-05-02T09:00:00+00:00', '+15551110000', 'second'),
+        record('2024-05-03T09:00:00+00:00', '+15551110000', 'third'),
+        record('2024-05-02T10:00:00+00:00', '+15551110000', ''),   # nothing to replay
+    ])
+    (tmp_path / 'logs' / '2024-05-01T09:00:00.json').write_text(
+        json.dumps(record('2024-05-01T09:00:00+00:00', '+15552220000', 'first'))
+    )
+    source = DirectorySource(str(tmp_path))
+
+    # Act
+    everything = load_records(source)
+    window = load_records(source, since='2024-05-02', until='2024-05-03')
+    oldest = load_records(source, limit=2)
+
+    # Assert
+    assert [r['incoming_message'] for r in everything] == ['first', 'second', 'third']
+    assert [r['incoming_message'] for r in window] == ['second']
+    assert [r['incoming_message'] for r in oldest] == ['first', 'second']
+
+
+def test_conversations_keep_each_senders_messages_in_order():
+    records = [
+        record('2024-05-01T10:00:00', '+15551110000', 'a1'),
+        record('2024-05-01T10:01:00', '+15552220000', 'b1'),
+        record('2024-05-01T10:02:00', '+15551110000', 'a2'),
+    ]
+
+    grouped = conversations(records)
+
+    assert [[r['incoming_message'] for r in conversation] for conversation in grouped] == [['a1', 'a2'], ['b1']]
+
+
+def test_fake_llm_answers_with_the_logged_replies_in_order(llm):
+    # Arrange
+    request = {'messages': [{'role': 'system', 'content': 'Be terse.'}, {'role': 'user', 'content': 'Is it raining?'}]}
+
+    # Act
+    first = llm.reply_for(dict(request, max_tokens=3))
+    second = llm.reply_for(request)
+    unknown = llm.reply_for({'messages': [{'role': 'user', 'content': 'Anything else?'}]})
+
+    # Assert
+    assert first == 'No, it'           # cut to max_tokens
+    assert second == 'Yes.'
+    assert unknown == llm.reply
+    call = llm.take_call('Is it raining?')
+    assert call['completion_tokens'] == 3
+    assert call['prompt_tokens'] > 0
+    assert llm.take_call('Is it raining?')['completion_tokens'] == 2
+    assert llm.take_call('Is it raining?') is None
+
+
+def test_messages_truncated_since_they_were_logged_still_match(llm):
+    reply = llm.reply_for({'messages': [{'role': 'user', 'content': 'Is it'}]})
+
+    assert reply == 'No, it is sunny and warm today.'
+    assert llm.take_call('Is it raining?') is not None
+
+
+@patch('benchmarks.replay.post', return_value=(200, 0.01))
+def test_each_record_is_posted_to_the_number_it_was_logged_for(mock_post):
+    # Arrange
+    records = [
+        record('2024-05-01T10:00:00', '+15551110000', 'Hi'),
+        record('2024-05-01T10:01:00', '+15551110000', 'Again'),
+    ]
+    records[1]['from_number'] = '+15559990000'     # a second tenant's number
+    replayer = Replayer('http://127.0.0.1:0/', {'openai': MagicMock(), 'twilio': MagicMock(sent_to={})})
+
+    # Act
+    replayer.replay_conversation(records)
+
+    # Assert
+    assert [call.args[1]['To'] for call in mock_post.call_args_list] == ['+15550000000', '+15559990000']
+    assert replayer.params('+15551110000', 'Warm-up')['To'] == FAKE_SECRETS['TWILIO_PHONE_NUMBER']
+
+
+def test_summary_reports_tokens_and_reply_sizes_for_answered_requests():
+    # Arrange
+    results = [
+        {'status': 200, 'latency_ms': 100.0, 'prompt_tokens': 40, 'completion_tokens': 10,
+         'response_chars': 50, 'messages_sent': 1, 'logged_response_chars': 60},
+        {'status': 200, 'latency_ms': 300.0, 'prompt_tokens': None, 'completion_tokens': None,
+         'response_chars': 30, 'messages_sent': 1, 'logged_response_chars': 30},
+        {'status': 500, 'latency_ms': 50.0, 'prompt_tokens': 99, 'completion_tokens': 0,
+         'response_chars': 0, 'messages_sent': 0, 'logged_response_chars': 20},
+    ]
+
+    # Act
+    summary = summarize_replay(results, elapsed=1.0)
+
+    # Assert
+    assert summary['requests'] == 3 and summary['errors'] == 1
+    assert summary['tokens'] == {
+        'llm_calls': 1, 'prompt_mean': 40.0, 'prompt_total': 40, 'completion_mean': 10.0, 'completion_total': 10,
+    }
+    assert summary['response_chars'] == {'mean': 40.0, 'p95': 50, 'max': 50, 'logged_mean': 45.0}
+    assert summary['messages_sent'] == 2
+    assert summary['latency_ms']['max'] == 300.0
@@ -0,0 +1,119 @@
+# tests/test_response_cache.py
+
+import pytest
+from response_cache import ResponseCache, SQLiteResponseTier, cache_key, fingerprint
+
+PARAMS = {'model': 'gpt-4o', 'max_tokens': 500}
+SYSTEM = {'role': 'system', 'content': 'Be terse.'}
+
+
+def prompt(text):
+    return [SYSTEM, {'role': 'user', 'content': text}]
+
+
+def test_exact_hit_ignores_case_and_whitespace():
+    # Arrange
+    cache = ResponseCache()
+    cache.put(prompt('Hi  there'), PARAMS, 'Hello!', tokens=30, latency=1.5)
+
+    # Act
+    response = cache.get(prompt('hi there '), PARAMS)
+
+    # Assert
+    assert response == 'Hello!'
+    stats = cache.stats()
+    assert stats['hits'] == 1
+    assert stats['tokens_saved'] == 30
+    assert stats['latency_saved_seconds'] == 1.5
+
+
+def test_model_params_are_part_of_the_key():
+    assert cache_key(prompt('hi'), PARAMS) != cache_key(prompt('hi'), {'model': 'gpt-4o-mini', 'max_tokens': 500})
+
+
+def test_entries_expire_after_ttl(clock):
+    # Arrange
+    cache = ResponseCache(ttl=60, clock=clock)
+    cache.put(prompt('hi'), PARAMS, 'Hello!')
+    clock.now += 61
+
+    # Act
+    response = cache.get(prompt('hi'), PARAMS)
+
+    # Assert
+    assert response is None
+    assert cache.stats()['misses'] == 1
+
+
+def test_least_recently_used_entry_is_evicted():
+    # Arrange
+    cache = ResponseCache(max_entries=2)
+    cache.put(prompt('one'), PARAMS, '1')
+    cache.put(prompt('two'), PARAMS, '2')
+    cache.get(prompt('one'), PARAMS)
+
+    # Act
+    cache.put(prompt('three'), PARAMS, '3')
+
+    # Assert
+    assert cache.get(prompt('two'), PARAMS) is None
+    assert cache.get(prompt('one'), PARAMS) == '1'
+
+
+def test_near_duplicate_mode_matches_similar_messages():
+    # Arrange
+    cache = ResponseCache(near_duplicate=True)
+    cache.put(prompt('What are your opening hours on the weekend?'), PARAMS, '9 to 5.')
+
+    # Act
+    similar = cache.get(prompt('what are your opening hours on the weekend??'), PARAMS)
+    different = cache.get(prompt('How do I cancel my subscription right now?'), PARAMS)
+
+    # Assert
+    assert similar == '9 to 5.'
+    assert different is None
+    assert cache.stats()['near_hits'] == 1
+
+
+def test_near_duplicate_mode_requires_same_conversation_prefix():
+    # Arrange
+    cache = ResponseCache(near_duplicate=True)
+    cache.put(prompt('What are your opening hours on the weekend?'), PARAMS, '9 to 5.')
+    other_system = [{'role': 'system', 'content': 'Be verbose.'},
+                    {'role': 'user', 'content': 'What are your opening hours on the weekend?!'}]
+
+    # Act / Assert
+    assert cache.get(other_system, PARAMS) is None
+
+
+def test_near_duplicate_is_off_by_default():
+    # Arrange
+    cache = ResponseCache()
+    cache.put(prompt('What are your opening hours on the weekend?'), PARAMS, '9 to 5.')
+
+    # Act / Assert
+    assert cache.get(prompt('what are your opening hours on the weekend??'), PARAMS) is None
+
+
+def test_fingerprint_is_stable_for_punctuation_changes():
+    assert fingerprint('Where is my order?') == fingerprint('where is my order')
+
+
+@pytest.fixture
+def tier(tmp_path):
+    tier = SQLiteResponseTier(str(tmp_path / 'responses.sqlite3'))
+    yield tier
+    tier.close()
+
+
+def test_persistent_tier_survives_new_cache(tier):
+    # Arrange
+    ResponseCache(persistent=tier).put(prompt('help'), PARAMS, 'Reply STOP to opt out.')
+    cache = ResponseCache(persistent=tier)
+
+    # Act
+    response = cache.get(prompt('help'), PARAMS)
+
+    # Assert
+    assert response == 'Reply STOP to opt out.'
+    assert cache.stats()['persistent_hits'] == 1
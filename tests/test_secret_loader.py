@@ -0,0 +1,106 @@
+# tests/test_secret_loader.py
+
+import time
+import pytest
+from cryptography.fernet import Fernet
+from fakes import FakeSecretManagerClient
+from secret_loader import EncryptedSecretCache, SecretLoader, parse_pinned_versions
+
+SECRETS = {
+    'TWILIO_AUTH_TOKEN': ['token-v1', 'token-v2'],
+    'OPENAI_API_KEY': ['openai-v1'],
+    'TWILIO_ACCOUNT_SID': ['sid-v1'],
+}
+
+
+@pytest.fixture
+def fake_client():
+    return FakeSecretManagerClient(SECRETS)
+
+
+def test_load_fetches_all_secrets_concurrently():
+    # Arrange
+    client = FakeSecretManagerClient(SECRETS, latency=0.1)
+    loader = SecretLoader('test_project', client=client)
+
+    # Act
+    start = time.monotonic()
+    secrets = loader.load(SECRETS)
+    elapsed = time.monotonic() - start
+
+    # Assert
+    assert secrets == {'TWILIO_AUTH_TOKEN': 'token-v2', 'OPENAI_API_KEY': 'openai-v1', 'TWILIO_ACCOUNT_SID': 'sid-v1'}
+    assert elapsed < 0.25
+    assert len(client.calls) == 3
+
+
+def test_resolved_versions_are_remembered(fake_client):
+    # Arrange
+    loader = SecretLoader('test_project', client=fake_client)
+
+    # Act
+    loader.load(SECRETS)
+    loader.load(SECRETS)
+
+    # Assert
+    assert loader.versions == {'TWILIO_AUTH_TOKEN': '2', 'OPENAI_API_KEY': '1', 'TWILIO_ACCOUNT_SID': '1'}
+    assert len(fake_client.calls) == 3
+
+
+def test_refresh_picks_up_new_latest_version(fake_client):
+    # Arrange
+    loader = SecretLoader('test_project', client=fake_client)
+    loader.get('TWILIO_AUTH_TOKEN')
+    fake_client.add_version('TWILIO_AUTH_TOKEN', 'token-v3')
+
+    # Act
+    cached = loader.get('TWILIO_AUTH_TOKEN')
+    refreshed = loader.get('TWILIO_AUTH_TOKEN', refresh=True)
+
+    # Assert
+    assert cached == 'token-v2'
+    assert refreshed == 'token-v3'
+    assert loader.versions['TWILIO_AUTH_TOKEN'] == '3'
+
+
+def test_pinned_versions_are_requested_explicitly(fake_client):
+    # Arrange
+    loader = SecretLoader('test_project', client=fake_client, pinned_versions={'TWILIO_AUTH_TOKEN': '1'})
+
+    # Act
+    value = loader.get('TWILIO_AUTH_TOKEN', refresh=True)
+
+    # Assert
+    assert value == 'token-v1'
+    assert fake_client.calls == ['projects/test_project/secrets/TWILIO_AUTH_TOKEN/versions/1']
+
+
+def test_encrypted_cache_serves_cold_start_without_rpc(tmp_path, fake_client):
+    # Arrange
+    key = Fernet.generate_key()
+    SecretLoader('test_project', client=fake_client, cache=EncryptedSecretCache(str(tmp_path), key)).load(SECRETS)
+    cold_client = FakeSecretManagerClient(SECRETS)
+    cold_loader = SecretLoader('test_project', client=cold_client, cache=EncryptedSecretCache(str(tmp_path), key))
+
+    # Act
+    secrets = cold_loader.load(SECRETS)
+
+    # Assert
+    assert secrets['TWILIO_AUTH_TOKEN'] == 'token-v2'
+    assert cold_client.calls == []
+    assert b'token-v2' not in (tmp_path / 'TWILIO_AUTH_TOKEN' / '2.enc').read_bytes()
+
+
+def test_get_wraps_failures_in_runtime_error():
+    # Arrange
+    client = FakeSecretManagerClient(SECRETS, fail_names={'OPENAI_API_KEY'})
+    loader = SecretLoader('test_project', client=client)
+
+    # Act / Assert
+    with pytest.raises(RuntimeError, match="OPENAI_API_KEY"):
+        loader.load(SECRETS)
+
+
+def test_parse_pinned_versions():
+    assert parse_pinned_versions('A=3, B = 7,,bad') == {'A': '3', 'B': '7'}
+    assert parse_pinned_versions(None) == {}
@@ -0,0 +1,144 @@
+# tests/test_send_scheduler.py
+
+import pytest
+from unittest.mock import MagicMock
+from twilio.base.exceptions import TwilioRestException
+from fakes import FakeTwilioClient
+from send_scheduler import SchedulerClosedError, SendScheduler, TokenBucket, is_retryable
+
+
+@pytest.fixture
+def schedulers():
+    created = []
+    yield created
+    for scheduler in created:
+        scheduler.close(timeout=5)
+
+
+def make_scheduler(schedulers, send_fn, **kwargs):
+    kwargs.setdefault('base_delay', 0.01)
+    scheduler = SendScheduler(send_fn, **kwargs)
+    schedulers.append(scheduler)
+    return scheduler
+
+
+def test_token_bucket_refills_at_rate(clock):
+    # Arrange
+    bucket = TokenBucket(rate=2, capacity=1, clock=clock)
+
+    # Act
+    first = bucket.try_acquire()
+    second = bucket.try_acquire()
+    clock.now = 0.5
+    third = bucket.try_acquire()
+
+    # Assert
+    assert first == 0
+    assert second == pytest.approx(0.5)
+    assert third == 0
+
+
+def test_is_retryable():
+    assert is_retryable(TwilioRestException(429, 'uri', 'Too Many Requests'))
+    assert is_retryable(TwilioRestException(503, 'uri', 'Unavailable'))
+    assert not is_retryable(TwilioRestException(400, 'uri', 'Invalid To number'))
+    assert is_retryable(ConnectionError('reset'))
+    assert not is_retryable(ValueError('bad'))
+
+
+def test_scheduler_paces_sends_so_upstream_never_throttles(schedulers):
+    # Arrange
+    # Upstream allows a little more than we schedule, as with a real configured limit
+    twilio = FakeTwilioClient(rate=60, burst=5)
+    scheduler = make_scheduler(schedulers, twilio.messages.create, rate=50, burst=5)
+
+    # Act
+    futures = scheduler.send_batch([f'+1555000{n:04d}' for n in range(20)], 'Hello', 'MG123')
+    results = [future.result(timeout=5) for future in futures]
+    scheduler.drain(timeout=5)
+
+    # Assert
+    assert len(twilio.sent) == 20
+    assert twilio.rejected == 0
+    assert all(result.sid.startswith('SM') for result in results)
+    assert scheduler.stats['sent'] == 20
+
+
+def test_retryable_errors_are_retried_with_backoff(schedulers):
+    # Arrange
+    send = MagicMock(side_effect=[TwilioRestException(429, 'uri', 'Too Many Requests'), MagicMock(sid='SM1')])
+    scheduler = make_scheduler(schedulers, send, rate=100, burst=10)
+
+    # Act
+    result = scheduler.submit('+15550001', 'Hello', 'MG123').result(timeout=5)
+
+    # Assert
+    assert result.sid == 'SM1'
+    assert send.call_count == 2
+    assert scheduler.stats['retried'] == 1
+
+
+def test_permanent_errors_fail_without_retry(schedulers):
+    # Arrange
+    send = MagicMock(side_effect=TwilioRestException(400, 'uri', 'Invalid To number'))
+    scheduler = make_scheduler(schedulers, send, rate=100, burst=10)
+
+    # Act
+    future = scheduler.submit('+15550001', 'Hello', 'MG123')
+
+    # Assert
+    with pytest.raises(TwilioRestException):
+        future.result(timeout=5)
+    scheduler.drain(timeout=5)
+    assert send.call_count == 1
+    assert scheduler.stats['failed'] == 1
+
+
+def test_retries_stop_after_max_attempts(schedulers):
+    # Arrange
+    send = MagicMock(side_effect=TwilioRestException(503, 'uri', 'Unavailable'))
+    scheduler = make_scheduler(schedulers, send, rate=100, burst=10, max_attempts=3)
+
+    # Act
+    future = scheduler.submit('+15550001', 'Hello', 'MG123')
+
+    # Assert
+    with pytest.raises(TwilioRestException):
+        future.result(timeout=5)
+    assert send.call_count == 3
+
+
+def test_close_drains_queue_and_rejects_new_messages(schedulers):
+    # Arrange
+    twilio = FakeTwilioClient()
+    scheduler = make_scheduler(schedulers, twilio.messages.create, rate=100, burst=10)
+    scheduler.send_batch(['+15550001', '+15550002'], 'Hello', 'MG123')
+
+    # Act
+    drained = scheduler.close(timeout=5)
+
+    # Assert
+    assert drained
+    assert len(twilio.sent) == 2
+    with pytest.raises(RuntimeError):
+        scheduler.submit('+15550003', 'Hello', 'MG123')
+
+
+def test_close_fails_queued_messages_instead_of_dropping_them(schedulers):
+    # Arrange
+    twilio = FakeTwilioClient()
+    # One message per 100 seconds, so everything after the first is still queued at close
+    scheduler = make_scheduler(schedulers, twilio.messages.create, rate=0.01, burst=1)
+    futures = scheduler.send_batch(['+15550001', '+15550002', '+15550003'], 'Hello', 'MG123')
+    futures[0].result(timeout=5)
+
+    # Act
+    drained = scheduler.close(timeout=0)
+
+    # Assert
+    assert not drained
+    assert len(twilio.sent) == 1
+    for future in futures[1:]:
+        assert isinstance(future.exception(timeout=1), SchedulerClosedError)
+        assert is_retryable(future.exception())
+    assert scheduler.stats['failed'] == 2
@@ -0,0 +1,97 @@
+# tests/test_server.py
+
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+import server
+
+
+@pytest.fixture
+def client():
+    server._shutting_down.clear()
+    server.app.config['TESTING'] = True
+    yield server.app.test_client()
+    server._shutting_down.clear()
+
+
+def test_healthz_is_always_ok(client):
+    assert client.get('/healthz').status_code == 200
+
+
+@patch('server.environment_cache')
+def test_readyz_waits_for_warm_clients(mock_environment_cache, client):
+    # Arrange
+    mock_environment_cache.peek.return_value = None
+
+    # Act
+    cold = client.get('/readyz')
+    mock_environment_cache.peek.return_value = {'twilio_client': MagicMock()}
+    warm = client.get('/readyz')
+
+    # Assert
+    assert cold.status_code == 503
+    assert warm.status_code == 200
+
+
+def test_metrics_are_served_in_prometheus_format(client, monkeypatch):
+    monkeypatch.setenv('METRICS_ENDPOINT', 'true')
+
+    response = client.get('/metrics')
+
+    assert response.status_code == 200
+    assert response.content_type.startswith('text/plain')
+
+
+def test_metrics_are_not_found_unless_enabled(client, monkeypatch):
+    monkeypatch.delenv('METRICS_ENDPOINT', raising=False)
+
+    response = client.get('/metrics')
+
+    assert response.status_code == 404
+
+
+@patch('server.auto_responder')
+def test_webhook_is_handled_by_the_function_handler(mock_auto_responder, client):
+    mock_auto_responder.return_value = ('', 200)
+
+    response = client.post('/auto_responder', data={'Body': 'Hello'})
+
+    assert response.status_code == 200
+    mock_auto_responder.assert_called_once()
+
+
+@patch('server.get_tenant_registry', return_value=None)
+@patch('server.environment_cache')
+def test_shutdown_flushes_sends_and_logs(mock_environment_cache, mock_get_tenant_registry, client, monkeypatch):
+    # Arrange
+    monkeypatch.delenv('ASYNC_PIPELINE', raising=False)
+    env_vars = {'send_scheduler': MagicMock(), 'log_sink': MagicMock()}
+    mock_environment_cache.peek.return_value = env_vars
+
+    # Act
+    server.shutdown(timeout=5)
+
+    # Assert
+    env_vars['send_scheduler'].close.assert_called_once_with(5)
+    env_vars['log_sink'].close.assert_called_once()
+    assert client.get('/readyz').status_code == 503
+
+
+@patch('server.initialize_environment', side_effect=RuntimeError('no secrets'))
+def test_failed_warm_up_is_reported_not_raised(mock_initialize_environment, capsys):
+    assert server.warm_up() is False
+    assert 'Error warming up worker' in capsys.readouterr().out
+
+
+def test_gunicorn_options_come_from_env(monkeypatch):
+    monkeypatch.setenv('SERVER_WORKERS', '3')
+    monkeypatch.setenv('SERVER_THREADS', '16')
+    monkeypatch.setenv('PORT', '9000')
+
+    options = server.gunicorn_options()
+
+    assert options['workers'] == 3
+    assert options['threads'] == 16
+    assert options['bind'] == '0.0.0.0:9000'
+    assert options['worker_class'] == 'gthread'
@@ -0,0 +1,68 @@
+# tests/test_signature.py
+
+import pytest
+from twilio.request_validator import RequestValidator as TwilioRequestValidator
+from werkzeug.datastructures import MultiDict
+from signature import RequestValidator, ValidatorCache
+
+PARAMS = {'From': '+1234567890', 'Body': 'Hello', 'MessageSid': 'SM1'}
+
+
+@pytest.mark.parametrize('signed_url, request_url', [
+    ('https://example.com/sms', 'https://example.com/sms'),
+    ('https://example.com:443/sms', 'https://example.com/sms'),
+    ('https://example.com/sms', 'https://example.com:443/sms'),
+    ('https://example.com/sms?a=1', 'https://example.com/sms?a=1'),
+])
+def test_matches_twilio_validator(signed_url, request_url):
+    # Arrange
+    signature = TwilioRequestValidator('token').compute_signature(signed_url, PARAMS)
+
+    # Act
+    valid = RequestValidator('token').validate(request_url, PARAMS, signature)
+
+    # Assert
+    assert valid is True
+    assert TwilioRequestValidator('token').validate(request_url, PARAMS, signature) is True
+
+
+def test_rejects_wrong_token_and_empty_signature():
+    signature = TwilioRequestValidator('other').compute_signature('https://example.com/', PARAMS)
+
+    assert RequestValidator('token').validate('https://example.com/', PARAMS, signature) is False
+    assert RequestValidator('token').validate('https://example.com/', PARAMS, '') is False
+
+
+def test_supports_repeated_form_fields():
+    params = MultiDict([('MediaUrl', 'b'), ('MediaUrl', 'a')])
+    signature = TwilioRequestValidator('token').compute_signature('https://example.com/', params)
+
+    assert RequestValidator('token').validate('https://example.com/', params, signature) is True
+
+
+def test_cache_builds_one_validator_per_token():
+    # Arrange
+    built = []
+    cache = ValidatorCache(lambda token: built.append(token) or RequestValidator(token))
+    signature = TwilioRequestValidator('token').compute_signature('https://example.com/', PARAMS)
+
+    # Act
+    for _ in range(3):
+        assert cache.validate('https://example.com/', PARAMS, signature, ('token',))
+
+    # Assert
+    assert built == ['token']
+
+
+def test_secondary_token_is_accepted_during_rotation():
+    # Arrange
+    cache = ValidatorCache()
+    signature = TwilioRequestValidator('new-token').compute_signature('https://example.com/', PARAMS)
+
+    # Act
+    valid = cache.validate('https://example.com/', PARAMS, signature, ('old-token', 'new-token'))
+
+    # Assert
+    assert valid is True
+    assert cache.secondary_matches == 1
+    assert cache.validate('https://example.com/', PARAMS, signature, ('old-token',)) is False
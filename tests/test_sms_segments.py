@@ -0,0 +1,57 @@
+# tests/test_sms_segments.py
+
+from sms_segments import (
+    GSM7_LIMIT, UCS2_LIMIT, SegmentSplitter, segment_limit, sms_length, split_text
+)
+
+SENTENCE = 'The quick brown fox jumps over the lazy dog. '
+
+
+def test_segment_limit_depends_on_encoding():
+    assert segment_limit('plain text') == GSM7_LIMIT
+    assert segment_limit('emoji 😀') == UCS2_LIMIT
+
+
+def test_sms_length_counts_extension_and_surrogate_characters():
+    assert sms_length('a€') == 3
+    assert sms_length('😀') == 2
+
+
+def test_short_text_is_one_segment():
+    assert split_text('Hello there!') == ['Hello there!']
+
+
+def test_long_text_splits_on_sentence_boundaries():
+    # Act
+    segments = split_text(SENTENCE * 8)
+
+    # Assert
+    assert len(segments) > 1
+    assert all(sms_length(segment) <= GSM7_LIMIT for segment in segments)
+    assert all(segment.endswith('.') for segment in segments)
+    assert ' '.join(segments) == (SENTENCE * 8).strip()
+
+
+def test_unicode_text_uses_ucs2_limit():
+    segments = split_text('Ünïcode 😀 text. ' * 10)
+    assert all(sms_length(segment) <= UCS2_LIMIT for segment in segments)
+
+
+def test_text_without_boundaries_is_cut_hard():
+    segments = split_text('x' * 400)
+    assert [len(segment) for segment in segments] == [160, 160, 80]
+
+
+def test_splitter_emits_segment_as_soon_as_it_is_full():
+    # Arrange
+    splitter = SegmentSplitter()
+    emitted = []
+
+    # Act
+    for word in (SENTENCE * 4).split(' '):
+        emitted.extend(splitter.feed(word + ' '))
+        if emitted:
+            break
+
+    # Assert
+    assert emitted == [(SENTENCE * 3).strip()]
@@ -0,0 +1,98 @@
+# tests/test_telemetry.py
+
+import pytest
+from telemetry import Histogram, Telemetry
+
+
+def test_histogram_buckets_are_cumulative():
+    # Arrange
+    histogram = Histogram(buckets=(0.1, 1.0))
+
+    # Act
+    for seconds in (0.05, 0.5, 0.7, 3.0):
+        histogram.observe(seconds)
+
+    # Assert
+    assert histogram.cumulative() == [(0.1, 1), (1.0, 3), ('+Inf', 4)]
+    assert histogram.count == 4
+    assert histogram.sum == pytest.approx(4.25)
+
+
+def test_spans_are_always_counted_but_only_sampled_traces_are_logged():
+    # Arrange
+    emitted = []
+    telemetry = Telemetry(sample_rate=0.5, emit=emitted.append, rng=iter([0.9, 0.1]).__next__)
+
+    # Act
+    for _ in range(2):
+        with telemetry.trace('webhook', mode='sync') as trace:
+            with telemetry.span('llm'):
+                pass
+            trace['status'] = 200
+
+    # Assert
+    snapshot = telemetry.snapshot()
+    assert snapshot['llm']['count'] == 2
+    assert snapshot['webhook']['count'] == 2
+    assert len(emitted) == 1
+    assert emitted[0]['trace'] == 'webhook'
+    assert emitted[0]['status'] == 200
+    assert emitted[0]['mode'] == 'sync'
+    assert [span['name'] for span in emitted[0]['spans']] == ['llm']
+
+
+def test_failed_span_is_counted_as_error():
+    # Arrange
+    emitted = []
+    telemetry = Telemetry(sample_rate=1.0, emit=emitted.append)
+
+    # Act
+    with pytest.raises(RuntimeError):
+        with telemetry.trace('webhook'):
+            with telemetry.span('twilio_send'):
+                raise RuntimeError('boom')
+
+    # Assert
+    assert telemetry.snapshot()['twilio_send']['errors'] == 1
+    assert emitted[0]['severity'] == 'ERROR'
+    assert emitted[0]['spans'][0]['error'] is True
+
+
+def test_zero_sample_rate_never_logs():
+    # Arrange
+    emitted = []
+    telemetry = Telemetry(sample_rate=0, emit=emitted.append)
+
+    # Act
+    with telemetry.trace('webhook'):
+        with telemetry.span('validation'):
+            pass
+
+    # Assert
+    assert emitted == []
+    assert telemetry.snapshot()['validation']['count'] == 1
+
+
+def test_render_prometheus():
+    # Arrange
+    telemetry = Telemetry(sample_rate=0, buckets=(0.5,))
+    telemetry.record('llm', 0.25)
+    telemetry.record('llm', 2.0, error=True)
+
+    # Act
+    text = telemetry.render_prometheus()
+
+    # Assert
+    assert 'sms_stage_duration_seconds_bucket{stage="llm",le="0.5"} 1' in text
+    assert 'sms_stage_duration_seconds_bucket{stage="llm",le="+Inf"} 2' in text
+    assert 'sms_stage_duration_seconds_count{stage="llm"} 2' in text
+    assert 'sms_stage_errors_total{stage="llm"} 1' in text
+
+
+def test_counters_are_exported_as_events():
+    telemetry = Telemetry(sample_rate=0)
+
+    telemetry.increment('llm_hedges_fired')
+    telemetry.increment('llm_hedges_fired')
+
+    assert 'sms_events_total{event="llm_hedges_fired"} 2' in telemetry.render_prometheus()
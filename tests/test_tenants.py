@@ -0,0 +1,147 @@
+# tests/test_tenants.py
+
+import json
+from unittest.mock import MagicMock, patch
+
+from rate_limit import InMemoryRateBackend, SenderRateLimiter
+from tenants import Tenant, TenantRegistry
+
+TENANT_NUMBER = '+15550001111'
+
+
+def default_env():
+    return {
+        'environment': 'test',
+        'TWILIO_ACCOUNT_SID': 'default_sid',
+        'TWILIO_AUTH_TOKEN': 'default_token',
+        'TWILIO_PHONE_NUMBER': '+15555555555',
+        'TWILIO_MESSAGING_SERVICE_SID': 'default_service',
+        'OPENAI_API_KEY': 'default_openai_key',
+        'BUCKET_NAME': 'practice-dev-bucket',
+        'twilio_client': MagicMock(),
+        'openai_client': MagicMock(),
+        'log_sink': MagicMock(),
+        'send_scheduler': MagicMock(),
+    }
+
+
+def make_tenant(default, **settings):
+    return Tenant(
+        TENANT_NUMBER, name='acme', system_prompt='You work for Acme.', settings=settings,
+        resolve_secret=lambda name: f'resolved-{name}', default_env=lambda: default,
+    )
+
+
+def test_registry_loads_tenants_from_env(monkeypatch):
+    # Arrange
+    monkeypatch.setenv('TENANTS', json.dumps([
+        {'phone_number': TENANT_NUMBER, 'name': 'acme', 'rate_limit_messages': 5},
+    ]))
+
+    # Act
+    registry = TenantRegistry.from_env()
+
+    # Assert
+    assert len(registry) == 1
+    assert registry.lookup(TENANT_NUMBER).name == 'acme'
+    assert registry.lookup(TENANT_NUMBER).rate_limit_messages == 5
+    assert registry.lookup('+19999999999') is None
+
+
+def test_registry_is_off_without_config(monkeypatch):
+    monkeypatch.delenv('TENANTS', raising=False)
+    monkeypatch.delenv('TENANTS_FILE', raising=False)
+
+    assert TenantRegistry.from_env() is None
+
+
+def test_auth_tokens_resolve_secret_references():
+    tenant = make_tenant(default_env(), TWILIO_AUTH_TOKEN='secret:acme-token')
+
+    assert tenant.auth_tokens() == ('resolved-acme-token',)
+
+
+@patch('tenants.get_auth_tokens', return_value=('default_token',))
+def test_auth_tokens_default_when_the_tenant_has_none(mock_get_auth_tokens):
+    assert make_tenant(default_env()).auth_tokens() == ('default_token',)
+
+
+@patch('tenants._build_clients')
+def test_env_vars_are_built_once_with_the_tenants_settings(mock_build_clients):
+    # Arrange
+    default = default_env()
+    mock_build_clients.return_value = {'twilio_client': 'acme twilio'}
+    tenant = make_tenant(default, TWILIO_ACCOUNT_SID='acme_sid', TWILIO_AUTH_TOKEN='acme_token',
+                         BUCKET_NAME='acme-bucket')
+
+    # Act
+    first = tenant.env_vars()
+    second = tenant.env_vars()
+
+    # Assert
+    assert first is second
+    mock_build_clients.assert_called_once()
+    settings, previous = mock_build_clients.call_args[0]
+    assert settings['TWILIO_ACCOUNT_SID'] == 'acme_sid'
+    assert settings['TWILIO_PHONE_NUMBER'] == TENANT_NUMBER
+    assert settings['OPENAI_API_KEY'] == 'default_openai_key'
+    # Different bucket and account: the default's log sink and Twilio client are not reused
+    assert previous['log_sink'] is None and previous['twilio_client'] is None
+    assert previous['openai_client'] is default['openai_client']
+    assert first['SYSTEM_PROMPT'] == 'You work for Acme.'
+    assert first['tenant'] == 'acme'
+
+
+@patch('tenants._build_clients')
+def test_env_vars_rebuild_from_the_tenants_own_clients_when_the_default_refreshes(mock_build_clients):
+    # Arrange
+    environments = [default_env()]
+    mock_build_clients.side_effect = lambda settings, previous: {'built_from': previous}
+    tenant = Tenant(TENANT_NUMBER, default_env=lambda: environments[-1], resolve_secret=str,
+                    settings={'TWILIO_ACCOUNT_SID': 'acme_sid', 'TWILIO_AUTH_TOKEN': 'acme_token'})
+    first = tenant.env_vars()
+
+    # Act
+    environments.append(default_env())
+    second = tenant.env_vars()
+
+    # Assert
+    assert second is not first
+    assert second['built_from'] is first
+
+
+@patch('tenants._build_clients')
+def test_tenant_on_the_default_account_follows_its_twilio_client_across_rotations(mock_build_clients):
+    # Arrange
+    environments = [default_env()]
+    mock_build_clients.side_effect = lambda settings, previous: {'built_from': previous}
+    tenant = Tenant(TENANT_NUMBER, default_env=lambda: environments[-1], resolve_secret=str)
+    tenant.env_vars()
+
+    # Act
+    rotated = dict(default_env(), TWILIO_AUTH_TOKEN='rotated_token')
+    environments.append(rotated)
+    previous = tenant.env_vars()['built_from']
+
+    # Assert
+    # Same client as the default, so _build_clients hands both the same send scheduler
+    assert previous['twilio_client'] is rotated['twilio_client']
+    assert previous['TWILIO_AUTH_TOKEN'] == 'rotated_token'
+
+
+def test_tenant_rate_limit_is_namespaced():
+    # Arrange
+    backend = InMemoryRateBackend()
+    limiter = SenderRateLimiter(1, backend=backend, namespace=f'{TENANT_NUMBER}:')
+
+    # Act
+    allowed = [limiter.allow('+1234567890'), limiter.allow('+1234567890')]
+
+    # Assert
+    assert allowed == [True, False]
+    assert len(backend) == 1
+
+
+@patch('tenants.get_throttle')
+def test_tenant_without_limits_uses_the_shared_throttle(mock_get_throttle):
+    assert make_tenant(default_env()).throttle() is mock_get_throttle.return_value
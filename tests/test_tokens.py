@@ -0,0 +1,20 @@
+# tests/test_tokens.py
+
+from tokens import count_message_tokens, count_tokens, truncate_to_tokens
+
+
+def test_count_tokens_counts_words_and_punctuation():
+    assert count_tokens('') == 0
+    assert count_tokens('Hello there, how are you?') == 7
+    assert count_tokens('internationalization') == 4
+
+
+def test_count_message_tokens_includes_overhead():
+    messages = [{'role': 'user', 'content': 'Hello'}]
+    assert count_message_tokens(messages) == count_tokens('Hello') + 6
+
+
+def test_truncate_to_tokens_keeps_prefix_within_budget():
+    text = 'one two three four five'
+    assert truncate_to_tokens(text, 3) == 'one two three'
+    assert truncate_to_tokens(text, 100) == text
@@ -1,15 +1,33 @@
 # tests/test_utils.py
 
 import os
+import threading
+from concurrent.futures import Future
 import pytest
 from unittest.mock import MagicMock
+import utils
 from utils import (
     get_LLM_response,
+    cache_reply,
     send_message_via_twilio,
     write_log_to_storage,
-    access_secret
+    access_secret,
+    send_streamed_LLM_response,
+    is_partial_reply,
+    send_batch_via_twilio,
+    _build_clients,
+    environment_cache,
+    get_auth_token,
+    get_auth_tokens,
+    get_send_scheduler
 )
 import uuid
+from llm_client import CircuitBreaker, ResilientLLMClient
+from outbox import Outbox
+from model_router import ModelRouter
+from response_cache import ResponseCache
+from log_sink import LogSink
+from fakes import FakeTwilioClient
 
 @pytest.fixture(autouse=True)
 def set_env():
@@ -74,6 +92,136 @@ def test_get_LLM_response_exception(env_vars):
     assert response is None
     mock_create.assert_called_once()
 
+def test_get_LLM_response_uses_routed_model(env_vars):
+    # Arrange
+    mock_response = MagicMock()
+    mock_response.choices = [MagicMock(message=MagicMock(content='Mocked LLM response'))]
+    mock_response.usage.total_tokens = 42
+    env_vars['openai_client'].chat.completions.create.return_value = mock_response
+    env_vars['model_router'] = ModelRouter()
+    content = [{'role': 'system', 'content': 'Reply with a haiku.'}, {'role': 'user', 'content': 'Hello'}]
+
+    # Act
+    response = get_LLM_response(content, env_vars)
+
+    # Assert
+    assert response == 'Mocked LLM response'
+    env_vars['openai_client'].chat.completions.create.assert_called_once_with(
+        messages=content, model='gpt-4o-mini', max_tokens=80
+    )
+    assert env_vars['model_router'].stats()['small']['tokens'] == 42
+
+def test_get_LLM_response_uses_response_cache(env_vars):
+    # Arrange
+    mock_response = MagicMock()
+    mock_response.choices = [MagicMock(message=MagicMock(content='Mocked LLM response'))]
+    mock_response.usage.total_tokens = 42
+    env_vars['openai_client'].chat.completions.create.return_value = mock_response
+    env_vars['response_cache'] = ResponseCache()
+    content = [{'role': 'user', 'content': 'Hello'}]
+
+    # Act
+    first = get_LLM_response(content, env_vars)
+    cache_reply(first, env_vars)    # once the reply has been sent
+    second = get_LLM_response(content, env_vars)
+
+    # Assert
+    assert first == second == 'Mocked LLM response'
+    env_vars['openai_client'].chat.completions.create.assert_called_once()
+    assert env_vars['response_cache'].stats()['tokens_saved'] == 42
+
+def fake_stream(*deltas):
+    chunks = []
+    for delta in deltas:
+        chunk = MagicMock()
+        chunk.choices = [MagicMock(delta=MagicMock(content=delta))]
+        chunks.append(chunk)
+    return iter(chunks)
+
+def test_send_streamed_LLM_response_sends_segments_as_they_complete(env_vars):
+    # Arrange
+    sentence = 'The quick brown fox jumps over the lazy dog. '
+    env_vars['openai_client'].chat.completions.create.return_value = fake_stream(*([sentence] * 5))
+    content = [{'role': 'user', 'content': 'Hello'}]
+
+    # Act
+    response = send_streamed_LLM_response('+1234567890', content, env_vars)
+
+    # Assert
+    assert response == sentence * 5
+    assert env_vars['openai_client'].chat.completions.create.call_args.kwargs['stream'] is True
+    bodies = [call.kwargs['body'] for call in env_vars['twilio_client'].messages.create.call_args_list]
+    assert bodies == [(sentence * 3).strip(), (sentence * 2).strip()]
+
+def test_send_streamed_LLM_response_exception(env_vars):
+    # Arrange
+    env_vars['openai_client'].chat.completions.create.side_effect = Exception('OpenAI API error')
+
+    # Act
+    response = send_streamed_LLM_response('+1234567890', [{'role': 'user', 'content': 'Hello'}], env_vars)
+
+    # Assert
+    assert response is None
+    env_vars['twilio_client'].messages.create.assert_not_called()
+
+def test_send_streamed_LLM_response_does_not_cache_a_stream_that_broke_off(env_vars):
+    # Arrange
+    def broken_stream():
+        yield from fake_stream('The quick brown fox. ', 'Jumps over')
+        raise ConnectionError('stream reset')
+
+    create = env_vars['openai_client'].chat.completions.create
+    create.side_effect = [broken_stream(), fake_stream('Whole answer.')]
+    env_vars['response_cache'] = ResponseCache()
+    content = [{'role': 'user', 'content': 'Hello'}]
+
+    # Act
+    first = send_streamed_LLM_response('+1234567890', content, env_vars)
+    second = send_streamed_LLM_response('+1234567890', content, env_vars)
+
+    # Assert
+    assert first == 'The quick brown fox. Jumps over'
+    assert is_partial_reply(first)
+    assert second == 'Whole answer.' and not is_partial_reply(second)
+    assert create.call_count == 2
+
+def test_send_streamed_LLM_response_stops_when_a_segment_cannot_be_sent(env_vars):
+    # Arrange
+    sentence = 'The quick brown fox jumps over the lazy dog. '
+    streamed = []
+
+    def stream():
+        for _ in range(10):
+            streamed.append(sentence)
+            yield from fake_stream(sentence)
+
+    sent, failed = Future(), Future()
+    sent.set_result('SMsent')
+    failed.set_exception(ConnectionError('Twilio unavailable'))
+    env_vars['send_scheduler'] = MagicMock()
+    env_vars['send_scheduler'].submit.side_effect = [sent, failed]
+    env_vars['openai_client'].chat.completions.create.return_value = stream()
+
+    # Act
+    response = send_streamed_LLM_response('+1234567890', [{'role': 'user', 'content': 'Hello'}], env_vars)
+
+    # Assert
+    assert is_partial_reply(response)
+    assert response == (sentence * 3).strip()     # only the segment that went out
+    assert env_vars['send_scheduler'].submit.call_count == 2
+    assert len(streamed) < 10                     # stopped reading the LLM stream
+
+def test_send_streamed_LLM_response_reports_nothing_sent_as_an_error(env_vars):
+    # Arrange
+    env_vars['openai_client'].chat.completions.create.return_value = fake_stream('Short answer.')
+    env_vars['twilio_client'].messages.create.side_effect = ConnectionError('Twilio unavailable')
+
+    # Act
+    response = send_streamed_LLM_response('+1234567890', [{'role': 'user', 'content': 'Hello'}], env_vars)
+
+    # Assert
+    assert response is None
+
 def test_send_message_via_twilio_success(env_vars):
     # Arrange
     env_vars['twilio_client'].messages.create.return_value.sid = 'mocked_sid'
@@ -107,6 +255,58 @@ def test_send_message_via_twilio_exception(env_vars):
     assert unique_id is None
     env_vars['twilio_client'].messages.create.assert_called_once()
 
+def test_send_message_via_twilio_queues_transient_failures_in_outbox(env_vars, tmp_path):
+    # Arrange
+    env_vars['twilio_client'].messages.create.side_effect = ConnectionError('Twilio unreachable')
+    env_vars['outbox'] = Outbox(str(tmp_path / 'outbox.sqlite3'))
+
+    # Act
+    unique_id = send_message_via_twilio('+1234567890', 'Test message', None, env_vars)
+
+    # Assert
+    assert unique_id is not None
+    assert env_vars['outbox'].stats()['pending'] == 1
+
+def test_write_log_to_storage_queues_failed_writes_in_outbox(env_vars, tmp_path):
+    # Arrange
+    env_vars['storage_client'].bucket.return_value.blob.return_value.upload_from_string.side_effect = \
+        ConnectionError('GCS unavailable')
+    env_vars['outbox'] = Outbox(str(tmp_path / 'outbox.sqlite3'))
+
+    # Act
+    write_log_to_storage({'timestamp': '2024-05-01T00:00:00+00:00', 'incoming_message': 'Hi'}, env_vars)
+
+    # Assert
+    assert env_vars['outbox'].stats()['pending'] == 1
+
+def test_send_message_via_twilio_uses_send_scheduler(env_vars):
+    # Arrange
+    env_vars['send_scheduler'] = MagicMock()
+
+    # Act
+    unique_id = send_message_via_twilio('+1234567890', 'Test message', None, env_vars)
+
+    # Assert
+    assert unique_id is not None
+    env_vars['send_scheduler'].submit.assert_called_once_with(
+        '+1234567890', 'Test message', 'test_messaging_service_sid', 'test_twilio_phone_number'
+    )
+    env_vars['twilio_client'].messages.create.assert_not_called()
+
+def test_send_batch_via_twilio(env_vars, monkeypatch):
+    # Arrange
+    monkeypatch.setenv('SEND_RATE', '100')
+    env_vars['twilio_client'] = FakeTwilioClient()
+    phone_numbers = ['+15550001', '+15550002', '+15550003']
+
+    # Act
+    results = send_batch_via_twilio(phone_numbers, 'Test message', env_vars, timeout=10)
+
+    # Assert
+    assert set(results) == set(phone_numbers)
+    assert all(sid.startswith('SM') for sid in results.values())
+    assert sorted(m.to for m in env_vars['twilio_client'].sent) == phone_numbers
+
 def test_write_log_to_storage_success(env_vars):
     # Arrange
     mock_bucket = MagicMock()
@@ -140,6 +340,18 @@ def test_write_log_to_storage_exception(env_vars):
     assert result is None
     env_vars['storage_client'].bucket.assert_called_once()
 
+def test_write_log_to_storage_uses_log_sink(env_vars):
+    # Arrange
+    env_vars['log_sink'] = MagicMock()
+    log_data = {'test': 'data'}
+
+    # Act
+    write_log_to_storage(log_data, env_vars)
+
+    # Assert
+    env_vars['log_sink'].write.assert_called_once_with(log_data)
+    env_vars['storage_client'].bucket.assert_not_called()
+
 def test_access_secret_success(env_vars):
     # Arrange
     mock_response = MagicMock()
@@ -163,3 +375,123 @@ def test_access_secret_exception(env_vars):
     # Assert
     assert secret is None
     env_vars['secretmanager_client'].access_secret_version.assert_called_once()
+
+def test_build_clients_reuses_clients_when_credentials_unchanged(env_vars, tmp_path, monkeypatch):
+    # Arrange
+    monkeypatch.setenv('CONVERSATION_DB', str(tmp_path / 'conversations.sqlite3'))
+    settings = {key: value for key, value in env_vars.items() if not key.endswith('_client')}
+
+    # Act
+    clients = _build_clients(settings, previous=env_vars)
+
+    # Assert
+    assert clients['twilio_client'] is env_vars['twilio_client']
+    assert clients['openai_client'] is env_vars['openai_client']
+    assert clients['storage_client'] is env_vars['storage_client']
+    assert clients['secretmanager_client'] is env_vars['secretmanager_client']
+
+def test_build_clients_drains_old_send_scheduler_in_background_on_rotation(env_vars, tmp_path, monkeypatch):
+    # Arrange
+    monkeypatch.setenv('CONVERSATION_DB', str(tmp_path / 'conversations.sqlite3'))
+    monkeypatch.setenv('SEND_DRAIN_TIMEOUT', '12')
+    closed = threading.Event()
+    old_scheduler = MagicMock()
+    old_scheduler.close.side_effect = lambda timeout: closed.set()
+    monkeypatch.setattr(utils, '_send_schedulers', {env_vars['twilio_client']: old_scheduler})
+    monkeypatch.setenv('SEND_SCHEDULER', 'true')
+    settings = {key: value for key, value in env_vars.items() if not key.endswith('_client')}
+    settings['TWILIO_AUTH_TOKEN'] = 'rotated_auth_token'
+
+    # Act
+    clients = _build_clients(settings, previous=env_vars)
+    clients['send_scheduler'].close(0)
+
+    # Assert
+    assert closed.wait(timeout=5)
+    old_scheduler.close.assert_called_once_with(12.0)
+    assert utils._send_schedulers == {clients['twilio_client']: clients['send_scheduler']}
+
+def test_get_send_scheduler_is_shared_per_twilio_client(monkeypatch):
+    # Arrange
+    monkeypatch.setattr(utils, '_send_schedulers', {})
+    shared, other = MagicMock(), MagicMock()
+
+    # Act
+    first = get_send_scheduler(shared)
+    second = get_send_scheduler(shared)
+    third = get_send_scheduler(other)
+    for scheduler in (first, third):
+        scheduler.close(0)
+
+    # Assert
+    assert first is second
+    assert third is not first
+
+def test_build_clients_buffers_logs_only_when_enabled(env_vars, tmp_path, monkeypatch):
+    # Arrange
+    monkeypatch.setenv('CONVERSATION_DB', str(tmp_path / 'conversations.sqlite3'))
+    monkeypatch.delenv('LOG_BUFFER', raising=False)
+    settings = {key: value for key, value in env_vars.items() if not key.endswith('_client')}
+
+    # Act
+    unbuffered = _build_clients(settings, previous=env_vars)
+    monkeypatch.setenv('LOG_BUFFER', 'true')
+    buffered = _build_clients(settings, previous=env_vars)
+
+    # Assert
+    assert unbuffered['log_sink'] is None
+    assert isinstance(buffered['log_sink'], LogSink)
+
+def test_get_auth_token_uses_warm_bundle(env_vars):
+    # Arrange
+    environment_cache.set(env_vars)
+
+    # Act
+    try:
+        token = get_auth_token()
+    finally:
+        environment_cache.clear()
+
+    # Assert
+    assert token == 'test_auth_token'
+
+def test_get_auth_token_reads_environment_when_cold(monkeypatch):
+    # Arrange
+    monkeypatch.delenv('FUNCTION_NAME', raising=False)
+    monkeypatch.setenv('TWILIO_AUTH_TOKEN', 'env_auth_token')
+
+    # Act
+    token = get_auth_token()
+
+    # Assert
+    assert token == 'env_auth_token'
+
+def test_get_auth_tokens_includes_secondary_during_rotation(monkeypatch):
+    # Arrange
+    monkeypatch.delenv('FUNCTION_NAME', raising=False)
+    monkeypatch.setenv('TWILIO_AUTH_TOKEN', 'primary_token')
+    monkeypatch.setenv('TWILIO_AUTH_TOKEN_SECONDARY', 'secondary_token')
+
+    # Act
+    tokens = get_auth_tokens()
+
+    # Assert
+    assert tokens == ('primary_token', 'secondary_token')
+
+def test_get_LLM_response_answers_with_fallback_while_circuit_is_open(env_vars):
+    # Arrange
+    env_vars['openai_client'].chat.completions.create.side_effect = Exception('OpenAI API error')
+    env_vars['llm_client'] = ResilientLLMClient(
+        deadline=1.0, hedge=False, breaker=CircuitBreaker(failure_threshold=1), fallback_reply='Try later'
+    )
+    content = [{'role': 'user', 'content': 'Hello'}]
+
+    # Act
+    first = get_LLM_response(content, env_vars)
+    second = get_LLM_response(content, env_vars)
+
+    # Assert
+    assert first == second == 'Try later'
+    # The first call and its retry; the second is short-circuited
+    assert env_vars['openai_client'].chat.completions.create.call_count == 2
+    assert env_vars['llm_client'].stats['short_circuits'] == 1
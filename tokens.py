@@ -0,0 +1,46 @@
+# tokens.py
+#
+# Dependency-free token estimates. BPE tokenizers split English text into
+# roughly one token per common word or punctuation mark, with long words broken
+# into several pieces; this mirrors that closely enough for budgeting without
+# pulling in tiktoken.
+
+import re
+
+_PIECES = re.compile(r"\w+|[^\w\s]")
+
+# Chat formatting overhead per message and per request (role markers etc.)
+TOKENS_PER_MESSAGE = 4
+TOKENS_PER_REQUEST = 2
+
+
+def _piece_tokens(piece):
+    # Words up to 6 characters are usually a single token
+    return 1 + (len(piece) - 1) // 6
+
+
+def count_tokens(text):
+    """Estimate the number of tokens in a string."""
+    if not text:
+        return 0
+    return sum(_piece_tokens(piece) for piece in _PIECES.findall(text))
+
+
+def count_message_tokens(messages):
+    """Estimate the prompt tokens for a list of chat messages."""
+    return TOKENS_PER_REQUEST + sum(
+        TOKENS_PER_MESSAGE + count_tokens(message.get('content') or '') for message in messages
+    )
+
+
+def truncate_to_tokens(text, budget):
+    """Return the longest prefix of `text` estimated to fit in `budget` tokens."""
+    if not text:
+        return text
+    # One pass that stops at the budget, so a huge text is never fully tokenized
+    used = 0
+    for match in _PIECES.finditer(text):
+        used += _piece_tokens(match.group())
+        if used > budget:
+            return text[:match.start()].rstrip()
+    return text
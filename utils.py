@@ -1,163 +1,633 @@
-from openai import OpenAI
-import json
-from twilio.rest import Client
-from google.cloud import secretmanager, storage
+# The OpenAI, Twilio REST and Google Cloud SDKs take most of a second to import,
+# so they are imported inside the functions that build clients rather than here.
+import atexit
 import os
-from dotenv import load_dotenv
-from datetime import datetime, timezone
+import threading
+import time
 import uuid
 
+from config import env_flag  # re-exported: callers import it from here
+from conversation_store import ConversationStore
+from env_cache import EnvironmentCache
+from llm_client import CircuitOpenError, ResilientLLMClient
+from log_sink import FileSystemBackend, GCSBackend, LogSink, write_batch
+from model_router import ModelRouter
+from outbox import Outbox
+from response_cache import ResponseCache
+from secret_loader import SecretLoader
+from send_scheduler import DEFAULT_WORKERS as DEFAULT_SEND_WORKERS, SendScheduler, is_retryable
+from sms_segments import SegmentSplitter, split_text
+from telemetry import get_telemetry
+
+TWILIO_API_BASE_URL = 'https://api.twilio.com'
+
+# Secrets that must be present in Secret Manager when running in Google Cloud
+SECRET_NAMES = (
+    "TWILIO_ACCOUNT_SID",
+    "TWILIO_AUTH_TOKEN",
+    "TWILIO_PHONE_NUMBER",
+    "TO_PHONE_NUMBER",
+    "OPENAI_API_KEY",
+    "TWILIO_MESSAGING_SERVICE_SID",
+)
+
+_secret_loader = None
+
+# Twilio client -> the SendScheduler pacing its sends; see get_send_scheduler
+_send_schedulers = {}
+_send_schedulers_lock = threading.Lock()
+
+def get_secret_loader():
+    """Return the instance-wide SecretLoader, creating it on first use."""
+    global _secret_loader
+    if _secret_loader is None:
+        _secret_loader = SecretLoader.from_env()
+    return _secret_loader
+
 def get_secret(secret_name):
     """Retrieve secret from Google Cloud Secret Manager."""
     try:
-        client = secretmanager.SecretManagerServiceClient()
-        project_id = os.getenv('GCLOUD_PROJECT')
-        if not project_id:
-            raise ValueError("GCLOUD_PROJECT environment variable is not set.")
-        name = f"projects/{project_id}/secrets/{secret_name}/versions/latest"
-        response = client.access_secret_version(name=name)
-        return response.payload.data.decode('UTF-8')
+        loader = get_secret_loader()
     except Exception as e:
         raise RuntimeError(f"Failed to retrieve secret '{secret_name}': {e}")
+    return loader.get(secret_name)
 
-def initialize_environment():
-    """Initialize environment variables and clients, returning them in a dictionary."""
+def _load_settings(refresh=False):
+    """Resolve the runtime environment and credentials, returning them in a dictionary."""
+    if os.getenv('CI'):  # Running in GitHub Actions
+        print("Running in GitHub Actions...")
+        environment = 'dev'
+        TWILIO_ACCOUNT_SID = os.getenv("TWILIO_ACCOUNT_SID")
+        TWILIO_AUTH_TOKEN = os.getenv("TWILIO_AUTH_TOKEN")
+        TWILIO_PHONE_NUMBER = os.getenv("TWILIO_PHONE_NUMBER")
+        TO_PHONE_NUMBER = os.getenv("TO_PHONE_NUMBER")
+        OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+        TWILIO_MESSAGING_SERVICE_SID = os.getenv("TWILIO_MESSAGING_SERVICE_SID")
+        GCLOUD_DEV_KEY = os.getenv("GCLOUD_DEV_KEY")
+
+    elif os.getenv('FUNCTION_NAME'):  # Running in Google Cloud Functions
+        print("Running in Google Cloud...")
+        project_id = os.getenv('GCLOUD_PROJECT')
+        if not project_id:
+            raise ValueError("GCLOUD_PROJECT environment variable is not set in GCP.")
+
+        environment = 'prod' if project_id.endswith('-prod') else 'dev'
+        # One concurrent round-trip instead of six sequential ones
+        secrets = get_secret_loader().load(SECRET_NAMES, refresh=refresh)
+        TWILIO_ACCOUNT_SID = secrets["TWILIO_ACCOUNT_SID"]
+        TWILIO_AUTH_TOKEN = secrets["TWILIO_AUTH_TOKEN"]
+        TWILIO_PHONE_NUMBER = secrets["TWILIO_PHONE_NUMBER"]
+        TO_PHONE_NUMBER = secrets["TO_PHONE_NUMBER"]
+        OPENAI_API_KEY = secrets["OPENAI_API_KEY"]
+        TWILIO_MESSAGING_SERVICE_SID = secrets["TWILIO_MESSAGING_SERVICE_SID"]
+        GCLOUD_DEV_KEY = os.getenv("GCLOUD_DEV_KEY")
+
+    else:  # Local development
+        print("Running locally...")
+        environment = 'dev'
+        from dotenv import load_dotenv
+        load_dotenv()
+        TWILIO_ACCOUNT_SID = os.getenv("TWILIO_ACCOUNT_SID")
+        TWILIO_AUTH_TOKEN = os.getenv("TWILIO_AUTH_TOKEN")
+        TWILIO_PHONE_NUMBER = os.getenv("TWILIO_PHONE_NUMBER")
+        TO_PHONE_NUMBER = os.getenv("TO_PHONE_NUMBER")
+        OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+        TWILIO_MESSAGING_SERVICE_SID = os.getenv("TWILIO_MESSAGING_SERVICE_SID")
+        GCLOUD_DEV_KEY = os.getenv("GCLOUD_DEV_KEY")
+
+    BUCKET_NAMES = {
+        'dev': 'practice-dev-bucket',
+        'prod': 'practice-prod-bucket'
+    }
+    BUCKET_NAME = BUCKET_NAMES.get(environment)
+
+    return {
+        'environment': environment,
+        'TWILIO_ACCOUNT_SID': TWILIO_ACCOUNT_SID,
+        'TWILIO_AUTH_TOKEN': TWILIO_AUTH_TOKEN,
+        'TWILIO_PHONE_NUMBER': TWILIO_PHONE_NUMBER,
+        'TO_PHONE_NUMBER': TO_PHONE_NUMBER,
+        'OPENAI_API_KEY': OPENAI_API_KEY,
+        'TWILIO_MESSAGING_SERVICE_SID': TWILIO_MESSAGING_SERVICE_SID,
+        'GCLOUD_DEV_KEY': GCLOUD_DEV_KEY,
+        'BUCKET_NAME': BUCKET_NAME,
+        'GCLOUD_PROJECT': os.getenv('GCLOUD_PROJECT', 'test_project')  # fallback for tests
+    }
+
+def _build_clients(settings, previous=None):
+    """Create API clients for the given settings, reusing ones from `previous` whose credentials are unchanged."""
+    from google.cloud import storage
+    from openai import OpenAI
+    from twilio.rest import Client
+
+    previous = previous or {}
+
+    def unchanged(*keys):
+        return bool(previous) and all(previous.get(key) == settings[key] for key in keys)
+
+    if unchanged('TWILIO_ACCOUNT_SID', 'TWILIO_AUTH_TOKEN'):
+        twilio_client = previous['twilio_client']
+    else:
+        twilio_client = Client(
+            settings['TWILIO_ACCOUNT_SID'],
+            settings['TWILIO_AUTH_TOKEN'],
+            http_client=_pooled_twilio_http_client(),
+        )
+
+    if unchanged('OPENAI_API_KEY'):
+        openai_client = previous['openai_client']
+    else:
+        openai_client = OpenAI(api_key=settings['OPENAI_API_KEY'])
+
+    # Storage and Secret Manager authenticate with the service account, not our secrets
+    storage_client = previous.get('storage_client') or storage.Client()
+
+    outbox = previous.get('outbox')
+    if outbox is None and env_flag('OUTBOX'):
+        # Registered before the log sink's hook, so it is still open when the sink spills at exit
+        outbox = Outbox.from_env().start(OUTBOX_HANDLERS, float(os.getenv('OUTBOX_INTERVAL', 10)))
+        atexit.register(outbox.close)
+
+    log_sink = previous.get('log_sink')
+    # Opt-in: buffered records are lost if the instance dies before a flush, and
+    # Cloud Functions may freeze or stop an instance without running exit hooks
+    if log_sink is None and env_flag('LOG_BUFFER'):
+        spill = (lambda records: outbox.put_many('log', records)) if outbox is not None else None
+        log_sink = LogSink.from_env(_log_backend(storage_client, settings['BUCKET_NAME']), spill).register_shutdown()
+
+    conversation_store = previous.get('conversation_store') or ConversationStore.from_env()
+    response_cache = previous['response_cache'] if 'response_cache' in previous else ResponseCache.from_env()
+    model_router = previous['model_router'] if 'model_router' in previous else ModelRouter.from_env()
+    llm_client = previous['llm_client'] if 'llm_client' in previous else ResilientLLMClient.from_env()
+
+    if previous.get('twilio_client') is not None and twilio_client is not previous['twilio_client']:
+        # Credentials rotated: let queued messages finish on the old client in the background
+        retire_send_scheduler(previous['twilio_client'])
+    send_scheduler = get_send_scheduler(twilio_client) if env_flag('SEND_SCHEDULER') else None
+
+    # Share one Secret Manager client with the loader that fetched our secrets
+    secret_loader = previous.get('secret_loader') or _secret_loader
+    if secret_loader is None:
+        secret_loader = SecretLoader(
+            settings.get('GCLOUD_PROJECT', 'test_project'),
+            client=previous.get('secretmanager_client'),
+        )
+    secretmanager_client = secret_loader.client
+
+    return {
+        'twilio_client': twilio_client,
+        'openai_client': openai_client,
+        'storage_client': storage_client,
+        'secretmanager_client': secretmanager_client,
+        'secret_loader': secret_loader,
+        'log_sink': log_sink,
+        'conversation_store': conversation_store,
+        'response_cache': response_cache,
+        'model_router': model_router,
+        'llm_client': llm_client,
+        'send_scheduler': send_scheduler,
+        'outbox': outbox,
+    }
+
+def get_send_scheduler(twilio_client):
+    """The scheduler pacing sends through `twilio_client`, created on first use.
+
+    Keyed by client, so every bundle sending through one client (the default and
+    tenants on the same account) shares one queue and one pacing budget.
+    """
+    with _send_schedulers_lock:
+        send_scheduler = _send_schedulers.get(twilio_client)
+        if send_scheduler is None:
+            send_scheduler = _send_schedulers[twilio_client] = SendScheduler.from_env(twilio_client)
+            atexit.register(send_scheduler.close, float(os.getenv('SEND_DRAIN_TIMEOUT', 30)))
+    return send_scheduler
+
+def retire_send_scheduler(twilio_client):
+    """Stop handing out `twilio_client`'s scheduler and let its queue drain in the background."""
+    with _send_schedulers_lock:
+        send_scheduler = _send_schedulers.pop(twilio_client, None)
+    if send_scheduler is not None:
+        threading.Thread(
+            target=send_scheduler.close, args=(float(os.getenv('SEND_DRAIN_TIMEOUT', 30)),),
+            name='sms-drain', daemon=True,
+        ).start()
+
+def _log_backend(storage_client, bucket_name):
+    if os.getenv('LOG_DIR'):
+        return FileSystemBackend(os.getenv('LOG_DIR'))
+    return GCSBackend(storage_client, bucket_name)
+
+def _pooled_twilio_http_client():
+    """Twilio HTTP client whose keep-alive pool is big enough for concurrent sends."""
+    from requests.adapters import HTTPAdapter
+    from twilio.http.http_client import TwilioHttpClient
+
+    class RedirectingTwilioHttpClient(TwilioHttpClient):
+        """Sends Twilio API calls to TWILIO_API_BASE_URL (a local stand-in) instead of api.twilio.com."""
+
+        def request(self, method, url, *args, **kwargs):
+            url = url.replace(TWILIO_API_BASE_URL, os.environ['TWILIO_API_BASE_URL'].rstrip('/'), 1)
+            return super().request(method, url, *args, **kwargs)
+
+    if os.getenv('TWILIO_API_BASE_URL'):
+        http_client = RedirectingTwilioHttpClient(pool_connections=True)
+    else:
+        http_client = TwilioHttpClient(pool_connections=True)
+    pool_size = int(os.getenv('SEND_WORKERS', DEFAULT_SEND_WORKERS))
+    http_client.session.mount('https://', HTTPAdapter(pool_maxsize=pool_size))
+    return http_client
+
+def load_environment(previous=None):
+    """Fetch secrets and build clients, returning a fresh env_vars dictionary."""
     try:
-        if os.getenv('CI'):  # Running in GitHub Actions
-            print("Running in GitHub Actions...")
-            environment = 'dev'
-            TWILIO_ACCOUNT_SID = os.getenv("TWILIO_ACCOUNT_SID")
-            TWILIO_AUTH_TOKEN = os.getenv("TWILIO_AUTH_TOKEN")
-            TWILIO_PHONE_NUMBER = os.getenv("TWILIO_PHONE_NUMBER")
-            TO_PHONE_NUMBER = os.getenv("TO_PHONE_NUMBER")
-            OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-            TWILIO_MESSAGING_SERVICE_SID = os.getenv("TWILIO_MESSAGING_SERVICE_SID")
-            GCLOUD_DEV_KEY = os.getenv("GCLOUD_DEV_KEY")
-
-        elif os.getenv('FUNCTION_NAME'):  # Running in Google Cloud Functions
-            print("Running in Google Cloud...")
-            project_id = os.getenv('GCLOUD_PROJECT')
-            if not project_id:
-                raise ValueError("GCLOUD_PROJECT environment variable is not set in GCP.")
-
-            environment = 'prod' if project_id.endswith('-prod') else 'dev'
-            TWILIO_ACCOUNT_SID = get_secret("TWILIO_ACCOUNT_SID")
-            TWILIO_AUTH_TOKEN = get_secret("TWILIO_AUTH_TOKEN")
-            TWILIO_PHONE_NUMBER = get_secret("TWILIO_PHONE_NUMBER")
-            TO_PHONE_NUMBER = get_secret("TO_PHONE_NUMBER")
-            OPENAI_API_KEY = get_secret("OPENAI_API_KEY")
-            TWILIO_MESSAGING_SERVICE_SID = get_secret("TWILIO_MESSAGING_SERVICE_SID")
-            GCLOUD_DEV_KEY = os.getenv("GCLOUD_DEV_KEY")
-
-        else:  # Local development
-            print("Running locally...")
-            environment = 'dev'
-            load_dotenv()
-            TWILIO_ACCOUNT_SID = os.getenv("TWILIO_ACCOUNT_SID")
-            TWILIO_AUTH_TOKEN = os.getenv("TWILIO_AUTH_TOKEN")
-            TWILIO_PHONE_NUMBER = os.getenv("TWILIO_PHONE_NUMBER")
-            TO_PHONE_NUMBER = os.getenv("TO_PHONE_NUMBER")
-            OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-            TWILIO_MESSAGING_SERVICE_SID = os.getenv("TWILIO_MESSAGING_SERVICE_SID")
-            GCLOUD_DEV_KEY = os.getenv("GCLOUD_DEV_KEY")
-
-        BUCKET_NAMES = {
-            'dev': 'practice-dev-bucket',
-            'prod': 'practice-prod-bucket'
-        }
-        BUCKET_NAME = BUCKET_NAMES.get(environment)
-
-        print(f"Using bucket: {BUCKET_NAME}")
+        # A refresh re-resolves 'latest' secret versions; a cold load may reuse cached ones
+        env_vars = _load_settings(refresh=previous is not None)
+        print(f"Using bucket: {env_vars['BUCKET_NAME']}")
         print("Initializing clients...")
-        twilio_client = Client(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN)
-        openai_client = OpenAI()
-        openai_client.api_key = OPENAI_API_KEY
-        storage_client = storage.Client()
-
-        # Initialize a mockable secret manager client here if needed
-        # For testing, we'll allow env_vars to be overridden
-        secretmanager_client = secretmanager.SecretManagerServiceClient()
-
-        env_vars = {
-            'environment': environment,
-            'TWILIO_ACCOUNT_SID': TWILIO_ACCOUNT_SID,
-            'TWILIO_AUTH_TOKEN': TWILIO_AUTH_TOKEN,
-            'TWILIO_PHONE_NUMBER': TWILIO_PHONE_NUMBER,
-            'TO_PHONE_NUMBER': TO_PHONE_NUMBER,
-            'OPENAI_API_KEY': OPENAI_API_KEY,
-            'TWILIO_MESSAGING_SERVICE_SID': TWILIO_MESSAGING_SERVICE_SID,
-            'GCLOUD_DEV_KEY': GCLOUD_DEV_KEY,
-            'BUCKET_NAME': BUCKET_NAME,
-            'twilio_client': twilio_client,
-            'openai_client': openai_client,
-            'storage_client': storage_client,
-            'secretmanager_client': secretmanager_client,
-            'GCLOUD_PROJECT': os.getenv('GCLOUD_PROJECT', 'test_project')  # fallback for tests
-        }
-
+        env_vars.update(_build_clients(env_vars, previous))
         return env_vars
 
     except Exception as e:
         print(f"Error during initialization: {e}")
         raise
 
+# Lives for the lifetime of the instance, so warm requests skip secret fetches and client setup
+environment_cache = EnvironmentCache(load_environment)
+
+def initialize_environment():
+    """Return the env_vars dictionary for this instance, loading it on first use."""
+    return environment_cache.get()
+
+def get_auth_token():
+    """Return the Twilio auth token without building any clients.
+
+    Uses the warm env_vars bundle when there is one; on a cold instance only this
+    one secret is fetched (and remembered by the secret loader for the full load).
+    """
+    env_vars = environment_cache.peek()
+    if env_vars is not None:
+        return env_vars['TWILIO_AUTH_TOKEN']
+    if not os.getenv('CI') and os.getenv('FUNCTION_NAME'):
+        return get_secret('TWILIO_AUTH_TOKEN')
+    return os.getenv('TWILIO_AUTH_TOKEN')
+
+def get_auth_tokens():
+    """Auth tokens a webhook signature may be made with: the primary, then TWILIO_AUTH_TOKEN_SECONDARY.
+
+    Set the secondary while rotating credentials in Twilio so requests signed with
+    either token are accepted until the rotation is finished.
+    """
+    secondary = os.getenv('TWILIO_AUTH_TOKEN_SECONDARY')
+    primary = get_auth_token()
+    if secondary and secondary != primary:
+        return (primary, secondary)
+    return (primary,)
+
+def llm_params(content, env_vars):
+    """Return (params, route): the model and max_tokens to use, and the route taken (None without a router)."""
+    model_router = env_vars.get('model_router')
+    if model_router is None:
+        return {'model': 'gpt-4o', 'max_tokens': 500}, None
+    route = model_router.route(content)
+    return {'model': route['model'], 'max_tokens': route['max_tokens']}, route
+
+def record_route(route, seconds, env_vars, error=False, tokens=0):
+    """Tag the request with its route and feed the router's model health."""
+    if route is None:
+        return
+    env_vars['model_router'].record(route, seconds, error=error, tokens=tokens)
+    telemetry = get_telemetry()
+    telemetry.record(f"llm_route_{route['name']}", seconds, error)
+    telemetry.annotate(route=route['name'], model=route['model'])
+
+def llm_failed(error, route, start, env_vars):
+    """Record a failed LLM call and return what to answer with instead: the canned reply, or None."""
+    llm_client = env_vars.get('llm_client')
+    if not isinstance(error, CircuitOpenError):
+        # A short-circuited call never reached the model, so it says nothing about its health
+        record_route(route, time.perf_counter() - start, env_vars, error=True)
+    return llm_client.fallback_reply if llm_client is not None else None
+
+def is_fallback_reply(llm_response, env_vars):
+    llm_client = env_vars.get('llm_client')
+    return llm_client is not None and llm_response is not None and llm_response == llm_client.fallback_reply
+
 def get_LLM_response(content, env_vars):
     openai_client = env_vars['openai_client']
+    llm_client = env_vars.get('llm_client')
+    params, route = llm_params(content, env_vars)
+
+    response_cache = env_vars.get('response_cache')
+    if response_cache is not None:
+        cached = response_cache.get(content, params)
+        if cached is not None:
+            return cached
+
+    start = time.perf_counter()
     try:
-        completion = openai_client.chat.completions.create(
-            model="gpt-4o",
-            messages=content,
-            max_tokens=500,
-        )
-        return completion.choices[0].message.content
+        if llm_client is not None:
+            completion = llm_client.complete(openai_client.chat.completions.create, messages=content, **params)
+        else:
+            completion = openai_client.chat.completions.create(
+                messages=content,
+                **params,
+            )
+        llm_response = completion.choices[0].message.content
+        latency = time.perf_counter() - start
+        record_route(route, latency, env_vars, tokens=_total_tokens(completion))
+        return fresh_reply(llm_response, content, params, tokens=_total_tokens(completion), latency=latency)
     except Exception as e:
         print(f"Error contacting OpenAI: {e}")
+        return llm_failed(e, route, start, env_vars)
+
+def _total_tokens(completion):
+    total = getattr(getattr(completion, 'usage', None), 'total_tokens', 0)
+    return total if isinstance(total, int) else 0
+
+def stream_LLM_response(content, env_vars, params=None):
+    """Yield the reply text incrementally as OpenAI streams it."""
+    openai_client = env_vars['openai_client']
+    params = params or {'model': 'gpt-4o', 'max_tokens': 500}
+    llm_client = env_vars.get('llm_client')
+    options = {'timeout': llm_client.deadline} if llm_client is not None else {}
+    stream = openai_client.chat.completions.create(
+        messages=content,
+        stream=True,
+        **params,
+        **options,
+    )
+    try:
+        for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+    finally:
+        # Stop the download if the caller gives up on the stream early
+        close = getattr(stream, 'close', None)
+        if close is not None:
+            close()
+
+class FreshReply(str):
+    """A reply straight from the LLM, carrying its cache entry until cache_reply stores it."""
+
+def fresh_reply(llm_response, content, params, tokens=0, latency=0.0):
+    if llm_response is None:
+        return None
+    reply = FreshReply(llm_response)
+    reply.cache_entry = (content, params, tokens, latency)
+    return reply
+
+def cache_reply(llm_response, env_vars):
+    """Cache a fresh reply; called only once it has been sent, so a failed send is regenerated on retry."""
+    response_cache = env_vars.get('response_cache')
+    if response_cache is None or not isinstance(llm_response, FreshReply):
+        return
+    content, params, tokens, latency = llm_response.cache_entry
+    response_cache.put(content, params, str(llm_response), tokens=tokens, latency=latency)
+
+class PartialReply(str):
+    """Text that was streamed (and texted) before the LLM stream broke off; not a complete reply."""
+
+def is_partial_reply(llm_response):
+    return isinstance(llm_response, PartialReply)
+
+def send_streamed_LLM_response(phone_number, content, env_vars):
+    """Stream the LLM reply and text each SMS-sized segment as soon as it is complete.
+
+    Each segment is sent and waited on before the next, so they arrive in order.
+    Returns the full text that was sent, or None if nothing could be generated or
+    sent; a complete reply is left for the caller to cache. If the stream fails
+    partway, what was already generated is still sent. If a segment can't be sent,
+    streaming stops there. Either way the text is returned as a PartialReply, so it
+    isn't cached or remembered as a full answer.
+    """
+    params, route = llm_params(content, env_vars)
+    sent = []
+
+    def send(segments):
+        for segment in segments:
+            if not send_segment_via_twilio(phone_number, segment, env_vars):
+                return False
+            sent.append(segment)
+        return True
+
+    def undelivered():
+        print(f"Stopped streaming after {len(sent)} segments: a segment could not be sent")
+        return PartialReply(' '.join(sent)) if sent else None
+
+    response_cache = env_vars.get('response_cache')
+    cached = response_cache.get(content, params) if response_cache is not None else None
+    if cached is not None:
+        return cached if send(split_text(cached)) else undelivered()
+
+    splitter = SegmentSplitter()
+    parts = []
+    complete = False
+    start = time.perf_counter()
+    llm_client = env_vars.get('llm_client')
+    try:
+        if llm_client is not None and not llm_client.allow():
+            raise CircuitOpenError("LLM circuit breaker is open")
+        for delta in stream_LLM_response(content, env_vars, params):
+            parts.append(delta)
+            if not send(splitter.feed(delta)):
+                return undelivered()
+    except Exception as e:
+        print(f"Error streaming from OpenAI: {e}")
+        if llm_client is not None and not isinstance(e, CircuitOpenError):
+            llm_client.record(time.perf_counter() - start, error=True)
+        fallback = llm_failed(e, route, start, env_vars)
+        if not parts:
+            if fallback and not send(split_text(fallback)):
+                return undelivered()
+            return fallback
+    else:
+        complete = True
+        if llm_client is not None:
+            llm_client.record(time.perf_counter() - start)
+        record_route(route, time.perf_counter() - start, env_vars)
+    if not send(splitter.finish()):
+        return undelivered()
+
+    llm_response = ''.join(parts)
+    if not llm_response:
         return None
+    if not complete:
+        return PartialReply(llm_response)
+    return fresh_reply(llm_response, content, params, latency=time.perf_counter() - start)
+
+def send_segment_via_twilio(phone_number, segment, env_vars):
+    """Send one segment of a streamed reply and wait for it. Returns True if it went out.
+
+    Not queued in the outbox on failure: a replayed segment would arrive after the
+    ones that follow it.
+    """
+    try:
+        send_scheduler = env_vars.get('send_scheduler')
+        if send_scheduler is not None:
+            # Paced like every other send, but waited on so segments keep their order
+            send_scheduler.submit(
+                phone_number, segment, env_vars['TWILIO_MESSAGING_SERVICE_SID'], env_vars['TWILIO_PHONE_NUMBER'],
+            ).result()
+        else:
+            env_vars['twilio_client'].messages.create(
+                messaging_service_sid=env_vars['TWILIO_MESSAGING_SERVICE_SID'],
+                from_=env_vars['TWILIO_PHONE_NUMBER'],
+                body=segment,
+                to=phone_number
+            )
+        return True
+    except Exception as e:
+        print(f"Error sending streamed segment via Twilio API: {e}")
+        return False
 
 def send_message_via_twilio(phone_number, message_body, session_id, env_vars):
-    print(f'TWILIO SEND ENVVARS: {env_vars}')
     twilio_client = env_vars['twilio_client']
     messaging_service_sid = env_vars['TWILIO_MESSAGING_SERVICE_SID']
     from_number = env_vars['TWILIO_PHONE_NUMBER']
 
     unique_id = str(uuid.uuid4())
     try:
+        send_scheduler = env_vars.get('send_scheduler')
+        if send_scheduler is not None:
+            # Paced per messaging service and retried on 429/5xx in the background
+            future = send_scheduler.submit(phone_number, message_body, messaging_service_sid, from_number)
+            if env_vars.get('outbox') is not None:
+                def on_done(future):
+                    # The scheduler gave up; the outbox keeps trying for longer
+                    if future.exception() is not None:
+                        queue_failed_send(future.exception(), phone_number, message_body, env_vars)
+                future.add_done_callback(on_done)
+            print(f'Queued message with UUID {unique_id}')
+            return unique_id
+
         message = twilio_client.messages.create(
             messaging_service_sid=messaging_service_sid,
             from_=from_number,
             body=message_body,
             to=phone_number
         )
-        print(f'Sent message:\n {message_body}\n to {phone_number} with UUID {unique_id}')
+        print(f'Sent message with UUID {unique_id}')
     except Exception as e:
         print(f"Error sending message via Twilio API: {e}")
+        if queue_failed_send(e, phone_number, message_body, env_vars):
+            return unique_id
         return None
 
     return unique_id
 
+def queue_failed_send(error, phone_number, message_body, env_vars):
+    """Put a send that failed transiently in the outbox for replay. Returns True if it was queued."""
+    outbox = env_vars.get('outbox')
+    if outbox is None or not is_retryable(error):
+        return False
+    try:
+        outbox.put('sms', {
+            'to': phone_number,
+            'body': message_body,
+            'from_': env_vars['TWILIO_PHONE_NUMBER'],
+            'messaging_service_sid': env_vars['TWILIO_MESSAGING_SERVICE_SID'],
+        }, error)
+    except Exception as e:
+        print(f"Error queueing message in outbox: {e}")
+        return False
+    print("Queued message in outbox for replay")
+    return True
+
+def _outbox_env(from_number):
+    """env_vars for replaying an entry: the tenant that owns `from_number`, else the default."""
+    from tenants import lookup_tenant  # tenants imports this module
+    tenant = lookup_tenant(from_number)
+    return tenant.env_vars() if tenant is not None else initialize_environment()
+
+def replay_sends(payloads):
+    """Outbox handler: send each queued SMS directly; returns None or the error for each."""
+    results = []
+    for payload in payloads:
+        try:
+            _outbox_env(payload['from_'])['twilio_client'].messages.create(**payload)
+            results.append(None)
+        except Exception as e:
+            results.append(e)
+    return results
+
+def replay_logs(payloads):
+    """Outbox handler: write queued log records straight to storage, one batch per bucket."""
+    groups = {}
+    for index, record in enumerate(payloads):
+        groups.setdefault(record.get('from_number'), []).append(index)
+    results = [None] * len(payloads)
+    for from_number, indexes in groups.items():
+        try:
+            env_vars = _outbox_env(from_number)
+            write_batch(_log_backend(env_vars['storage_client'], env_vars['BUCKET_NAME']),
+                        [payloads[index] for index in indexes])
+        except Exception as e:
+            for index in indexes:
+                results[index] = e
+    return results
+
+OUTBOX_HANDLERS = {'sms': replay_sends, 'log': replay_logs}
+
+def send_batch_via_twilio(phone_numbers, message_body, env_vars, timeout=None):
+    """Send one message to many recipients, paced and retried by the send scheduler.
+
+    Returns {phone_number: Twilio message SID, or None if it could not be sent}.
+    """
+    send_scheduler = env_vars.get('send_scheduler')
+    owned = send_scheduler is None
+    if owned:
+        send_scheduler = SendScheduler.from_env(env_vars['twilio_client'])
+
+    futures = send_scheduler.send_batch(
+        phone_numbers,
+        message_body,
+        env_vars['TWILIO_MESSAGING_SERVICE_SID'],
+        env_vars['TWILIO_PHONE_NUMBER'],
+    )
+    results = {}
+    for phone_number, future in zip(phone_numbers, futures):
+        try:
+            results[phone_number] = future.result(timeout).sid
+        except Exception as e:
+            print(f"Error sending batch message to {phone_number}: {e}")
+            results[phone_number] = None
+
+    if owned:
+        send_scheduler.close(timeout=0)
+    return results
+
 def access_secret(secret_name, env_vars):
     try:
-        client = env_vars['secretmanager_client']
-        project_id = env_vars.get('GCLOUD_PROJECT', 'test_project')
-        name = f"projects/{project_id}/secrets/{secret_name}/versions/latest"
-        response = client.access_secret_version(name=name)
-        return response.payload.data.decode('UTF-8')
+        loader = env_vars.get('secret_loader')
+        if loader is None:
+            loader = SecretLoader(
+                env_vars.get('GCLOUD_PROJECT', 'test_project'),
+                client=env_vars['secretmanager_client'],
+            )
+        return loader.get(secret_name)
     except Exception as e:
         print(f"Error accessing secret: {e}")
         return None
 
 def write_log_to_storage(log_data, env_vars):
     try:
-        storage_client = env_vars['storage_client']
-        bucket_name = env_vars['BUCKET_NAME']
-        bucket = storage_client.bucket(bucket_name)
-        timestamp = datetime.now(timezone.utc).isoformat()
-        blob = bucket.blob(f'logs/{timestamp}.json')
-        blob.upload_from_string(
-            data=json.dumps(log_data),
-            content_type='application/json'
-        )
-        print(f'Log written to Cloud Storage: {log_data}')
+        log_sink = env_vars.get('log_sink')
+        if log_sink is not None:
+            # Buffered: uploaded later as part of a compressed NDJSON batch
+            log_sink.write(log_data)
+        else:
+            backend = GCSBackend(env_vars['storage_client'], env_vars['BUCKET_NAME'])
+            write_batch(backend, [log_data])
     except Exception as e:
         print(f"Error writing log to Cloud Storage: {e}")
+        _queue_failed_log(e, log_data, env_vars)
         return None
+
+def _queue_failed_log(error, log_data, env_vars):
+    outbox = env_vars.get('outbox')
+    if outbox is None:
+        return
+    try:
+        outbox.put('log', log_data, error)
+    except Exception as e:
+        print(f"Error queueing log record in outbox: {e}")